@@ -0,0 +1,97 @@
+"""
+Closed-loop load test against a running Northwind chatbot API.
+
+Each concurrency level runs that many clients that send questions back
+to back until the level's request count is reached, then reports
+requests/sec and latency percentiles. Answer caching is bypassed so the
+numbers reflect the agent pipeline itself.
+
+    python benchmarks/agent_load_test.py --url http://127.0.0.1:8000 \
+        --concurrency 1 8 32 --requests 64
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+QUESTIONS = [
+    'Who are the suppliers supplying products in "Produce" category?',
+    "How many customers in Germany have written reviews?",
+    "What are the product categories provided by each supplier?",
+    "What is the net sales revenue in year 2012?",
+    "Are customers satisfied with their purchased products and staff services?",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    concurrency: int,
+    num_requests: int,
+    questions: list[str] = QUESTIONS,
+    bypass_cache: bool = True,
+) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(num_requests))
+
+    async def _client():
+        nonlocal errors
+        for i in counter:
+            payload = {
+                "text": questions[i % len(questions)],
+                "bypass_cache": bypass_cache,
+            }
+            start = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=payload)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "errors": errors,
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_seconds": statistics.median(latencies) if latencies else None,
+        "p95_seconds": percentile(latencies, 95) if latencies else None,
+        "p99_seconds": percentile(latencies, 99) if latencies else None,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    endpoint = f"{args.url.rstrip('/')}/northwind-rag-agent"
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        results = [
+            await run_level(client, endpoint, concurrency, args.requests)
+            for concurrency in args.concurrency
+        ]
+
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=120)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,196 @@
+"""
+Offline end-to-end benchmark of the Northwind chatbot API.
+
+Runs the real FastAPI app in process (through httpx's ASGI transport)
+with the deterministic fake chat model, embeddings and graph from
+offline_fakes, so no OpenAI or Neo4j access is needed. Each concurrency
+level is a closed-loop run over a question mix from the frontend's
+sidebar examples; throughput and p50/p95/p99 latency are printed and
+appended, with the git commit, to a JSONL results file so runs can be
+compared across commits.
+
+    python benchmarks/offline_benchmark.py --concurrency 1 8 32 \
+        --requests 128 --mix all --llm-latency 0.2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from agent_load_test import run_level
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_RESULTS_FILE = REPO_DIR / "benchmarks" / "results" / "offline_benchmark.jsonl"
+
+# Example questions from the frontend sidebar, plus the review question
+# from the agent's tool description
+SIDEBAR_QUESTIONS = [
+    'Who are the suppliers supplying products in "Produce" category?',
+    "How many customers in Germany have written reviews?",
+    "What are the product categories provided by each supplier?",
+    "Which customer(s) has ordered orders with more than 5 products in it?",
+    'Find total quantity per customer in the "Produce" category in year 2012?',
+    "What is the net sales revenue in year 2012?",
+    "Which country had the largest percent increase in number of orders "
+    "from 2012 to 2013?",
+]
+REVIEW_QUESTION = (
+    "Are customers satisfied with their purchased products and staff services?"
+)
+
+# "intents" are answered from precompiled Cypher, "agent" questions
+# need an LLM-backed tool, run directly when the local router is sure
+# of it and through the agent otherwise
+QUESTION_MIXES = {
+    "all": SIDEBAR_QUESTIONS + [REVIEW_QUESTION],
+    "intents": [SIDEBAR_QUESTIONS[i] for i in (0, 1, 5, 6)],
+    "agent": [SIDEBAR_QUESTIONS[i] for i in (2, 3, 4)] + [REVIEW_QUESTION],
+}
+
+
+def git_commit() -> dict:
+    def _git(*args) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=REPO_DIR, capture_output=True, text=True
+        ).stdout.strip()
+
+    return {
+        "sha": _git("rev-parse", "HEAD") or None,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def configure_environment(artifacts_dir: str) -> None:
+    """Point the API at a scratch artifacts directory and the offline
+    retrieval path. Must run before any API module is imported."""
+
+    os.environ["NORTHWIND_ARTIFACTS_DIR"] = artifacts_dir
+    os.environ["NORTHWIND_EMBEDDER"] = "hashing"
+    os.environ["NORTHWIND_REVIEW_RETRIEVER"] = "local"
+    sys.path.insert(0, str(REPO_DIR / "chatbot_api"))
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        response = await client.get("/ready")
+        if response.status_code == 200:
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"API warm-up did not finish: {response.json()}")
+        await asyncio.sleep(0.05)
+
+
+async def run_benchmark(args: argparse.Namespace) -> list[dict]:
+    from offline_fakes import install_fakes, seed_artifacts
+
+    seed_artifacts()
+    install_fakes(
+        llm_latency=args.llm_latency,
+        embedding_latency=args.embedding_latency,
+        graph_latency=args.graph_latency,
+        rows_per_query=args.rows,
+    )
+
+    import main
+
+    questions = QUESTION_MIXES[args.mix]
+    transport = httpx.ASGITransport(app=main.app)
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://offline", timeout=args.timeout
+        ) as client:
+            await wait_until_ready(client, args.timeout)
+            for concurrency in args.concurrency:
+                results.append(
+                    await run_level(
+                        client,
+                        "/northwind-rag-agent",
+                        concurrency,
+                        args.requests,
+                        questions=questions,
+                        bypass_cache=not args.use_cache,
+                    )
+                )
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory(prefix="northwind-offline-") as artifacts_dir:
+        configure_environment(artifacts_dir)
+        # The chains print every step (verbose=True); keep the report readable
+        with open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                results = asyncio.run(run_benchmark(args))
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "config": {
+            "mix": args.mix,
+            "requests": args.requests,
+            "use_cache": args.use_cache,
+            "llm_latency": args.llm_latency,
+            "embedding_latency": args.embedding_latency,
+            "graph_latency": args.graph_latency,
+            "rows": args.rows,
+        },
+        "levels": results,
+    }
+
+    for result in results:
+        print(json.dumps(result))
+
+    if args.results_file:
+        results_file = Path(args.results_file)
+        results_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(results_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Appended results to {results_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--mix", choices=sorted(QUESTION_MIXES), default="all")
+    parser.add_argument(
+        "--use-cache",
+        action="store_true",
+        help="Let repeated questions hit the answer cache",
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.05, help="Seconds per LLM call"
+    )
+    parser.add_argument(
+        "--embedding-latency",
+        type=float,
+        default=0.01,
+        help="Seconds per query embedding",
+    )
+    parser.add_argument(
+        "--graph-latency", type=float, default=0.005, help="Seconds per graph query"
+    )
+    parser.add_argument(
+        "--rows", type=int, default=10, help="Rows returned per graph query"
+    )
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument(
+        "--results-file",
+        default=str(DEFAULT_RESULTS_FILE),
+        help="JSONL file the run is appended to (empty to skip)",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Show the chains' step output"
+    )
+    main(parser.parse_args())
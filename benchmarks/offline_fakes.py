@@ -0,0 +1,454 @@
+"""
+Deterministic stand-ins for OpenAI and Neo4j, used by the offline
+benchmark to run the real chatbot API without any network access.
+
+- FakeChatModel answers agent, Cypher generation and QA prompts, and
+  reports token usage like ChatOpenAI does.
+- DelayedHashingEmbeddings are the API's hashing embeddings with an
+  artificial latency.
+- FakeGraph serves the vocabulary and entity name queries from the
+  Northwind CSVs and fills any other query's RETURN columns with
+  deterministic values.
+
+The environment (NORTHWIND_ARTIFACTS_DIR, ...) must be set before
+importing this module, since the API modules read it on import.
+"""
+
+import asyncio
+import csv
+import json
+import re
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from chains.northwind_embeddings import HashingEmbeddings
+from chains.northwind_graph import GRAPH_SCHEMA_FILE, NorthwindGraph
+from chains.northwind_local_review_retriever import (
+    REVIEW_INDEX_DIR,
+    REVIEW_INDEX_MANIFEST,
+)
+from langchain.load import dumpd
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, FunctionMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from northwind_common.hashing_embeddings import hashing_embedder_name
+from utils.artifacts import (
+    GRAPH_VERSION_FILE,
+    artifact_path,
+    write_json_artifact,
+)
+from utils.result_compaction import estimate_tokens
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+OFFLINE_GRAPH_VERSION = "offline-benchmark"
+
+NODE_PROPERTIES = {
+    "Customer": ["id", "company_name", "contact_name", "city", "country"],
+    "Order": ["id", "num_products", "unit_price", "quantity", "discount", "order_date"],
+    "Product": ["id", "product_name", "unit_price", "units_in_stock"],
+    "Category": ["id", "category_name", "category_description"],
+    "Supplier": ["id", "company_name", "supplier_country"],
+    "Review": ["id", "text"],
+    "SalesSummary": [
+        "id",
+        "dimension",
+        "name",
+        "period",
+        "year",
+        "month",
+        "revenue",
+        "order_count",
+        "quantity",
+    ],
+}
+
+RELATIONSHIPS = [
+    ("Customer", "PURCHASED", "Order"),
+    ("Order", "ORDERS", "Product"),
+    ("Supplier", "SUPPLIES", "Product"),
+    ("Product", "PART_OF", "Category"),
+    ("Order", "WRITES", "Review"),
+    ("SalesSummary", "SUMMARIZES", "Category"),
+    ("SalesSummary", "SUMMARIZES", "Customer"),
+    ("SalesSummary", "SUMMARIZES", "Supplier"),
+]
+
+AGENT_SYSTEM_PROMPT = "You are a helpful assistant"
+
+# Questions the agent routes to the review tool rather than the graph
+_EXPERIENCE_RE = re.compile(r"satisf|experience|feel|opinion|happy|complain", re.I)
+_EXAMPLE_RE = re.compile(r"^# (.+?)\n(.+?)(?=\n\s*\n|\n# )", re.M | re.S)
+_FALLBACK_CYPHER = "MATCH (c:Customer)\nRETURN c.company_name AS company"
+
+_LAST_RETURN_RE = re.compile(
+    r"\bRETURN\s+(?:DISTINCT\s+)?(?!.*\bRETURN\b)(.*)", re.I | re.S
+)
+_RETURN_TAIL_RE = re.compile(r"\s+(?:ORDER\s+BY|SKIP|LIMIT)\b.*", re.I | re.S)
+_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)", re.I)
+_ALIAS_RE = re.compile(r"\s+AS\s+(\w+)\s*$", re.I)
+_AGGREGATE_RE = re.compile(r"^(?:count|sum|avg|min|max)\s*\(", re.I)
+_FLOAT_COLUMN_RE = re.compile(r"percent|avg|revenue|price|sales|ratio", re.I)
+_INT_COLUMN_RE = re.compile(
+    r"count(?!ry)|sum|total|quantity|orders|customers|num_|year|month|id$", re.I
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def _message_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model with a fixed latency per call. It routes
+    agent questions to a tool, copies the matching few-shot example
+    from Cypher generation prompts and answers everything else with a
+    short summary of its prompt.
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "northwind-fake-chat"
+
+    def _agent_message(self, messages: List[BaseMessage]) -> AIMessage:
+        tool_outputs = [m.content for m in messages if isinstance(m, FunctionMessage)]
+        if tool_outputs:
+            return AIMessage(content=str(tool_outputs[-1]))
+
+        question = str(messages[-1].content)
+        tool = "Experiences" if _EXPERIENCE_RE.search(question) else "Graph"
+        return AIMessage(
+            content="",
+            additional_kwargs={
+                "function_call": {
+                    "name": tool,
+                    "arguments": json.dumps({"__arg1": question}),
+                }
+            },
+        )
+
+    def _cypher_message(self, prompt: str) -> AIMessage:
+        examples_text, _, question = prompt.rpartition("The question is:")
+        examples = {
+            _normalize(example_question): cypher.strip()
+            for example_question, cypher in _EXAMPLE_RE.findall(examples_text)
+        }
+        return AIMessage(content=examples.get(_normalize(question), _FALLBACK_CYPHER))
+
+    def _respond(self, messages: List[BaseMessage], functions=None) -> AIMessage:
+        if functions:
+            return self._agent_message(messages)
+
+        prompt = _message_text(messages)
+        if "Generate Cypher query" in prompt:
+            return self._cypher_message(prompt)
+
+        digest = zlib.crc32(prompt.encode("utf-8"))
+        return AIMessage(
+            content=f"Offline answer {digest:08x} to a {len(prompt)} character prompt."
+        )
+
+    def _result(self, messages: List[BaseMessage], **kwargs: Any) -> ChatResult:
+        message = self._respond(messages, kwargs.get("functions"))
+        completion = str(message.content) + json.dumps(message.additional_kwargs)
+        token_usage = {
+            "prompt_tokens": estimate_tokens(_message_text(messages)),
+            "completion_tokens": estimate_tokens(completion),
+        }
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": token_usage, "model_name": self._llm_type},
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages, **kwargs)
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+        token_usage = defaultdict(int)
+        for output in llm_outputs:
+            for key, value in ((output or {}).get("token_usage") or {}).items():
+                token_usage[key] += value
+        return {"token_usage": dict(token_usage), "model_name": self._llm_type}
+
+
+class DelayedHashingEmbeddings(HashingEmbeddings):
+    """Hashing embeddings with an artificial per-call latency"""
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return super().embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return super().embed_query(text)
+
+
+def _read_csv(name: str) -> List[dict]:
+    with open(DATA_DIR / name, encoding="utf-8", errors="replace", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def load_entity_names() -> Dict[str, List[str]]:
+    """Entity names per linkable type, as the ETL snapshots them"""
+
+    categories = _read_csv("categories.csv")
+    customers = _read_csv("customers.csv")
+    return {
+        "category": sorted({row["categoryName"] for row in categories}),
+        "product": sorted({row["productName"] for row in _read_csv("products.csv")}),
+        "supplier": sorted({row["companyName"] for row in _read_csv("suppliers.csv")}),
+        "country": sorted({row["country"] for row in customers if row["country"]}),
+    }
+
+
+def _split_columns(return_clause: str) -> List[str]:
+    columns, depth, current = [], 0, []
+    for char in return_clause:
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        if char == "," and depth == 0:
+            columns.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    columns.append("".join(current).strip())
+    return [column for column in columns if column]
+
+
+def _column_value(expression: str, name: str, row_number: int):
+    seed = zlib.crc32(name.encode("utf-8")) % 1000
+    if expression.lower().startswith("collect("):
+        return [f"{name} {row_number}.{i}" for i in range(1, 4)]
+    if _FLOAT_COLUMN_RE.search(name):
+        return round(seed * 10.5 + row_number, 2)
+    if _INT_COLUMN_RE.search(name):
+        return seed + row_number
+    return f"{name} {row_number}"
+
+
+class FakeGraph(NorthwindGraph):
+    """
+    In-memory stand-in for the Northwind graph with a fixed latency
+    per query. The schema comes from the seeded snapshot like it does
+    for the real graph.
+    """
+
+    def __init__(self, latency: float = 0.0, rows_per_query: int = 10, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.rows_per_query = rows_per_query
+        self.entity_names = load_entity_names()
+
+    def _rows(self, query: str) -> List[Dict[str, Any]]:
+        if re.search(r"\bAS slot\b", query):
+            return [
+                {"slot": slot, "values": self.entity_names[slot]}
+                for slot in ("category", "country")
+            ]
+        if re.search(r"\bAS type\b", query):
+            return [
+                {"type": entity_type, "names": names}
+                for entity_type, names in self.entity_names.items()
+            ]
+
+        match = _LAST_RETURN_RE.search(query)
+        if match is None:
+            return []
+        columns = []
+        for column in _split_columns(_RETURN_TAIL_RE.sub("", match.group(1))):
+            column = column.rstrip(";").strip()
+            alias = _ALIAS_RE.search(column)
+            expression = _ALIAS_RE.sub("", column) if alias else column
+            columns.append((expression, alias.group(1) if alias else column))
+
+        num_rows = self.rows_per_query
+        if all(_AGGREGATE_RE.match(expression) for expression, _ in columns):
+            num_rows = 1
+        limit = _LIMIT_RE.search(query)
+        if limit:
+            num_rows = min(num_rows, int(limit.group(1)))
+
+        return [
+            {
+                name: _column_value(expression, name, row_number)
+                for expression, name in columns
+            }
+            for row_number in range(1, num_rows + 1)
+        ]
+
+    def query(
+        self, query: str, params: dict = {}, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        time.sleep(self.latency)
+        return self._rows(query)
+
+    async def aquery(
+        self, query: str, params: dict = {}, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        await asyncio.sleep(self.latency)
+        return self._rows(query)
+
+    def _plan(self) -> Dict[str, Any]:
+        # A read-only plan expecting rows_per_query rows, which the cost
+        # guard always accepts
+        return {
+            "plan": {
+                "operatorType": "ProduceResults@neo4j",
+                "arguments": {"EstimatedRows": float(self.rows_per_query)},
+                "children": [],
+            },
+            "query_type": "r",
+        }
+
+    def explain(self, query: str, params: dict = {}) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self._plan()
+
+    async def aexplain(self, query: str, params: dict = {}) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        return self._plan()
+
+
+def _schema_snapshot() -> dict:
+    node_props = {
+        label: [{"property": name, "type": "STRING"} for name in properties]
+        for label, properties in NODE_PROPERTIES.items()
+    }
+    relationships = [
+        {"start": start, "type": rel_type, "end": end}
+        for start, rel_type, end in RELATIONSHIPS
+    ]
+    patterns = [f"(:{start})-[:{rel}]->(:{end})" for start, rel, end in RELATIONSHIPS]
+    schema = "\n".join(
+        [
+            "Node properties are the following:",
+            str(node_props),
+            "Relationship properties are the following:",
+            "{}",
+            "The relationships are the following:",
+            str(patterns),
+        ]
+    )
+    return {
+        "schema": schema,
+        "structured_schema": {
+            "node_props": node_props,
+            "rel_props": {},
+            "relationships": relationships,
+        },
+        "graph_version": OFFLINE_GRAPH_VERSION,
+    }
+
+
+def _write_review_index() -> int:
+    index_dir = artifact_path(REVIEW_INDEX_DIR)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    reviews = _read_csv("reviews.csv")
+
+    embeddings = HashingEmbeddings()
+    matrix = np.asarray(
+        embeddings.embed_documents([row["reviews"] for row in reviews]),
+        dtype=np.float32,
+    )
+    np.save(index_dir / "vectors-offline.npy", matrix)
+    with open(index_dir / REVIEW_INDEX_MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "embedder": hashing_embedder_name(embeddings.dimensions),
+                "vectors_file": "vectors-offline.npy",
+                "ids": [int(row["reviewID"]) for row in reviews],
+                "texts": [row["reviews"] for row in reviews],
+            },
+            f,
+        )
+    return len(reviews)
+
+
+def seed_artifacts() -> None:
+    """
+    Write the artifacts the ETL and the first API start would leave
+    behind (graph version, schema, agent prompt, entity names and the
+    review vector snapshot) so nothing is fetched from the network
+    """
+
+    write_json_artifact(GRAPH_VERSION_FILE, {"version": OFFLINE_GRAPH_VERSION})
+    write_json_artifact(GRAPH_SCHEMA_FILE, _schema_snapshot())
+    write_json_artifact("entities.json", load_entity_names())
+    write_json_artifact(
+        "agent_prompt.json",
+        dumpd(
+            ChatPromptTemplate.from_messages(
+                [
+                    ("system", AGENT_SYSTEM_PROMPT),
+                    MessagesPlaceholder(variable_name="chat_history", optional=True),
+                    ("human", "{input}"),
+                    MessagesPlaceholder(variable_name="agent_scratchpad"),
+                ]
+            )
+        ),
+    )
+    _write_review_index()
+
+
+def install_fakes(
+    llm_latency: float,
+    embedding_latency: float,
+    graph_latency: float,
+    rows_per_query: int,
+) -> None:
+    """Point the API's model and graph factories at the fakes. Must run
+    before any of the lazily built chains is created."""
+
+    import agents.northwind_rag_agent as northwind_rag_agent
+    import chains.northwind_cypher_chain as northwind_cypher_chain
+    import chains.northwind_review_chain as northwind_review_chain
+
+    def chat_model(**kwargs):
+        return FakeChatModel(latency=llm_latency, tags=kwargs.get("tags"))
+
+    def graph(**kwargs):
+        return FakeGraph(
+            **kwargs, latency=graph_latency, rows_per_query=rows_per_query
+        )
+
+    northwind_rag_agent.ChatOpenAI = chat_model
+    northwind_cypher_chain.ChatOpenAI = chat_model
+    northwind_review_chain.ChatOpenAI = chat_model
+    northwind_cypher_chain.NorthwindGraph = graph
+    northwind_review_chain.get_review_embeddings = lambda: DelayedHashingEmbeddings(
+        latency=embedding_latency
+    )
@@ -0,0 +1,127 @@
+"""
+Review retrieval latency of the in-process memory-mapped index.
+
+Times top-k search over a synthetic snapshot the size of the current
+review corpus and over a 100k-review synthetic corpus, written in the
+same format the ETL uses. With --neo4j the Neo4j vector index query is
+timed as well, against the reviews actually loaded in the graph (the
+--dimensions must then match the index).
+Query embedding time is excluded from all numbers.
+
+    python benchmarks/review_retrieval_benchmark.py --sizes 76 100000 --neo4j
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "chatbot_api"))
+
+from chains.northwind_local_review_retriever import (  # noqa: E402
+    REVIEW_INDEX_MANIFEST,
+    LocalReviewIndex,
+)
+from chains.northwind_review_retriever import REVIEW_VECTOR_QUERY  # noqa: E402
+
+DEFAULT_REVIEWS_CSV = Path(__file__).resolve().parents[1] / "data" / "reviews.csv"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, size: int, latencies: list[float]) -> dict:
+    return {
+        "retriever": name,
+        "corpus_size": size,
+        "queries": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def write_synthetic_snapshot(index_dir: Path, size: int, dimensions: int) -> None:
+    rng = np.random.default_rng(size)
+    matrix = rng.standard_normal((size, dimensions), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.save(index_dir / "vectors-synthetic.npy", matrix)
+    with open(index_dir / REVIEW_INDEX_MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "embedder": "synthetic",
+                "vectors_file": "vectors-synthetic.npy",
+                "ids": list(range(size)),
+                "texts": [f"review {i}" for i in range(size)],
+            },
+            f,
+        )
+
+
+def bench_local(size: int, queries: np.ndarray, k: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_synthetic_snapshot(Path(tmp_dir), size, queries.shape[1])
+        index = LocalReviewIndex(Path(tmp_dir))
+        index.refresh()
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, k)
+            latencies.append(time.perf_counter() - start)
+
+        # Drop the mapping before the directory is removed
+        index.snapshot = None
+    return summarize("local", size, latencies)
+
+
+def bench_neo4j(queries: np.ndarray, k: int) -> dict:
+    from utils.neo4j_driver import NEO4J_DATABASE, READ_ACCESS_MODE, get_driver
+
+    driver = get_driver()
+    latencies = []
+    with driver.session(
+        database=NEO4J_DATABASE, default_access_mode=READ_ACCESS_MODE
+    ) as session:
+        size = session.run("MATCH (r:Review) RETURN count(r) AS n").single()["n"]
+        for query in queries:
+            params = {"index_name": "reviews", "k": k, "embedding": query.tolist()}
+            start = time.perf_counter()
+            session.run(REVIEW_VECTOR_QUERY, params).data()
+            latencies.append(time.perf_counter() - start)
+    driver.close()
+    return summarize("neo4j", size, latencies)
+
+
+def count_reviews(path: Path) -> int:
+    with open(path, "rb") as f:
+        return max(0, sum(1 for line in f if line.strip()) - 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=None)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--neo4j", action="store_true")
+    args = parser.parse_args()
+
+    sizes = args.sizes or [count_reviews(DEFAULT_REVIEWS_CSV), 100_000]
+    queries = np.random.default_rng(0).standard_normal(
+        (args.queries, args.dimensions), dtype=np.float32
+    )
+
+    results = [bench_local(size, queries, args.k) for size in sizes]
+    if args.neo4j:
+        results.append(bench_neo4j(queries, args.k))
+
+    for result in results:
+        print(json.dumps(result))
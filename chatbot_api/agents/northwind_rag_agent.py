@@ -1,18 +1,101 @@
+import asyncio
+import logging
 import os
-from chains.northwind_cypher_chain import northwind_cypher_chain
-from chains.northwind_review_chain import reviews_vector_chain
+from pathlib import Path
+from chains.northwind_cypher_chain import get_northwind_cypher_chain
+from chains.northwind_review_chain import get_reviews_vector_chain
 from langchain import hub
 from langchain.agents import AgentExecutor, Tool, create_openai_functions_agent
+from langchain.load import dumpd, load
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain.schema import AgentAction
 from langchain_openai import ChatOpenAI
+from utils.artifacts import read_json_artifact, write_json_artifact
+from utils.lazy import lazy_singleton
+from utils.metrics import stage_span
+from utils.streaming import AGENT_LLM_TAG
+from utils.tool_router import Route, ToolRouter
 
 NORTHWIND_AGENT_MODEL = os.getenv("NORTHWIND_AGENT_MODEL")
+NORTHWIND_LLM_MAX_RETRIES = int(os.getenv("NORTHWIND_LLM_MAX_RETRIES", 2))
+NORTHWIND_ROUTER_EXAMPLES_FILE = os.getenv(
+    "NORTHWIND_ROUTER_EXAMPLES_FILE",
+    Path(__file__).resolve().parents[1] / "router_examples.json",
+)
+
+AGENT_PROMPT_HUB_REF = "hwchase17/openai-functions-agent"
+AGENT_PROMPT_FILE = "agent_prompt.json"
+
+LOGGER = logging.getLogger(__name__)
+
+
+def load_agent_prompt() -> ChatPromptTemplate:
+    """
+    Load the agent prompt from its local snapshot, pulling it from the
+    LangChain hub (and snapshotting it) only when there is no snapshot.
+    If the hub is unreachable too, an equivalent built-in prompt is used.
+    """
+
+    snapshot = read_json_artifact(AGENT_PROMPT_FILE)
+    if snapshot:
+        return load(snapshot)
+
+    try:
+        prompt = hub.pull(AGENT_PROMPT_HUB_REF)
+    except Exception as e:
+        LOGGER.warning(f"Could not pull {AGENT_PROMPT_HUB_REF}: {e}")
+        return ChatPromptTemplate.from_messages(
+            [
+                ("system", "You are a helpful assistant"),
+                MessagesPlaceholder(variable_name="chat_history", optional=True),
+                ("human", "{input}"),
+                MessagesPlaceholder(variable_name="agent_scratchpad"),
+            ]
+        )
+
+    write_json_artifact(AGENT_PROMPT_FILE, dumpd(prompt))
+    return prompt
+
+
+# Tools take the tool run's callbacks so the chains' LLM calls and
+# events reach the agent's handlers (streaming, metrics)
+
+
+def _invoke_reviews_vector_chain(query: str, callbacks=None):
+    with stage_span("reviews_chain"):
+        return get_reviews_vector_chain().invoke(
+            query, config={"callbacks": callbacks}
+        )
+
+
+async def _ainvoke_reviews_vector_chain(query: str, callbacks=None):
+    with stage_span("reviews_chain"):
+        reviews_vector_chain = await asyncio.to_thread(get_reviews_vector_chain)
+        return await reviews_vector_chain.ainvoke(
+            query, config={"callbacks": callbacks}
+        )
+
+
+def _invoke_northwind_cypher_chain(query: str, callbacks=None):
+    with stage_span("cypher_chain"):
+        return get_northwind_cypher_chain().invoke(
+            query, config={"callbacks": callbacks}
+        )
+
+
+async def _ainvoke_northwind_cypher_chain(query: str, callbacks=None):
+    with stage_span("cypher_chain"):
+        northwind_cypher_chain = await asyncio.to_thread(get_northwind_cypher_chain)
+        return await northwind_cypher_chain.ainvoke(
+            query, config={"callbacks": callbacks}
+        )
 
-northwind_agent_prompt = hub.pull("hwchase17/openai-functions-agent")
 
 tools = [
     Tool(
         name="Experiences",
-        func=reviews_vector_chain.invoke,
+        func=_invoke_reviews_vector_chain,
+        coroutine=_ainvoke_reviews_vector_chain,
         description="""Useful when you need to answer questions
         about customer experiences, feelings, or any other qualitative
         question that could be answered about a customer using semantic
@@ -25,7 +108,8 @@ tools = [
     ),
     Tool(
         name="Graph",
-        func=northwind_cypher_chain.invoke,
+        func=_invoke_northwind_cypher_chain,
+        coroutine=_ainvoke_northwind_cypher_chain,
         description="""Useful for answering questions about customers,
         products, suppliers, product categories, customer review
         statistics, and order details. Use the entire prompt as
@@ -36,20 +120,61 @@ tools = [
     ),
 ]
 
-chat_model = ChatOpenAI(
-    model=NORTHWIND_AGENT_MODEL,
-    temperature=0,
-)
 
-northwind_rag_agent = create_openai_functions_agent(
-    llm=chat_model,
-    prompt=northwind_agent_prompt,
-    tools=tools,
-)
+@lazy_singleton
+def get_northwind_rag_agent_executor() -> AgentExecutor:
+    chat_model = ChatOpenAI(
+        model=NORTHWIND_AGENT_MODEL,
+        temperature=0,
+        max_retries=NORTHWIND_LLM_MAX_RETRIES,
+        streaming=True,
+        tags=[AGENT_LLM_TAG],
+    )
 
-northwind_rag_agent_executor = AgentExecutor(
-    agent=northwind_rag_agent,
-    tools=tools,
-    return_intermediate_steps=True,
-    verbose=True,
-)
+    northwind_rag_agent = create_openai_functions_agent(
+        llm=chat_model,
+        prompt=load_agent_prompt(),
+        tools=tools,
+    )
+
+    return AgentExecutor(
+        agent=northwind_rag_agent,
+        tools=tools,
+        return_intermediate_steps=True,
+        verbose=True,
+    )
+
+
+
+@lazy_singleton
+def get_tool_router() -> ToolRouter:
+    """The local router, after checking its regressions table (also run
+    by `python -m utils.tool_router` from chatbot_api)"""
+
+    router = ToolRouter.from_file(NORTHWIND_ROUTER_EXAMPLES_FILE)
+    for question, expected, actual in router.check():
+        LOGGER.warning(
+            f"Router regression: {question!r} goes to {actual}, not {expected}"
+        )
+    return router
+
+
+async def invoke_routed_tool(route: Route, query: str, callbacks=None) -> dict:
+    """
+    Run the tool the router picked on the whole question, skipping the
+    agent's planning and wrap-up LLM calls. The result has the shape of
+    an agent response, with the route as the single intermediate step.
+    """
+
+    tool = next(tool for tool in tools if tool.name == route.tool)
+    result = await tool.coroutine(query, callbacks)
+    action = AgentAction(
+        tool=route.tool,
+        tool_input=query,
+        log=f"Routed locally with confidence {route.confidence:.2f}",
+    )
+    return {
+        "input": query,
+        "output": result["result"],
+        "intermediate_steps": [(action, result)],
+    }
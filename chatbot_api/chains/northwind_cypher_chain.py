@@ -1,21 +1,40 @@
 import os
 from dotenv import load_dotenv
 load_dotenv()
-from langchain.chains import GraphCypherQAChain
+from chains.northwind_cypher_qa_chain import NorthwindCypherQAChain
+from chains.northwind_graph import NorthwindGraph
 from langchain.prompts import PromptTemplate
-from langchain_community.graphs import Neo4jGraph
 from langchain_openai import ChatOpenAI
+from utils.artifacts import get_graph_version, read_json_artifact
+from utils.cypher_guard import NORTHWIND_CYPHER_TIMEOUT, CypherGuard
+from utils.cypher_template_cache import CypherTemplateCache
+from utils.entity_linker import EntityLinker
+from utils.lazy import lazy_singleton
+from utils.result_compaction import ResultCompactor
 
 NORTHWIND_QA_MODEL = os.getenv("NORTHWIND_QA_MODEL")
 NORTHWIND_CYPHER_MODEL = os.getenv("NORTHWIND_CYPHER_MODEL")
 
-graph = Neo4jGraph(
-    url=os.getenv("NEO4J_URI"),
-    username=os.getenv("NEO4J_USERNAME"),
-    password=os.getenv("NEO4J_PASSWORD"),
-)
 
-graph.refresh_schema()
+@lazy_singleton
+def get_graph() -> NorthwindGraph:
+    """Graph store backed by the local schema snapshot, only falling
+    back to introspecting Neo4j when no snapshot exists yet"""
+
+    graph = NorthwindGraph()
+    if not graph.load_schema_snapshot():
+        graph.refresh_schema()
+    return graph
+
+
+def _checked_prompt(prompt: PromptTemplate) -> PromptTemplate:
+    """Format the prompt once at import, so an unescaped brace in an
+    example (a Cypher map literal needs {{...}}) fails at start-up
+    rather than on every Cypher generation"""
+
+    prompt.format(**{name: "" for name in prompt.input_variables})
+    return prompt
+
 
 cypher_generation_template = """
 Task:
@@ -42,7 +61,7 @@ filter the denominator to be non zero.
 
 Examples:
 # Find total quantity per customer in the "Produce" category in year 2012?
-MATCH (cust:Customer)-[:PURCHASED]->(o:Order)-[:ORDERS]->(p:Product)-[:PART_OF]->(c:Category {category_name:"Produce"})
+MATCH (cust:Customer)-[:PURCHASED]->(o:Order)-[:ORDERS]->(p:Product)-[:PART_OF]->(c:Category {{category_name:"Produce"}})
 WHERE o.order_date >= date('2012-01-01') AND o.order_date < date('2013-01-01')
 RETURN DISTINCT cust.contact_name as CustomerName, SUM(o.quantity) AS TotalProductsPurchased
 
@@ -62,47 +81,44 @@ RETURN COUNT(DISTINCT c) AS customers_with_reviews;
 
 # Who are the suppliers supplying products in "Produce" category?
 MATCH (s:Supplier)-[:SUPPLIES]->(p:Product)-[:PART_OF]->(c:Category)
-WHERE c.name = 'Produce'
-RETURN DISTINCT s.company_name as Supplier, collect(p.name) as Products
+WHERE c.category_name = 'Produce'
+RETURN DISTINCT s.company_name as Supplier, collect(p.product_name) as Products
 ORDER BY s.company_name
 
 # What is the net sales revenue in year 2012?
-MATCH (o:Order) 
-WHERE o.order_date >= date('2012-01-01') AND o.order_date < date('2013-01-01')
-RETURN 'Total Sales is: $' + toInteger(SUM(o.quantity*((1-o.discount)*o.unit_price)))
+MATCH (s:SalesSummary {{dimension: 'all', period: 'year', year: 2012}})
+RETURN 'Total Sales is: $' + toInteger(s.revenue)
+
+# What was the monthly revenue of the "Beverages" category in 2013?
+MATCH (s:SalesSummary {{dimension: 'category', period: 'month', year: 2013}})-[:SUMMARIZES]->(c:Category {{category_name: 'Beverages'}})
+RETURN s.month AS month, s.revenue AS revenue
+ORDER BY month
 
 # Which country had the largest percent increase in number of orders from 2012 to 2013?
-MATCH (c:Customer)-[:PURCHASED]->(o:Order)
-WHERE o.order_date >= date('2012-01-01') AND o.order_date <= date('2013-12-31')
-WITH c.country AS country, COUNT(o) AS order_count,
-SUM(CASE WHEN o.order_date >= date('2012-01-01') AND o.order_date < date('2013-01-01') THEN 1 ELSE 0 END) AS count_2012,
-SUM(CASE WHEN o.order_date >= date('2013-01-01') AND o.order_date < date('2014-01-01')
-THEN 1 ELSE 0 END) AS count_2013
-WITH country, order_count, count_2012, count_2013,
-     (toFloat(count_2013) - toFloat(count_2012)) / toFloat(count_2012) * 100
-     AS percent_increase
-RETURN country, percent_increase
+MATCH (a:SalesSummary {{dimension: 'country', period: 'year', year: 2012}})
+MATCH (b:SalesSummary {{dimension: 'country', period: 'year', year: 2013, name: a.name}})
+WHERE a.order_count > 0
+RETURN a.name AS country,
+       (toFloat(b.order_count) - toFloat(a.order_count)) / toFloat(a.order_count) * 100
+       AS percent_increase
 ORDER BY percent_increase DESC
 LIMIT 1;
 
-String category values:
-Category names are one of: 'Beverages', 'Condiments', 'Confections', 'Dairy Products', 'Grains/Cereals', 'Meat/Poultry', 'Produce', 'Seafood'
-Product names are one of: 'Chai', 'Chang', 'Aniseed Syrup', 'Chef Anton's Cajun Seasoning', 'Chef Anton's Gumbo Mix', 'Grandma's Boysenberry Spread', 
-'Uncle Bob's Organic Dried Pears', 'Northwoods Cranberry Sauce', 'Mishi Kobe Niku', 'Ikura', 'Queso Cabrales', 'Queso Manchego La Pastora', 'Konbu', 'Tofu', 'Genen Shouyu', 
-'Pavlova', 'Alice Mutton', 'Carnarvon Tigers', 'Teatime Chocolate Biscuits', 'Sir Rodney's Marmalade', 'Sir Rodney's Scones', 'Gustaf's KnÃ¤ckebrÃ¶d', 'TunnbrÃ¶d', 
-'GuaranÃ¡ FantÃ¡stica', 'NuNuCa NuÃŸ-Nougat-Creme', 'GumbÃ¤r GummibÃ¤rchen', 'Schoggi Schokolade', 'RÃ¶ssle Sauerkraut', 'ThÃ¼ringer Rostbratwurst', 'Nord-Ost Matjeshering', 
-'Gorgonzola Telino', 'Mascarpone Fabioli', 'Geitost', 'Sasquatch Ale', 'Steeleye Stout', 'Inlagd Sill', 'Gravad lax', 'CÃ´te de Blaye', 'Chartreuse verte', 'Boston Crab Meat', 
-'Jack's New England Clam Chowder', 'Singaporean Hokkien Fried Mee', 'Ipoh Coffee', 'Gula Malacca', 'Rogede sild', 'Spegesild', 'Zaanse koeken', 'Chocolade', 'Maxilaku', 
-'Valkoinen suklaa', 'Manjimup Dried Apples', 'Filo Mix', 'Perth Pasties', 'TourtiÃ¨re', 'PÃ¢tÃ© chinois', 'Gnocchi di nonna Alice', 'Ravioli Angelo', 'Escargots de Bourgogne', 
-'Raclette Courdavault', 'Camembert Pierrot', 'Sirop d'Ã©rable', 'Tarte au sucre', 'Vegie-spread', 'Wimmers gute SemmelknÃ¶del', 'Louisiana Fiery Hot Pepper Sauce', 
-'Louisiana Hot Spiced Okra', 'Laughing Lumberjack Lager', 'Scottish Longbreads', 'Gudbrandsdalsost', 'Outback Lager', 'Flotemysost', 'Mozzarella di Giovanni', 'RÃ¶d Kaviar', 
-'Longlife Tofu', 'RhÃ¶nbrÃ¤u Klosterbier', 'LakkalikÃ¶Ã¶ri', 'Original Frankfurter grÃ¼ne SoÃŸe'
-Suppliers are one of: 'Exotic Liquids', 'New Orleans Cajun Delights', 'Grandma Kelly's Homestead', 'Tokyo Traders', 'Cooperativa de Quesos 'Las Cabras'', 'Mayumi's', 
-'Pavlova', 'Specialty Biscuits', 'PB KnÃ¤ckebrÃ¶d AB', 'Refrescos Americanas LTDA', 'Heli SÃ¼ÃŸwaren GmbH & Co. KG', 'Plutzer LebensmittelgroÃŸmÃ¤rkte AG', 
-'Nord-Ost-Fisch Handelsgesellschaft mbH', 'Formaggi Fortini s.r.l.', 'Norske Meierier', 'Bigfoot Breweries', 'Svensk SjÃ¶fÃ¶da AB', 'Aux joyeux ecclÃ©siastiques', 
-'New England Seafood Cannery', 'Leka Trading', 'Lyngbysild', 'Zaanse Snoepfabriek', 'Karkki Oy', 'G'day', 'Ma Maison', 'Pasta Buttini s.r.l.', 'Escargots Nouveaux', 
-'Gai pÃ¢turage', 'ForÃªts d'Ã©rables'
+Sales summaries:
+SalesSummary nodes hold precomputed revenue (quantity * (1 - discount) *
+unit_price), order_count and quantity per period ('year' or 'month', with
+year and month properties) for each dimension: 'all' (every order),
+'category', 'country', 'customer' and 'supplier'. The name property holds
+the category name, country, customer or supplier company name, and
+category, customer and supplier summaries have a SUMMARIZES relationship
+to their node. Always answer revenue, order count and quantity totals per
+year, month, category, country, customer or supplier from SalesSummary
+nodes instead of aggregating Order nodes.
 
+Entity names:
+These category, product, supplier and country names from the database
+match the question. Use their exact spelling in string comparisons:
+{entities}
 
 Make sure to use IS NULL or IS NOT NULL when analyzing missing properties.
 Never return embedding properties in your queries. You must never include the
@@ -116,8 +132,11 @@ The question is:
 {question}
 """
 
-cypher_generation_prompt = PromptTemplate(
-    input_variables=["schema", "question"], template=cypher_generation_template
+cypher_generation_prompt = _checked_prompt(
+    PromptTemplate(
+        input_variables=["schema", "question", "entities"],
+        template=cypher_generation_template,
+    )
 )
 
 qa_generation_template = """You are an assistant that takes the results
@@ -155,17 +174,113 @@ if you're asked.
 Helpful Answer:
 """
 
-qa_generation_prompt = PromptTemplate(
-    input_variables=["context", "question"], template=qa_generation_template
+qa_generation_prompt = _checked_prompt(
+    PromptTemplate(
+        input_variables=["context", "question"], template=qa_generation_template
+    )
 )
 
-northwind_cypher_chain = GraphCypherQAChain.from_llm(
-    cypher_llm=ChatOpenAI(model=NORTHWIND_CYPHER_MODEL, temperature=0),
-    qa_llm=ChatOpenAI(model=NORTHWIND_QA_MODEL, temperature=0),
-    graph=graph,
-    verbose=True,
-    qa_prompt=qa_generation_prompt,
-    cypher_prompt=cypher_generation_prompt,
-    validate_cypher=True,
-    top_k=100,
-)
+
+
+def load_slot_vocabulary() -> dict:
+    """Category names and countries that may appear as literals in
+    otherwise identical questions"""
+
+    rows = get_graph().query(
+        """
+        CALL {
+            MATCH (c:Category) RETURN 'category' AS slot, c.category_name AS value
+            UNION
+            MATCH (c:Customer) RETURN 'country' AS slot, c.country AS value
+        }
+        RETURN slot, collect(DISTINCT value) AS values
+        """
+    )
+    return {row["slot"]: [v for v in row["values"] if v] for row in rows}
+
+
+def load_entity_names() -> dict:
+    """Entity names snapshotted by the ETL, read from the graph when
+    there is no snapshot"""
+
+    entities = read_json_artifact("entities.json")
+    if entities:
+        return entities
+
+    rows = get_graph().query(
+        """
+        CALL {
+            MATCH (c:Category) RETURN 'category' AS type, c.category_name AS name
+            UNION
+            MATCH (p:Product) RETURN 'product' AS type, p.product_name AS name
+            UNION
+            MATCH (s:Supplier) RETURN 'supplier' AS type, s.company_name AS name
+            UNION
+            MATCH (c:Customer) RETURN 'country' AS type, c.country AS name
+        }
+        RETURN type, collect(DISTINCT name) AS names
+        """
+    )
+    return {row["type"]: [name for name in row["names"] if name] for row in rows}
+
+
+@lazy_singleton
+def get_entity_linker() -> EntityLinker:
+    return EntityLinker(loader=load_entity_names, version_getter=get_graph_version)
+
+
+@lazy_singleton
+def get_cypher_template_cache() -> CypherTemplateCache:
+    return CypherTemplateCache(
+        fingerprint=CypherTemplateCache.make_fingerprint(
+            get_graph().schema, cypher_generation_template
+        ),
+        vocabulary_loader=load_slot_vocabulary,
+    )
+
+
+result_compactor = ResultCompactor()
+cypher_guard = CypherGuard()
+
+
+@lazy_singleton
+def get_northwind_cypher_chain() -> NorthwindCypherQAChain:
+    return NorthwindCypherQAChain.from_llm(
+        # Retries are handled per stage by the chain, not by the client
+        cypher_llm=ChatOpenAI(
+            model=NORTHWIND_CYPHER_MODEL, temperature=0, max_retries=0
+        ),
+        qa_llm=ChatOpenAI(model=NORTHWIND_QA_MODEL, temperature=0, max_retries=0),
+        graph=get_graph(),
+        verbose=True,
+        qa_prompt=qa_generation_prompt,
+        cypher_prompt=cypher_generation_prompt,
+        validate_cypher=True,
+        top_k=100,
+        template_cache=get_cypher_template_cache(),
+        compactor=result_compactor,
+        entity_linker=get_entity_linker(),
+        cypher_guard=cypher_guard,
+        query_timeout=NORTHWIND_CYPHER_TIMEOUT,
+    )
+
+
+def refresh_graph_schema_if_stale() -> bool:
+    """
+    Re-introspect the schema when the ETL has published a new graph
+    version since the snapshot was taken. The chain and template cache
+    are rebuilt on next use if the schema actually changed.
+    """
+
+    graph = get_graph()
+    if not graph.is_schema_stale():
+        return False
+
+    previous_schema = graph.schema
+    graph.refresh_schema()
+    if graph.schema == previous_schema:
+        return False
+
+    get_cypher_template_cache.reset()
+    get_northwind_cypher_chain.reset()
+    return True
@@ -0,0 +1,450 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForChainRun,
+    CallbackManagerForChainRun,
+)
+from langchain.chains import GraphCypherQAChain
+from chains.northwind_graph import CypherTimeoutError
+from langchain.chains.graph_qa.cypher import INTERMEDIATE_STEPS_KEY, extract_cypher
+from utils.async_utils import CircuitOpenError, RetryError, async_retry, retry
+from utils.cypher_guard import CypherGuard, GuardDecision
+from utils.cypher_template_cache import CypherTemplateCache
+from utils.entity_linker import EntityLinker
+from utils.metrics import instrumented
+from utils.result_compaction import ResultCompactor, inject_limit
+from utils.streaming import GENERATED_CYPHER_LABEL
+
+LOGGER = logging.getLogger(__name__)
+
+
+class NorthwindCypherQAChain(GraphCypherQAChain):
+    """
+    GraphCypherQAChain with a question-to-Cypher translation cache in
+    front of the Cypher generation LLM. Questions whose shape matches a
+    previously validated query reuse its parameterized template and
+    skip the Cypher LLM entirely.
+
+    The chain has a native async path (async LLM calls and the async
+    Neo4j driver) so agent tool calls don't block the event loop.
+
+    With a result compactor, generated queries get a LIMIT and query
+    results are compacted to a token budget before the QA call. With an
+    entity linker, only the entity names matching the question are put
+    into the Cypher generation prompt.
+
+    With a Cypher guard, generated queries are checked against their
+    EXPLAIN plan before they run: dangerous ones are rewritten, or
+    regenerated once and answered from empty results if the second
+    query is rejected too. Cached templates passed the guard when they
+    were stored. Queries run with query_timeout as their transaction
+    timeout; a generated query that times out is treated as rejected.
+    """
+
+    template_cache: Optional[CypherTemplateCache] = None
+    compactor: Optional[ResultCompactor] = None
+    entity_linker: Optional[EntityLinker] = None
+    cypher_guard: Optional[CypherGuard] = None
+    query_timeout: Optional[float] = None
+
+    def _cypher_inputs(self, question: str) -> dict:
+        entities = "None"
+        if self.entity_linker is not None:
+            entities = self.entity_linker.format_entities(question)
+        return {
+            "question": question,
+            "schema": self.graph_schema,
+            "entities": entities,
+        }
+
+    @instrumented("cypher_generation")
+    @retry("cypher_generation")
+    def _generate_cypher(self, question: str, callbacks) -> str:
+        generated_cypher = self.cypher_generation_chain.run(
+            self._cypher_inputs(question), callbacks=callbacks
+        )
+        return extract_cypher(generated_cypher)
+
+    @instrumented("cypher_generation")
+    @async_retry("cypher_generation")
+    async def _agenerate_cypher(self, question: str, callbacks) -> str:
+        # Linking refreshes the entity names after a graph version change,
+        # which may read them from the graph, so it runs in a thread
+        inputs = await asyncio.to_thread(self._cypher_inputs, question)
+        generated_cypher = await self.cypher_generation_chain.arun(
+            inputs, callbacks=callbacks
+        )
+        return extract_cypher(generated_cypher)
+
+    @instrumented("cypher_query", count_rows=True)
+    @retry("cypher_query")
+    def _query_graph(self, cypher: str) -> list:
+        return self.graph.query(cypher, timeout=self.query_timeout)[: self.top_k]
+
+    @instrumented("cypher_query", count_rows=True)
+    @async_retry("cypher_query")
+    async def _aquery_graph(self, cypher: str) -> list:
+        return (await self.graph.aquery(cypher, timeout=self.query_timeout))[
+            : self.top_k
+        ]
+
+    @instrumented("cypher_guard")
+    @retry("cypher_guard")
+    def _explain(self, cypher: str) -> dict:
+        return self.graph.explain(cypher)
+
+    @instrumented("cypher_guard")
+    @async_retry("cypher_guard")
+    async def _aexplain(self, cypher: str) -> dict:
+        return await self.graph.aexplain(cypher)
+
+    def _check_cypher(self, cypher: str) -> GuardDecision:
+        try:
+            decision = self.cypher_guard.check(cypher, self._explain(cypher))
+            if decision.action == "rewrite":
+                # Rewrites change the plan, so the result is checked again
+                decision = self.cypher_guard.check(
+                    decision.cypher, self._explain(decision.cypher)
+                )
+        except ValueError as e:
+            decision = self.cypher_guard.reject(cypher, str(e))
+        return decision
+
+    async def _acheck_cypher(self, cypher: str) -> GuardDecision:
+        try:
+            decision = self.cypher_guard.check(cypher, await self._aexplain(cypher))
+            if decision.action == "rewrite":
+                decision = self.cypher_guard.check(
+                    decision.cypher, await self._aexplain(decision.cypher)
+                )
+        except ValueError as e:
+            decision = self.cypher_guard.reject(cypher, str(e))
+        return decision
+
+    @staticmethod
+    def _regeneration_question(question: str, decision: GuardDecision) -> str:
+        return (
+            f"{question}\n\nThis query was rejected:\n{decision.cypher}\n"
+            f"Reason: {decision.reason}\nWrite a cheaper, read-only query."
+        )
+
+    def _guard_rejected(self, decision: GuardDecision, intermediate_steps) -> bool:
+        if decision.action != "reject":
+            return False
+        intermediate_steps.append(
+            {"rejected_query": decision.cypher, "reason": decision.reason}
+        )
+        return True
+
+    def _guarded_cypher(
+        self, question: str, cypher: str, callbacks, intermediate_steps: list
+    ) -> str:
+        if self.cypher_guard is None or not cypher:
+            return cypher
+
+        decision = self._check_cypher(cypher)
+        if self._guard_rejected(decision, intermediate_steps):
+            self.cypher_guard.record("regenerate")
+            cypher = self._validate_cypher(
+                self._generate_cypher(
+                    self._regeneration_question(question, decision), callbacks
+                )
+            )
+            if not cypher:
+                return cypher
+            decision = self._check_cypher(cypher)
+            if self._guard_rejected(decision, intermediate_steps):
+                return ""
+        return decision.cypher
+
+    async def _aguarded_cypher(
+        self, question: str, cypher: str, callbacks, intermediate_steps: list
+    ) -> str:
+        if self.cypher_guard is None or not cypher:
+            return cypher
+
+        decision = await self._acheck_cypher(cypher)
+        if self._guard_rejected(decision, intermediate_steps):
+            self.cypher_guard.record("regenerate")
+            cypher = self._validate_cypher(
+                await self._agenerate_cypher(
+                    self._regeneration_question(question, decision), callbacks
+                )
+            )
+            if not cypher:
+                return cypher
+            decision = await self._acheck_cypher(cypher)
+            if self._guard_rejected(decision, intermediate_steps):
+                return ""
+        return decision.cypher
+
+    def _run_cypher(
+        self, question: str, cypher: str, callbacks, intermediate_steps: list
+    ) -> tuple[str, list]:
+        """Run a generated query. One that times out is regenerated once,
+        and answered from empty results if the new one fails too."""
+
+        try:
+            return cypher, self._query_graph(cypher)
+        except CypherTimeoutError:
+            if self.cypher_guard is None:
+                raise
+        decision = self.cypher_guard.timed_out(cypher, self.query_timeout)
+        self._guard_rejected(decision, intermediate_steps)
+
+        self.cypher_guard.record("regenerate")
+        cypher = self._validate_cypher(
+            self._generate_cypher(
+                self._regeneration_question(question, decision), callbacks
+            )
+        )
+        if cypher:
+            decision = self._check_cypher(cypher)
+            if not self._guard_rejected(decision, intermediate_steps):
+                intermediate_steps.append({"query": decision.cypher})
+                try:
+                    return decision.cypher, self._query_graph(decision.cypher)
+                except CypherTimeoutError:
+                    self._guard_rejected(
+                        self.cypher_guard.timed_out(
+                            decision.cypher, self.query_timeout
+                        ),
+                        intermediate_steps,
+                    )
+        return "", []
+
+    async def _arun_cypher(
+        self, question: str, cypher: str, callbacks, intermediate_steps: list
+    ) -> tuple[str, list]:
+        try:
+            return cypher, await self._aquery_graph(cypher)
+        except CypherTimeoutError:
+            if self.cypher_guard is None:
+                raise
+        decision = self.cypher_guard.timed_out(cypher, self.query_timeout)
+        self._guard_rejected(decision, intermediate_steps)
+
+        self.cypher_guard.record("regenerate")
+        cypher = self._validate_cypher(
+            await self._agenerate_cypher(
+                self._regeneration_question(question, decision), callbacks
+            )
+        )
+        if cypher:
+            decision = await self._acheck_cypher(cypher)
+            if not self._guard_rejected(decision, intermediate_steps):
+                intermediate_steps.append({"query": decision.cypher})
+                try:
+                    return decision.cypher, await self._aquery_graph(decision.cypher)
+                except CypherTimeoutError:
+                    self._guard_rejected(
+                        self.cypher_guard.timed_out(
+                            decision.cypher, self.query_timeout
+                        ),
+                        intermediate_steps,
+                    )
+        return "", []
+
+    @instrumented("qa_generation")
+    @retry("qa_generation")
+    def _answer(self, question: str, context: list, callbacks) -> str:
+        result = self.qa_chain(
+            {"question": question, "context": context},
+            callbacks=callbacks,
+        )
+        return result[self.qa_chain.output_key]
+
+    @instrumented("qa_generation")
+    @async_retry("qa_generation")
+    async def _aanswer(self, question: str, context: list, callbacks) -> str:
+        result = await self.qa_chain.acall(
+            {"question": question, "context": context},
+            callbacks=callbacks,
+        )
+        return result[self.qa_chain.output_key]
+
+    def _validate_cypher(self, cypher: str) -> str:
+        if self.cypher_query_corrector:
+            cypher = self.cypher_query_corrector(cypher)
+        if self.compactor is not None:
+            cypher = inject_limit(cypher, self.top_k)
+        return cypher
+
+    def _compact_context(self, context: list, intermediate_steps: list):
+        if self.compactor is None:
+            return context
+
+        compacted = self.compactor.compact(context)
+        LOGGER.info(f"Compacted query results: {compacted.stats()}")
+        intermediate_steps.append({"compaction": compacted.stats()})
+        return compacted.text
+
+    def _cached_cypher(self, question: str) -> tuple:
+        if self.template_cache is None:
+            return None, None
+
+        cached = self.template_cache.lookup(question)
+        if cached is None:
+            return None, None
+
+        shape, cypher = cached
+        cypher = self._validate_cypher(cypher)
+        if not cypher:
+            self.template_cache.evict(shape)
+            return None, None
+
+        return shape, cypher
+
+    def _store_template(self, question: str, cypher: str, context: list) -> None:
+        if context and self.template_cache is not None:
+            self.template_cache.store(question, cypher)
+
+    def _chain_result(self, final_result, intermediate_steps: list) -> Dict[str, Any]:
+        chain_result: Dict[str, Any] = {self.output_key: final_result}
+        if self.return_intermediate_steps:
+            chain_result[INTERMEDIATE_STEPS_KEY] = intermediate_steps
+        return chain_result
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        callbacks = _run_manager.get_child()
+        question = inputs[self.input_key]
+
+        intermediate_steps: List = []
+
+        cached_shape, generated_cypher = self._cached_cypher(question)
+        context = None
+        if cached_shape is not None:
+            _run_manager.on_text(
+                "Cypher template cache hit:", end="\n", verbose=self.verbose
+            )
+            try:
+                context = self._query_graph(generated_cypher)
+            except (RetryError, CircuitOpenError):
+                raise
+            except Exception:
+                self.template_cache.evict(cached_shape)
+                cached_shape = None
+
+        if cached_shape is None:
+            generated_cypher = self._guarded_cypher(
+                question,
+                self._validate_cypher(self._generate_cypher(question, callbacks)),
+                callbacks,
+                intermediate_steps,
+            )
+
+        _run_manager.on_text(GENERATED_CYPHER_LABEL, end="\n", verbose=self.verbose)
+        _run_manager.on_text(
+            generated_cypher, color="green", end="\n", verbose=self.verbose
+        )
+
+        intermediate_steps.append({"query": generated_cypher})
+
+        # Generated Cypher can be empty if the query corrector finds an
+        # invalid schema or the guard rejected it
+        if context is None:
+            if generated_cypher:
+                generated_cypher, context = self._run_cypher(
+                    question, generated_cypher, callbacks, intermediate_steps
+                )
+                self._store_template(question, generated_cypher, context)
+            else:
+                context = []
+
+        if self.return_direct:
+            return self._chain_result(context, intermediate_steps)
+
+        intermediate_steps.append({"context": context})
+        context = self._compact_context(context, intermediate_steps)
+
+        _run_manager.on_text("Full Context:", end="\n", verbose=self.verbose)
+        _run_manager.on_text(
+            str(context), color="green", end="\n", verbose=self.verbose
+        )
+
+        return self._chain_result(
+            self._answer(question, context, callbacks), intermediate_steps
+        )
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = (
+            run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        )
+        callbacks = _run_manager.get_child()
+        question = inputs[self.input_key]
+
+        intermediate_steps: List = []
+
+        # The template cache parses and writes a file shared with other
+        # workers, so it is kept off the event loop
+        cached_shape, generated_cypher = await asyncio.to_thread(
+            self._cached_cypher, question
+        )
+        context = None
+        if cached_shape is not None:
+            await _run_manager.on_text(
+                "Cypher template cache hit:", end="\n", verbose=self.verbose
+            )
+            try:
+                context = await self._aquery_graph(generated_cypher)
+            except (RetryError, CircuitOpenError):
+                raise
+            except Exception:
+                await asyncio.to_thread(self.template_cache.evict, cached_shape)
+                cached_shape = None
+
+        if cached_shape is None:
+            generated_cypher = await self._aguarded_cypher(
+                question,
+                self._validate_cypher(
+                    await self._agenerate_cypher(question, callbacks)
+                ),
+                callbacks,
+                intermediate_steps,
+            )
+
+        await _run_manager.on_text(
+            GENERATED_CYPHER_LABEL, end="\n", verbose=self.verbose
+        )
+        await _run_manager.on_text(
+            generated_cypher, color="green", end="\n", verbose=self.verbose
+        )
+
+        intermediate_steps.append({"query": generated_cypher})
+
+        if context is None:
+            if generated_cypher:
+                generated_cypher, context = await self._arun_cypher(
+                    question, generated_cypher, callbacks, intermediate_steps
+                )
+                await asyncio.to_thread(
+                    self._store_template, question, generated_cypher, context
+                )
+            else:
+                context = []
+
+        if self.return_direct:
+            return self._chain_result(context, intermediate_steps)
+
+        intermediate_steps.append({"context": context})
+        context = self._compact_context(context, intermediate_steps)
+
+        await _run_manager.on_text("Full Context:", end="\n", verbose=self.verbose)
+        await _run_manager.on_text(
+            str(context), color="green", end="\n", verbose=self.verbose
+        )
+
+        return self._chain_result(
+            await self._aanswer(question, context, callbacks), intermediate_steps
+        )
@@ -0,0 +1,49 @@
+import os
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from northwind_common.hashing_embeddings import hashing_embedder_name, hashing_embedding
+
+NORTHWIND_EMBEDDER = os.getenv("NORTHWIND_EMBEDDER", "openai")
+NORTHWIND_EMBEDDING_MODEL = os.getenv(
+    "NORTHWIND_EMBEDDING_MODEL", "text-embedding-ada-002"
+)
+NORTHWIND_HASHING_EMBEDDING_DIMENSIONS = int(
+    os.getenv("NORTHWIND_HASHING_EMBEDDING_DIMENSIONS", 256)
+)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings for tests and offline runs
+    without OpenAI; the ETL's HashingEmbedder uses the same shared
+    implementation, so query and review vectors match
+    """
+
+    def __init__(self, dimensions: int = NORTHWIND_HASHING_EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed_query(self, text: str) -> List[float]:
+        return hashing_embedding(text, self.dimensions)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def get_review_embeddings() -> Embeddings:
+    """Query embeddings for the review index. They must match the
+    embedder the ETL used to build it (NORTHWIND_EMBEDDER)"""
+
+    if NORTHWIND_EMBEDDER == "hashing":
+        return HashingEmbeddings()
+    return OpenAIEmbeddings(model=NORTHWIND_EMBEDDING_MODEL, max_retries=0)
+
+
+def get_review_embedder_name() -> str:
+    """The name the ETL records in the review index manifest for the
+    embedder get_review_embeddings() matches"""
+
+    if NORTHWIND_EMBEDDER == "hashing":
+        return hashing_embedder_name(NORTHWIND_HASHING_EMBEDDING_DIMENSIONS)
+    return NORTHWIND_EMBEDDING_MODEL
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from chains.northwind_cypher_chain import get_graph, load_slot_vocabulary
+from utils.artifacts import get_graph_version
+from utils.async_utils import async_retry
+from utils.intent_matcher import IntentMatcher
+from utils.lazy import lazy_singleton
+from utils.metrics import instrumented
+
+NORTHWIND_INTENTS_FILE = os.getenv(
+    "NORTHWIND_INTENTS_FILE", Path(__file__).resolve().parents[1] / "intents.json"
+)
+
+LOGGER = logging.getLogger(__name__)
+
+_vocabulary_version = {"version": None}
+
+
+@lazy_singleton
+def get_intent_matcher() -> IntentMatcher:
+    return IntentMatcher.from_file(
+        NORTHWIND_INTENTS_FILE, vocabulary_loader=load_slot_vocabulary
+    )
+
+
+@instrumented("intent_query", count_rows=True)
+@async_retry("cypher_query")
+async def _run_intent_query(cypher: str, params: dict) -> list:
+    return await get_graph().aquery(cypher, params)
+
+
+async def answer_from_intent(question: str) -> Optional[dict]:
+    """
+    Answer a question with a known shape from precompiled Cypher and an
+    answer template, without calling any LLM. Returns None when no
+    intent matches or its query fails, so the question goes to the
+    agent.
+    """
+
+    matcher = get_intent_matcher()
+
+    # Category and country values can change with every ETL load
+    graph_version = get_graph_version()
+    if _vocabulary_version["version"] != graph_version:
+        matcher.reset_vocabulary()
+        try:
+            await asyncio.to_thread(lambda: matcher.vocabulary)
+        except Exception as e:
+            LOGGER.warning(f"Intent vocabulary unavailable, skipping fast path: {e}")
+            matcher.reset_vocabulary()
+            return None
+        _vocabulary_version["version"] = graph_version
+
+    match = matcher.match(question)
+    if match is None:
+        return None
+
+    try:
+        rows = await _run_intent_query(match.intent.cypher, match.params)
+        answer = matcher.format_answer(match, rows)
+    except Exception as e:
+        LOGGER.warning(
+            f"Intent {match.intent.name} failed, falling through to the agent: {e}"
+        )
+        return None
+    if answer is None:
+        return None
+
+    return {
+        "input": question,
+        "output": answer,
+        "intermediate_steps": [
+            str({"intent": match.intent.name, "params": match.params}),
+            str({"query": match.intent.cypher}),
+        ],
+    }
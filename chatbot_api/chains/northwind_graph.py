@@ -0,0 +1,158 @@
+from typing import Any, Dict, List, Optional
+
+import neo4j
+from langchain_community.graphs import Neo4jGraph
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_community.graphs.graph_store import GraphStore
+from neo4j.exceptions import CypherSyntaxError, Neo4jError
+from utils.artifacts import get_graph_version, read_json_artifact, write_json_artifact
+from utils.neo4j_driver import (
+    NEO4J_DATABASE,
+    READ_ACCESS_MODE,
+    get_async_driver,
+    get_driver,
+)
+
+GRAPH_SCHEMA_FILE = "graph_schema.json"
+
+
+class CypherTimeoutError(Exception):
+    """A query ran past its transaction timeout"""
+
+
+def _is_timeout(e: Neo4jError) -> bool:
+    # Neo.ClientError.Transaction.TransactionTimedOut, with a
+    # ClientConfiguration suffix when the driver set the timeout
+    return "TransactionTimedOut" in (e.code or "")
+
+
+class NorthwindGraph(GraphStore):
+    """
+    Read-only Neo4j graph store for the chains. Unlike Neo4jGraph it
+    does no network work on construction: the schema comes from a local
+    snapshot and the shared drivers (utils.neo4j_driver) are only
+    created on the first query. Queries run in read sessions, so a
+    cluster routes them to followers and read replicas, and can be
+    given a transaction timeout.
+    """
+
+    def __init__(self, database: str = NEO4J_DATABASE):
+        self._database = database
+        self.schema = ""
+        self.structured_schema: Dict[str, Any] = {}
+        self.schema_graph_version = None
+
+    @property
+    def driver(self):
+        return get_driver()
+
+    @property
+    def async_driver(self):
+        return get_async_driver()
+
+    @property
+    def get_schema(self) -> str:
+        return self.schema
+
+    @property
+    def get_structured_schema(self) -> Dict[str, Any]:
+        return self.structured_schema
+
+    def load_schema_snapshot(self) -> bool:
+        snapshot = read_json_artifact(GRAPH_SCHEMA_FILE)
+        if not snapshot:
+            return False
+
+        self.schema = snapshot["schema"]
+        self.structured_schema = snapshot["structured_schema"]
+        self.schema_graph_version = snapshot.get("graph_version")
+        return True
+
+    def is_schema_stale(self) -> bool:
+        return self.schema_graph_version != get_graph_version()
+
+    def refresh_schema(self) -> None:
+        """Introspect the schema from Neo4j and snapshot it locally"""
+
+        graph_version = get_graph_version()
+        # Neo4jGraph's introspection only needs query(), so it runs over
+        # the shared pool instead of a driver of its own
+        Neo4jGraph.refresh_schema(self)
+        self.schema_graph_version = graph_version
+
+        write_json_artifact(
+            GRAPH_SCHEMA_FILE,
+            {
+                "schema": self.schema,
+                "structured_schema": self.structured_schema,
+                "graph_version": graph_version,
+            },
+        )
+
+    def query(
+        self, query: str, params: dict = {}, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        with self.driver.session(
+            database=self._database, default_access_mode=READ_ACCESS_MODE
+        ) as session:
+            try:
+                result = session.run(neo4j.Query(query, timeout=timeout), params)
+                return [record.data() for record in result]
+            except CypherSyntaxError as e:
+                raise ValueError(f"Generated Cypher Statement is not valid\n{e}")
+            except Neo4jError as e:
+                if _is_timeout(e):
+                    raise CypherTimeoutError(
+                        f"Query ran longer than its {timeout}s timeout"
+                    ) from e
+                raise
+
+    async def aquery(
+        self, query: str, params: dict = {}, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        async with self.async_driver.session(
+            database=self._database, default_access_mode=READ_ACCESS_MODE
+        ) as session:
+            try:
+                result = await session.run(neo4j.Query(query, timeout=timeout), params)
+                return [record.data() async for record in result]
+            except CypherSyntaxError as e:
+                raise ValueError(f"Generated Cypher Statement is not valid\n{e}")
+            except Neo4jError as e:
+                if _is_timeout(e):
+                    raise CypherTimeoutError(
+                        f"Query ran longer than its {timeout}s timeout"
+                    ) from e
+                raise
+
+    @staticmethod
+    def _explained(summary) -> Dict[str, Any]:
+        return {"plan": summary.plan, "query_type": summary.query_type}
+
+    def explain(self, query: str, params: dict = {}) -> Dict[str, Any]:
+        """The query's plan, with the planner's row estimates, and its
+        query type ("r" for read-only), without running it"""
+
+        with self.driver.session(
+            database=self._database, default_access_mode=READ_ACCESS_MODE
+        ) as session:
+            try:
+                summary = session.run(f"EXPLAIN {query}", params).consume()
+                return self._explained(summary)
+            except CypherSyntaxError as e:
+                raise ValueError(f"Generated Cypher Statement is not valid\n{e}")
+
+    async def aexplain(self, query: str, params: dict = {}) -> Dict[str, Any]:
+        async with self.async_driver.session(
+            database=self._database, default_access_mode=READ_ACCESS_MODE
+        ) as session:
+            try:
+                result = await session.run(f"EXPLAIN {query}", params)
+                return self._explained(await result.consume())
+            except CypherSyntaxError as e:
+                raise ValueError(f"Generated Cypher Statement is not valid\n{e}")
+
+    def add_graph_documents(
+        self, graph_documents: List[GraphDocument], include_source: bool = False
+    ) -> None:
+        raise NotImplementedError("The Northwind graph is only written by the ETL")
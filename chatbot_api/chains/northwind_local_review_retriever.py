@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain.schema import BaseRetriever, Document
+from langchain_core.embeddings import Embeddings
+from utils.artifacts import artifact_path
+from utils.async_utils import async_retry, retry
+from utils.metrics import instrumented
+
+NORTHWIND_QUERY_EMBEDDING_CACHE_SIZE = int(
+    os.getenv("NORTHWIND_QUERY_EMBEDDING_CACHE_SIZE", 1024)
+)
+
+REVIEW_INDEX_DIR = "review_index"
+REVIEW_INDEX_MANIFEST = "review_index.json"
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ReviewSnapshot(NamedTuple):
+    matrix: np.ndarray
+    ids: list
+    texts: list
+    embedder: Optional[str]
+
+
+class LocalReviewIndex:
+    """
+    Review vectors snapshotted by the ETL, memory-mapped from the
+    artifacts directory. The snapshot is reloaded whenever the ETL
+    replaces its manifest, and swapped in as a whole so a search never
+    mixes two snapshots. With an embedder name, a snapshot built with
+    another embedder is ignored, as its vectors can't be compared with
+    the query's.
+    """
+
+    def __init__(self, index_dir=None, embedder: Optional[str] = None):
+        self.index_dir = index_dir or artifact_path(REVIEW_INDEX_DIR)
+        self.manifest_path = self.index_dir / REVIEW_INDEX_MANIFEST
+        self.embedder = embedder
+        self.snapshot: Optional[ReviewSnapshot] = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _manifest_mtime(self):
+        try:
+            return self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self) -> bool:
+        """Load the snapshot if it changed, returning whether one is available"""
+
+        mtime = self._manifest_mtime()
+        if mtime is None or mtime == self._mtime:
+            return self.snapshot is not None
+
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    self.snapshot = self._load()
+                except (OSError, ValueError, KeyError) as e:
+                    # The ETL replaced the snapshot while it was read; keep
+                    # the previous one until its next manifest is written
+                    LOGGER.warning(f"Loading the review index snapshot failed: {e}")
+                self._mtime = mtime
+        return self.snapshot is not None
+
+    def _load(self) -> Optional[ReviewSnapshot]:
+        with open(self.manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        embedder = manifest.get("embedder")
+        if self.embedder is not None and embedder != self.embedder:
+            LOGGER.warning(
+                f"Review index snapshot was built with embedder {embedder}, "
+                f"not {self.embedder}; not using it"
+            )
+            return None
+
+        snapshot = ReviewSnapshot(
+            np.load(self.index_dir / manifest["vectors_file"], mmap_mode="r"),
+            manifest["ids"],
+            manifest["texts"],
+            embedder,
+        )
+        LOGGER.info(f"Loaded review index snapshot of {len(snapshot.ids)} vectors")
+        return snapshot
+
+    def accepts(self, embedding: List[float]) -> bool:
+        """Whether the snapshot's vectors have the embedding's dimensions"""
+
+        snapshot = self.snapshot
+        return snapshot is not None and (
+            not len(snapshot.matrix) or snapshot.matrix.shape[1] == len(embedding)
+        )
+
+    @instrumented("local_vector_search", count_rows=True)
+    def search(self, embedding: List[float], k: int) -> List[dict]:
+        snapshot = self.snapshot
+        if snapshot is None or not len(snapshot.matrix):
+            return []
+        matrix = snapshot.matrix
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        similarities = matrix @ query
+
+        k = min(k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        # Same score scale as the Neo4j cosine vector index
+        return [
+            {
+                "text": snapshot.texts[i],
+                "score": float((1 + similarities[i]) / 2),
+                "metadata": {"id": snapshot.ids[i]},
+            }
+            for i in top
+        ]
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of question embeddings"""
+
+    def __init__(self, max_size: int = NORTHWIND_QUERY_EMBEDDING_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._entries.get(query)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return embedding
+
+    def set(self, query: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._entries[query] = embedding
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class NorthwindLocalReviewRetriever(BaseRetriever):
+    """
+    In-process vector retriever over the ETL's review snapshot: a
+    vectorized dot product over the memory-mapped matrix instead of a
+    Neo4j vector query, with repeated questions skipping the embedding
+    call. Falls back to the Neo4j retriever while no usable snapshot
+    exists.
+    """
+
+    embeddings: Embeddings
+    index: LocalReviewIndex
+    query_cache: QueryEmbeddingCache
+    fallback: Optional[BaseRetriever] = None
+    k: int = 12
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _to_documents(self, rows: List[dict]) -> List[Document]:
+        return [
+            Document(
+                page_content=row["text"],
+                metadata={**row["metadata"], "score": row["score"]},
+            )
+            for row in rows
+        ]
+
+    @instrumented("query_embedding")
+    @retry("query_embedding")
+    def _embed_query(self, query: str) -> List[float]:
+        return self.embeddings.embed_query(query)
+
+    @instrumented("query_embedding")
+    @async_retry("query_embedding")
+    async def _aembed_query(self, query: str) -> List[float]:
+        return await self.embeddings.aembed_query(query)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if not self.index.refresh() and self.fallback is not None:
+            return self.fallback.get_relevant_documents(
+                query, callbacks=run_manager.get_child()
+            )
+
+        embedding = self.query_cache.get(query)
+        if embedding is None:
+            embedding = self._embed_query(query)
+            self.query_cache.set(query, embedding)
+        if not self.index.accepts(embedding) and self.fallback is not None:
+            return self.fallback.get_relevant_documents(
+                query, callbacks=run_manager.get_child()
+            )
+        return self._to_documents(self.index.search(embedding, self.k))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if not self.index.refresh() and self.fallback is not None:
+            return await self.fallback.aget_relevant_documents(
+                query, callbacks=run_manager.get_child()
+            )
+
+        embedding = self.query_cache.get(query)
+        if embedding is None:
+            embedding = await self._aembed_query(query)
+            self.query_cache.set(query, embedding)
+        if not self.index.accepts(embedding) and self.fallback is not None:
+            return await self.fallback.aget_relevant_documents(
+                query, callbacks=run_manager.get_child()
+            )
+        return self._to_documents(self.index.search(embedding, self.k))
@@ -1,4 +1,12 @@
 import os
+from chains.northwind_cypher_chain import get_graph
+from chains.northwind_embeddings import get_review_embedder_name, get_review_embeddings
+from chains.northwind_local_review_retriever import (
+    LocalReviewIndex,
+    NorthwindLocalReviewRetriever,
+    QueryEmbeddingCache,
+)
+from chains.northwind_review_retriever import NorthwindReviewRetriever
 from langchain.chains import RetrievalQA
 from langchain.prompts import (
     ChatPromptTemplate,
@@ -6,23 +14,14 @@ from langchain.prompts import (
     PromptTemplate,
     SystemMessagePromptTemplate,
 )
-from langchain.vectorstores.neo4j_vector import Neo4jVector
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
+from utils.lazy import lazy_singleton
 
 NORTHWIND_QA_MODEL = os.getenv("NORTHWIND_QA_MODEL")
-
-neo4j_vector_index = Neo4jVector.from_existing_graph(
-    embedding=OpenAIEmbeddings(),
-    url=os.getenv("NEO4J_URI"),
-    username=os.getenv("NEO4J_USERNAME"),
-    password=os.getenv("NEO4J_PASSWORD"),
-    index_name="reviews",
-    node_label="Review",
-    text_node_properties=[
-        "text"
-    ],
-    embedding_node_property="embedding",
-)
+NORTHWIND_LLM_MAX_RETRIES = int(os.getenv("NORTHWIND_LLM_MAX_RETRIES", 2))
+# "neo4j" queries the vector index over the network, "local" searches
+# the ETL's memory-mapped snapshot in process
+NORTHWIND_REVIEW_RETRIEVER = os.getenv("NORTHWIND_REVIEW_RETRIEVER", "neo4j")
 
 review_template = """Your job is to use customer order
 reviews to answer questions about their experience at northwind store. 
@@ -48,9 +47,44 @@ review_prompt = ChatPromptTemplate(
     input_variables=["context", "question"], messages=messages
 )
 
-reviews_vector_chain = RetrievalQA.from_chain_type(
-    llm=ChatOpenAI(model=NORTHWIND_QA_MODEL, temperature=0),
-    chain_type="stuff",
-    retriever=neo4j_vector_index.as_retriever(k=12),
-)
-reviews_vector_chain.combine_documents_chain.llm_chain.prompt = review_prompt
+
+query_embedding_cache = QueryEmbeddingCache()
+
+
+def get_review_retriever():
+    embeddings = get_review_embeddings()
+    neo4j_retriever = NorthwindReviewRetriever(
+        graph=get_graph(),
+        embeddings=embeddings,
+        index_name="reviews",
+        k=12,
+    )
+    if NORTHWIND_REVIEW_RETRIEVER != "local":
+        return neo4j_retriever
+
+    index = LocalReviewIndex(embedder=get_review_embedder_name())
+    index.refresh()
+    return NorthwindLocalReviewRetriever(
+        embeddings=embeddings,
+        index=index,
+        query_cache=query_embedding_cache,
+        fallback=neo4j_retriever,
+        k=12,
+    )
+
+
+@lazy_singleton
+def get_reviews_vector_chain() -> RetrievalQA:
+    # Review embeddings and the "reviews" index are built by the ETL,
+    # the API only embeds questions
+    reviews_vector_chain = RetrievalQA.from_chain_type(
+        llm=ChatOpenAI(
+            model=NORTHWIND_QA_MODEL,
+            temperature=0,
+            max_retries=NORTHWIND_LLM_MAX_RETRIES,
+        ),
+        chain_type="stuff",
+        retriever=get_review_retriever(),
+    )
+    reviews_vector_chain.combine_documents_chain.llm_chain.prompt = review_prompt
+    return reviews_vector_chain
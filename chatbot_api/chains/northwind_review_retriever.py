@@ -0,0 +1,78 @@
+from typing import Any, List
+
+from chains.northwind_graph import NorthwindGraph
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain.schema import BaseRetriever, Document
+from langchain_core.embeddings import Embeddings
+from utils.async_utils import async_retry, retry
+from utils.metrics import instrumented
+
+REVIEW_VECTOR_QUERY = """
+CALL db.index.vector.queryNodes($index_name, $k, $embedding)
+YIELD node, score
+RETURN node.text AS text, score, {id: node.id} AS metadata
+ORDER BY score DESC
+"""
+
+
+class NorthwindReviewRetriever(BaseRetriever):
+    """
+    Vector retriever over the "reviews" index. Unlike the Neo4jVector
+    retriever it has an async path, embedding the question with the
+    async embeddings client and querying through the async driver.
+    """
+
+    graph: NorthwindGraph
+    embeddings: Embeddings
+    index_name: str = "reviews"
+    k: int = 12
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _to_documents(self, rows: List[dict]) -> List[Document]:
+        return [
+            Document(
+                page_content=row["text"],
+                metadata={**row["metadata"], "score": row["score"]},
+            )
+            for row in rows
+        ]
+
+    def _params(self, embedding: List[float]) -> dict[str, Any]:
+        return {"index_name": self.index_name, "k": self.k, "embedding": embedding}
+
+    @instrumented("query_embedding")
+    @retry("query_embedding")
+    def _embed_query(self, query: str) -> List[float]:
+        return self.embeddings.embed_query(query)
+
+    @instrumented("query_embedding")
+    @async_retry("query_embedding")
+    async def _aembed_query(self, query: str) -> List[float]:
+        return await self.embeddings.aembed_query(query)
+
+    @instrumented("vector_query", count_rows=True)
+    @retry("vector_query")
+    def _vector_query(self, embedding: List[float]) -> List[dict]:
+        return self.graph.query(REVIEW_VECTOR_QUERY, self._params(embedding))
+
+    @instrumented("vector_query", count_rows=True)
+    @async_retry("vector_query")
+    async def _avector_query(self, embedding: List[float]) -> List[dict]:
+        return await self.graph.aquery(REVIEW_VECTOR_QUERY, self._params(embedding))
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = self._embed_query(query)
+        return self._to_documents(self._vector_query(embedding))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = await self._aembed_query(query)
+        return self._to_documents(await self._avector_query(embedding))
@@ -1,45 +1,583 @@
-from agents.northwind_rag_agent import northwind_rag_agent_executor
-from fastapi import FastAPI
-from models.northwind_rag_query import NorthwindQueryInput, NorthwindQueryOutput
-from utils.async_utils import async_retry
+from agents.northwind_rag_agent import (
+    NORTHWIND_AGENT_MODEL,
+    get_northwind_rag_agent_executor,
+    get_tool_router,
+    invoke_routed_tool,
+)
+from chains.northwind_cypher_chain import (
+    cypher_guard,
+    get_cypher_template_cache,
+    get_entity_linker,
+    get_graph,
+    get_northwind_cypher_chain,
+    refresh_graph_schema_if_stale,
+    result_compactor,
+)
+from chains.northwind_fast_path import answer_from_intent, get_intent_matcher
+from chains.northwind_review_chain import (
+    get_reviews_vector_chain,
+    query_embedding_cache,
+)
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from models.northwind_rag_query import (
+    NorthwindBatchQueryInput,
+    NorthwindBatchQueryOutput,
+    NorthwindQueryInput,
+    NorthwindQueryOutput,
+)
+from utils.answer_cache import make_answer_cache, normalize_question
+from utils.artifacts import get_graph_version
+from utils.async_utils import CircuitOpenError, RetryError, retry_stats
+from utils.conversation_store import (
+    Conversation,
+    extract_filters,
+    make_conversation_store,
+)
+from utils.metrics import (
+    MetricsCallbackHandler,
+    count_tokens,
+    render_metrics,
+    request_duration,
+    serve_metrics,
+    start_request_timings,
+)
+from utils.neo4j_driver import close_drivers, get_async_driver, get_driver, pool_stats
+from utils.prefork import serve_prefork
+from utils.single_flight import SingleFlight
+from utils.streaming import AgentEventStreamHandler, format_sse
+from utils.tool_router import Route
 import uvicorn
 import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+NORTHWIND_BATCH_CONCURRENCY = int(os.getenv("NORTHWIND_BATCH_CONCURRENCY", 8))
+NORTHWIND_API_HOST = os.getenv("NORTHWIND_API_HOST", "127.0.0.1")
+NORTHWIND_API_PORT = int(os.getenv("NORTHWIND_API_PORT", 8000))
+# Worker processes; more than one serves through a pre-forked pool
+NORTHWIND_API_WORKERS = int(os.getenv("NORTHWIND_API_WORKERS", 1))
+# With several workers, worker i serves its metrics on this port + i
+NORTHWIND_METRICS_PORT = int(os.getenv("NORTHWIND_METRICS_PORT", 9100))
+# Seconds in-flight requests get to finish on shutdown
+NORTHWIND_GRACEFUL_SHUTDOWN_SECONDS = float(
+    os.getenv("NORTHWIND_GRACEFUL_SHUTDOWN_SECONDS", 30)
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# Components built by the background warm-up. Only the required ones
+# gate readiness; the schema refresh needs Neo4j and is best effort.
+WARMUP_STEPS = [
+    ("graph_schema", get_graph, True),
+    ("cypher_chain", get_northwind_cypher_chain, True),
+    ("reviews_chain", get_reviews_vector_chain, True),
+    ("agent", get_northwind_rag_agent_executor, True),
+    ("intent_matcher", get_intent_matcher, False),
+    ("tool_router", get_tool_router, False),
+    # Streamed agent calls are counted with tiktoken, which downloads
+    # the model's encoding on first use
+    ("token_encoding", lambda: count_tokens("", NORTHWIND_AGENT_MODEL or ""), False),
+    ("entity_names", lambda: get_entity_linker().refresh(), False),
+    ("graph_schema_refresh", refresh_graph_schema_if_stale, False),
+]
+
+warmup_status = {"ready": False, "components": {}}
+
+
+def _warm_up() -> None:
+    for name, factory, required in WARMUP_STEPS:
+        start = time.perf_counter()
+        try:
+            factory()
+            warmup_status["components"][name] = {
+                "ready": True,
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+        except Exception as e:
+            LOGGER.warning(f"Warm-up of {name} failed: {e}")
+            warmup_status["components"][name] = {"ready": False, "error": str(e)}
+
+    warmup_status["ready"] = all(
+        warmup_status["components"][name]["ready"]
+        for name, _, required in WARMUP_STEPS
+        if required
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Serve immediately and build the chains in the background, so
+    start-up doesn't wait on (or fail because of) the network"""
+
+    warmup_task = asyncio.create_task(asyncio.to_thread(_warm_up))
+    yield
+    warmup_task.cancel()
+    await close_drivers()
+
 
 app = FastAPI(
     title="Northwind Chatbot",
     description="Endpoints for a northwind system graph RAG chatbot",
+    lifespan=lifespan,
 )
 
+answer_cache = make_answer_cache()
+sessions = make_conversation_store()
+# Concurrent identical questions (same normalized text, graph version
+# and session context) share one run, independently of the cache
+answer_flight = SingleFlight("answer")
+
+# Shared by all batch requests so concurrent batch jobs together stay
+# inside the LLM rate limits
+batch_semaphore = asyncio.Semaphore(NORTHWIND_BATCH_CONCURRENCY)
+
 
-@async_retry(max_retries=10, delay=1)
-async def invoke_agent_with_retry(query: str):
+async def invoke_agent(query: str, chat_history: Optional[list] = None):
     """
-    Retry the agent if a tool fails to run. This can help when there
-    are intermittent connection issues to external APIs.
+    Run the agent once. Retries happen inside the stage that failed
+    (see utils.async_utils), so LLM calls that already succeeded are
+    never repeated.
     """
 
-    return await northwind_rag_agent_executor.ainvoke({"input": query})
+    agent_executor = await asyncio.to_thread(get_northwind_rag_agent_executor)
+    return await agent_executor.ainvoke(
+        _agent_input(query, chat_history),
+        config={"callbacks": [MetricsCallbackHandler()]},
+    )
+
+
+def _agent_input(query: str, chat_history: Optional[list]) -> dict:
+    if chat_history:
+        return {"input": query, "chat_history": chat_history}
+    return {"input": query}
+
+
+def _route(query: str, chat_history: list) -> Optional[Route]:
+    """The tool to run directly for a question, or None for the agent.
+    Follow-ups always go to the agent, which can resolve them against
+    the conversation."""
+
+    if chat_history:
+        return None
+    return get_tool_router().route(query)
+
+
+async def _session_context(
+    query: NorthwindQueryInput,
+) -> tuple[Optional[Conversation], list, str]:
+    """The query's conversation, its history for the agent and the
+    answer cache key. Follow-ups are cached per conversation context,
+    since "what about 2013?" means something different in each one.
+    The session and answer stores may be SQLite databases shared with
+    other workers, so they are only called from threads."""
+
+    cache_key = normalize_question(query.text)
+    if query.session_id is None:
+        return None, [], cache_key
+
+    conversation = await asyncio.to_thread(sessions.get, query.session_id)
+    chat_history = conversation.chat_history()
+    if chat_history:
+        cache_key = f"{cache_key}|{conversation.fingerprint()}"
+    return conversation, chat_history, cache_key
+
+
+async def _record_turn(
+    query: NorthwindQueryInput,
+    conversation: Optional[Conversation],
+    query_response: dict,
+) -> None:
+    if conversation is None:
+        return
+    try:
+        filters = await asyncio.to_thread(
+            extract_filters, query.text, get_entity_linker().link
+        )
+    except Exception as e:
+        LOGGER.warning(f"Entity linking of a session question failed: {e}")
+        filters = extract_filters(query.text)
+    await asyncio.to_thread(
+        sessions.add_turn,
+        query.session_id,
+        query.text,
+        query_response["output"],
+        filters,
+    )
+
+
+def _serialize_agent_response(query_response: dict) -> dict:
+    query_response["intermediate_steps"] = [
+        str(s) for s in query_response["intermediate_steps"]
+    ]
+    return query_response
+
+
+@app.exception_handler(RetryError)
+@app.exception_handler(CircuitOpenError)
+async def handle_dependency_failure(request, exc: Exception):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 
 @app.get("/")
 async def get_status():
     return {"status": "running"}
 
+
+@app.get("/ready")
+async def get_readiness():
+    return JSONResponse(
+        status_code=200 if warmup_status["ready"] else 503,
+        content=warmup_status,
+    )
+
+
+@app.get("/stats")
+async def get_stats():
+    intent_matcher = get_intent_matcher.peek()
+    tool_router = get_tool_router.peek()
+    cypher_template_cache = get_cypher_template_cache.peek()
+    return {
+        "answer_cache": await asyncio.to_thread(answer_cache.stats),
+        "retries": retry_stats(),
+        "cypher_template_cache": (
+            cypher_template_cache.stats() if cypher_template_cache else None
+        ),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "result_compaction": result_compactor.stats(),
+        "cypher_guard": cypher_guard.stats(),
+        "intents": intent_matcher.stats() if intent_matcher else None,
+        "tool_router": tool_router.stats() if tool_router else None,
+        "neo4j_pool": pool_stats(),
+        "sessions": await asyncio.to_thread(sessions.stats),
+        "single_flight": answer_flight.stats(),
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Request, stage, token and row metrics in the Prometheus text
+    format. With several workers each one serves its own metrics on
+    NORTHWIND_METRICS_PORT + its index instead."""
+
+    if NORTHWIND_API_WORKERS > 1:
+        raise HTTPException(
+            status_code=404,
+            detail=(
+                f"Metrics are per worker: scrape ports {NORTHWIND_METRICS_PORT} "
+                f"to {NORTHWIND_METRICS_PORT + NORTHWIND_API_WORKERS - 1}"
+            ),
+        )
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4"
+    )
+
+
+async def _compute_answer(
+    text: str, chat_history: list, cache_key: str, graph_version: str
+) -> tuple[dict, str]:
+    source = "intent"
+    query_response = await answer_from_intent(text)
+    if query_response is None:
+        route = _route(text, chat_history)
+        if route is not None:
+            source = "router"
+            query_response = _serialize_agent_response(
+                await invoke_routed_tool(route, text, [MetricsCallbackHandler()])
+            )
+        else:
+            source = "agent"
+            query_response = _serialize_agent_response(
+                await invoke_agent(text, chat_history)
+            )
+            query_response.pop("chat_history", None)
+    await asyncio.to_thread(
+        answer_cache.set, cache_key, graph_version, query_response
+    )
+    return query_response, source
+
+
+async def _answer_query(query: NorthwindQueryInput) -> tuple[dict, str]:
+    conversation, chat_history, cache_key = await _session_context(query)
+    graph_version = get_graph_version()
+
+    source = None
+    if not query.bypass_cache:
+        cached_response = await asyncio.to_thread(
+            answer_cache.get, cache_key, graph_version
+        )
+        if cached_response is not None:
+            source = "cache"
+            query_response = {**cached_response, "input": query.text, "cached": True}
+
+    if source is None:
+        (query_response, source), leader = await answer_flight.do(
+            (cache_key, graph_version),
+            lambda: _compute_answer(query.text, chat_history, cache_key, graph_version),
+        )
+        if not leader:
+            source = "coalesced"
+            query_response = {**query_response, "input": query.text}
+
+    await _record_turn(query, conversation, query_response)
+    if query.session_id is not None:
+        query_response = {**query_response, "session_id": query.session_id}
+
+    return query_response, source
+
+
+def _format_timings(seconds: float, source: str, stages: dict) -> dict:
+    return {
+        "total_seconds": round(seconds, 4),
+        "source": source,
+        "stages": {
+            stage: {key: round(value, 4) for key, value in values.items()}
+            for stage, values in stages.items()
+        },
+    }
+
+
+async def answer_query(query: NorthwindQueryInput) -> dict:
+    """Answer a question from the answer cache, then from a known
+    question shape, then from the one tool the local router is confident
+    about, running the agent only when all of them miss"""
+
+    stages = start_request_timings()
+    start = time.perf_counter()
+    query_response, source = await _answer_query(query)
+    seconds = time.perf_counter() - start
+    request_duration.observe(seconds, source=source)
+
+    if query.include_timings:
+        return {**query_response, "timings": _format_timings(seconds, source, stages)}
+    return query_response
+
+
 @app.post("/northwind-rag-agent")
 async def query_northwind_agent(
     query: NorthwindQueryInput,
 ) -> NorthwindQueryOutput:
-    query_response = await invoke_agent_with_retry(query.text)
-    query_response["intermediate_steps"] = [
-        str(s) for s in query_response["intermediate_steps"]
-    ]
+    return await answer_query(query)
+
+
+@app.post("/northwind-rag-agent/batch")
+async def query_northwind_agent_batch(
+    batch: NorthwindBatchQueryInput,
+) -> NorthwindBatchQueryOutput:
+    """
+    Answer a list of questions. Identical questions (after
+    normalization) are answered once, the rest run concurrently under
+    a shared semaphore, and a failing question is reported on its own
+    item instead of failing the whole batch. Batch questions are
+    independent, so session ids are ignored.
+    """
+
+    unique_queries = {}
+    for query in batch.queries:
+        key = normalize_question(query.text)
+        if key in unique_queries:
+            first = unique_queries[key]
+            first.bypass_cache = first.bypass_cache or query.bypass_cache
+            first.include_timings = first.include_timings or query.include_timings
+        else:
+            unique_queries[key] = query.model_copy(update={"session_id": None})
+
+    async def _answer_with_limit(query: NorthwindQueryInput) -> dict:
+        async with batch_semaphore:
+            return await answer_query(query)
+
+    answers = await asyncio.gather(
+        *(_answer_with_limit(query) for query in unique_queries.values()),
+        return_exceptions=True,
+    )
+    answers_by_key = dict(zip(unique_queries, answers))
+
+    results = []
+    for query in batch.queries:
+        answer = answers_by_key[normalize_question(query.text)]
+        if isinstance(answer, Exception):
+            results.append({"input": query.text, "error": str(answer)})
+        else:
+            results.append({**answer, "input": query.text})
+
+    return {"results": results, "unique_questions": len(unique_queries)}
+
+
+async def _stream_agent_events(query: NorthwindQueryInput):
+    start = time.perf_counter()
+    conversation, chat_history, cache_key = await _session_context(query)
+    graph_version = get_graph_version()
+    session = {} if query.session_id is None else {"session_id": query.session_id}
+
+    if not query.bypass_cache:
+        cached_response = await asyncio.to_thread(
+            answer_cache.get, cache_key, graph_version
+        )
+        if cached_response is not None:
+            await _record_turn(query, conversation, cached_response)
+            request_duration.observe(time.perf_counter() - start, source="cache")
+            yield format_sse(
+                "answer",
+                {**cached_response, "input": query.text, "cached": True, **session},
+            )
+            return
+
+    # Tokens of a run can't be replayed, so a stream only joins a run of
+    # the regular endpoint and then sends just the final answer
+    in_flight = answer_flight.running((cache_key, graph_version))
+    if in_flight is not None:
+        try:
+            query_response, _ = await answer_flight.join(in_flight)
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+            return
+        await _record_turn(query, conversation, query_response)
+        request_duration.observe(time.perf_counter() - start, source="coalesced")
+        yield format_sse(
+            "answer",
+            {**query_response, "input": query.text, "cached": False, **session},
+        )
+        return
+
+    query_response = await answer_from_intent(query.text)
+    if query_response is not None:
+        await asyncio.to_thread(
+            answer_cache.set, cache_key, graph_version, query_response
+        )
+        await _record_turn(query, conversation, query_response)
+        request_duration.observe(time.perf_counter() - start, source="intent")
+        yield format_sse("answer", {**query_response, "cached": False, **session})
+        return
+
+    handler = AgentEventStreamHandler(asyncio.get_running_loop())
+    callbacks = [handler, MetricsCallbackHandler()]
+    route = _route(query.text, chat_history)
+    if route is not None:
+        source = "router"
+        yield format_sse("tool", {"tool": route.tool, "tool_input": query.text})
+        run = invoke_routed_tool(route, query.text, callbacks)
+    else:
+        source = "agent"
+        agent_executor = await asyncio.to_thread(get_northwind_rag_agent_executor)
+        run = agent_executor.ainvoke(
+            _agent_input(query.text, chat_history), config={"callbacks": callbacks}
+        )
+    agent_task = asyncio.create_task(run)
+
+    try:
+        while not agent_task.done() or not handler.queue.empty():
+            queue_get = asyncio.ensure_future(handler.queue.get())
+            done, _ = await asyncio.wait(
+                {queue_get, agent_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if queue_get in done:
+                event, data = queue_get.result()
+                yield format_sse(event, data)
+            else:
+                queue_get.cancel()
+
+        query_response = _serialize_agent_response(agent_task.result())
+        query_response.pop("chat_history", None)
+    except Exception as e:
+        yield format_sse("error", {"detail": str(e)})
+        return
+    finally:
+        if not agent_task.done():
+            agent_task.cancel()
+
+    await asyncio.to_thread(
+        answer_cache.set, cache_key, graph_version, query_response
+    )
+    await _record_turn(query, conversation, query_response)
+    request_duration.observe(time.perf_counter() - start, source=source)
+    yield format_sse("answer", {**query_response, "cached": False, **session})
+
+
+@app.post("/northwind-rag-agent/stream")
+async def stream_northwind_agent(query: NorthwindQueryInput) -> StreamingResponse:
+    """
+    Stream the agent run as server-sent events: "tool" when the agent
+    picks a tool, "cypher" for generated Cypher, "token" for answer
+    tokens and a final "answer" (or "error") event. Questions the local
+    router sends straight to a tool get its "tool" event and the answer
+    without "token" events, as no agent LLM call is made. Unlike the regular
+    endpoint the run isn't retried, since tokens already sent to the
+    client can't be taken back.
+    """
+
+    return StreamingResponse(
+        _stream_agent_events(query), media_type="text/event-stream"
+    )
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """The compacted history follow-ups in a session are answered with"""
+
+    conversation = await asyncio.to_thread(sessions.get, session_id, False)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"session_id": session_id, **conversation.to_dict()}
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not await asyncio.to_thread(sessions.delete, session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"session_id": session_id, "deleted": True}
+
+
+def _preload() -> None:
+    """Build the chains before forking, so workers share them instead
+    of each building its own"""
+
+    for name, factory, required in WARMUP_STEPS:
+        if not required:
+            continue
+        try:
+            factory()
+        except Exception as e:
+            LOGGER.warning(f"Preloading {name} failed, workers will retry: {e}")
+
+    # Driver connections must not be shared across a fork
+    driver = get_driver.peek()
+    if driver is not None:
+        driver.close()
+    get_driver.reset()
+
+
+def _after_fork(index: int) -> None:
+    get_driver.reset()
+    get_async_driver.reset()
+    try:
+        serve_metrics(NORTHWIND_API_HOST, NORTHWIND_METRICS_PORT + index)
+    except OSError as e:
+        LOGGER.warning(f"Worker {index} can't serve its metrics: {e}")
 
-    return query_response
 
 async def main():
-    config = uvicorn.Config("main:app", port=8000, log_level="info")
+    config = uvicorn.Config(
+        "main:app",
+        host=NORTHWIND_API_HOST,
+        port=NORTHWIND_API_PORT,
+        log_level="info",
+        timeout_graceful_shutdown=NORTHWIND_GRACEFUL_SHUTDOWN_SECONDS,
+    )
     server = uvicorn.Server(config)
     await server.serve()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if NORTHWIND_API_WORKERS > 1:
+        _preload()
+        serve_prefork(
+            app,
+            NORTHWIND_API_HOST,
+            NORTHWIND_API_PORT,
+            NORTHWIND_API_WORKERS,
+            NORTHWIND_GRACEFUL_SHUTDOWN_SECONDS,
+            after_fork=_after_fork,
+        )
+    else:
+        asyncio.run(main())
\ No newline at end of file
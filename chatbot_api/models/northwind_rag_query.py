@@ -1,11 +1,39 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
 class NorthwindQueryInput(BaseModel):
     text: str
+    bypass_cache: bool = False
+    include_timings: bool = False
+    # Follow-up questions in the same session are answered with the
+    # earlier turns as context
+    session_id: Optional[str] = None
 
 
 class NorthwindQueryOutput(BaseModel):
     input: str
     output: str
     intermediate_steps: list[str]
+    cached: bool = False
+    timings: Optional[dict] = None
+    session_id: Optional[str] = None
+
+
+class NorthwindBatchQueryInput(BaseModel):
+    queries: list[NorthwindQueryInput]
+
+
+class NorthwindBatchItemOutput(BaseModel):
+    input: str
+    output: Optional[str] = None
+    intermediate_steps: list[str] = []
+    cached: bool = False
+    timings: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class NorthwindBatchQueryOutput(BaseModel):
+    results: list[NorthwindBatchItemOutput]
+    unique_questions: int
@@ -0,0 +1,231 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from utils.artifacts import artifact_path
+
+NORTHWIND_ANSWER_CACHE_MAX_SIZE = int(
+    os.getenv("NORTHWIND_ANSWER_CACHE_MAX_SIZE", 1024)
+)
+NORTHWIND_ANSWER_CACHE_TTL = float(os.getenv("NORTHWIND_ANSWER_CACHE_TTL", 3600))
+# "memory" keeps the cache per process, "sqlite" shares it between the
+# worker processes of one host (the default with several workers)
+NORTHWIND_ANSWER_CACHE_BACKEND = os.getenv(
+    "NORTHWIND_ANSWER_CACHE_BACKEND",
+    "sqlite" if int(os.getenv("NORTHWIND_API_WORKERS", 1)) > 1 else "memory",
+)
+NORTHWIND_ANSWER_CACHE_FILE = os.getenv(
+    "NORTHWIND_ANSWER_CACHE_FILE", "answer_cache.sqlite"
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_QUOTES_RE = re.compile(r"[\"“”]")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalize a question so trivially different spellings of the same
+    question share a cache entry: unicode form, case, quoting,
+    whitespace and trailing punctuation are ignored.
+    """
+
+    text = unicodedata.normalize("NFKC", text)
+    text = _QUOTES_RE.sub("", text.lower())
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    Bounded in-memory answer cache with TTL and LRU eviction. Each
+    entry is tagged with the graph data version it was computed
+    against, and entries from an older version count as misses.
+    """
+
+    def __init__(
+        self,
+        max_size: int = NORTHWIND_ANSWER_CACHE_MAX_SIZE,
+        ttl: float = NORTHWIND_ANSWER_CACHE_TTL,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, graph_version: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, version, expires_at = entry
+            if version != graph_version or expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, graph_version: str, value) -> None:
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, graph_version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SharedAnswerCache:
+    """
+    AnswerCache stored in a local SQLite database, so every worker
+    process on the host reads the answers the others computed. Each
+    process (and thread) opens its own connection; WAL mode lets reads
+    run while another process writes. Hit and miss counts are per
+    process.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        max_size: int = NORTHWIND_ANSWER_CACHE_MAX_SIZE,
+        ttl: float = NORTHWIND_ANSWER_CACHE_TTL,
+    ):
+        self.path = path or artifact_path(NORTHWIND_ANSWER_CACHE_FILE)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are keyed on the pid
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                graph_version TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS answers_used_at ON answers (used_at)")
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def get(self, key: str, graph_version: str):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, graph_version, expires_at FROM answers WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            self._count(misses=1)
+            return None
+
+        value, version, expires_at = row
+        # Wall-clock time, since expiry is compared across processes
+        now = time.time()
+        if version != graph_version or expires_at <= now:
+            conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._count(misses=1, expirations=1)
+            return None
+
+        conn.execute("UPDATE answers SET used_at = ? WHERE key = ?", (now, key))
+        self._count(hits=1)
+        return json.loads(value)
+
+    def set(self, key: str, graph_version: str, value) -> None:
+        if self.max_size <= 0:
+            return
+
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+            (key, graph_version, json.dumps(value, default=str), now + self.ttl, now),
+        )
+        evicted = conn.execute(
+            """DELETE FROM answers WHERE key IN (
+                SELECT key FROM answers ORDER BY used_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_size,),
+        ).rowcount
+        if evicted > 0:
+            self._count(evictions=evicted)
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM answers")
+
+    def stats(self) -> dict:
+        size = self._connection().execute("SELECT count(*) FROM answers").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite",
+                "size": size,
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def make_answer_cache():
+    """The answer cache of NORTHWIND_ANSWER_CACHE_BACKEND"""
+
+    if NORTHWIND_ANSWER_CACHE_BACKEND == "sqlite":
+        return SharedAnswerCache()
+    return AnswerCache()
@@ -0,0 +1,63 @@
+import json
+import os
+from pathlib import Path
+
+NORTHWIND_ARTIFACTS_DIR = Path(
+    os.getenv(
+        "NORTHWIND_ARTIFACTS_DIR",
+        Path(__file__).resolve().parents[2] / "artifacts",
+    )
+)
+
+GRAPH_VERSION_FILE = "graph_version.json"
+
+_graph_version_cache = {"mtime": None, "version": None}
+
+
+def artifact_path(name: str) -> Path:
+    """Path of a file in the artifacts directory shared with the ETL"""
+
+    return NORTHWIND_ARTIFACTS_DIR / name
+
+
+def read_json_artifact(name: str, default=None):
+    path = artifact_path(name)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def write_json_artifact(name: str, data) -> Path:
+    """Write a JSON artifact atomically so readers never see a
+    partially written file"""
+
+    path = artifact_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_graph_version() -> str:
+    """
+    Return the graph data version published by the ETL. The file is
+    only re-read when its modification time changes, so this is cheap
+    enough to call on every request.
+    """
+
+    path = artifact_path(GRAPH_VERSION_FILE)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return "unversioned"
+
+    if mtime != _graph_version_cache["mtime"]:
+        data = read_json_artifact(GRAPH_VERSION_FILE, default={})
+        _graph_version_cache["version"] = str(data.get("version", "unversioned"))
+        _graph_version_cache["mtime"] = mtime
+
+    return _graph_version_cache["version"]
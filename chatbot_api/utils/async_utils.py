@@ -1,18 +1,243 @@
 import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
 
+import openai
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+from utils.metrics import record_retry
+
+NORTHWIND_RETRY_BUDGET_RATIO = float(os.getenv("NORTHWIND_RETRY_BUDGET_RATIO", 0.1))
+NORTHWIND_RETRY_BUDGET_MAX = float(os.getenv("NORTHWIND_RETRY_BUDGET_MAX", 20))
+NORTHWIND_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.getenv("NORTHWIND_CIRCUIT_FAILURE_THRESHOLD", 5)
+)
+NORTHWIND_CIRCUIT_RESET_SECONDS = float(
+    os.getenv("NORTHWIND_CIRCUIT_RESET_SECONDS", 30)
+)
+
+LOGGER = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (
+    ServiceUnavailable,
+    SessionExpired,
+    TransientError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class RetryError(Exception):
+    """A stage kept failing with transient errors. The last error is
+    chained as __cause__."""
+
+    def __init__(self, stage: str, attempts: int):
+        super().__init__(f"Stage '{stage}' failed after {attempts} attempts")
+        self.stage = stage
+        self.attempts = attempts
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Stage '{stage}' is failing, not calling it for now")
+        self.stage = stage
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Only errors that may succeed on a second try are retried;
+    validation, syntax and authentication errors never are"""
+
+    return isinstance(exc, TRANSIENT_ERRORS)
+
+
+class RetryBudget:
+    """
+    Token bucket shared by all stages: every first attempt deposits a
+    fraction of a token and every retry spends a whole one, so retries
+    stay a bounded share of traffic instead of multiplying the load on
+    a dependency that is already down.
+    """
+
+    def __init__(
+        self,
+        ratio: float = NORTHWIND_RETRY_BUDGET_RATIO,
+        max_tokens: float = NORTHWIND_RETRY_BUDGET_MAX,
+    ):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def record_attempt(self) -> None:
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Fail fast after repeated failures of a stage, letting a single
+    trial call through once the reset timeout has passed"""
+
+    def __init__(
+        self,
+        failure_threshold: int = NORTHWIND_CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = NORTHWIND_CIRCUIT_RESET_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                # Half-open: the next failure re-opens the circuit
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+
+retry_budget = RetryBudget()
+circuit_breakers = defaultdict(CircuitBreaker)
+_retry_counters = defaultdict(lambda: defaultdict(int))
+
+
+def retry_stats() -> dict:
+    return {
+        "budget_tokens": round(retry_budget.tokens, 2),
+        "stages": {
+            stage: {
+                **counters,
+                "circuit_open": circuit_breakers[stage].is_open,
+            }
+            for stage, counters in _retry_counters.items()
+        },
+    }
+
+
+def _backoff(attempt: int, delay: float, max_delay: float) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+
+
+def _should_retry(stage: str, exc: Exception, attempt: int, max_retries: int) -> bool:
+    counters = _retry_counters[stage]
+    if not is_transient_error(exc):
+        counters["permanent_errors"] += 1
+        return False
+
+    circuit_breakers[stage].record_failure()
+    if attempt > max_retries:
+        counters["exhausted"] += 1
+        return False
+    if not retry_budget.try_spend():
+        counters["budget_exhausted"] += 1
+        return False
+
+    counters["retries"] += 1
+    record_retry(stage)
+    LOGGER.warning(f"Attempt {attempt} of stage '{stage}' failed: {exc}")
+    return True
+
+
+def _before_attempt(stage: str, attempt: int) -> None:
+    if not circuit_breakers[stage].allow():
+        _retry_counters[stage]["circuit_rejections"] += 1
+        raise CircuitOpenError(stage)
+    if attempt == 1:
+        _retry_counters[stage]["calls"] += 1
+        retry_budget.record_attempt()
+
+
+def async_retry(
+    stage: str, max_retries: int = 3, delay: float = 0.5, max_delay: float = 8
+):
+    """
+    Retry a single pipeline stage (a Neo4j query, an embedding call, an
+    LLM call) on transient errors with exponential backoff and jitter.
+    Permanent errors are raised immediately, retries draw from a global
+    budget and a per-stage circuit breaker fails fast during outages.
+    """
 
-def async_retry(max_retries: int = 3, delay: int = 1):
     def decorator(func):
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            for attempt in range(1, max_retries + 1):
+            attempt = 1
+            while True:
+                _before_attempt(stage, attempt)
                 try:
                     result = await func(*args, **kwargs)
-                    return result
                 except Exception as e:
-                    print(f"Attempt {attempt} failed: {str(e)}")
-                    await asyncio.sleep(delay)
+                    if not _should_retry(stage, e, attempt, max_retries):
+                        if is_transient_error(e):
+                            raise RetryError(stage, attempt) from e
+                        raise
+                    await asyncio.sleep(_backoff(attempt, delay, max_delay))
+                    attempt += 1
+                    continue
+
+                circuit_breakers[stage].record_success()
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def retry(stage: str, max_retries: int = 3, delay: float = 0.5, max_delay: float = 8):
+    """Synchronous counterpart of async_retry for the sync chain paths"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            attempt = 1
+            while True:
+                _before_attempt(stage, attempt)
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if not _should_retry(stage, e, attempt, max_retries):
+                        if is_transient_error(e):
+                            raise RetryError(stage, attempt) from e
+                        raise
+                    time.sleep(_backoff(attempt, delay, max_delay))
+                    attempt += 1
+                    continue
 
-            raise ValueError(f"Failed after {max_retries} attempts")
+                circuit_breakers[stage].record_success()
+                return result
 
         return wrapper
 
@@ -0,0 +1,360 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, NamedTuple, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from utils.artifacts import artifact_path
+
+NORTHWIND_SESSION_MAX_SESSIONS = int(os.getenv("NORTHWIND_SESSION_MAX_SESSIONS", 1000))
+# Sessions idle for longer than this are dropped
+NORTHWIND_SESSION_TTL = float(os.getenv("NORTHWIND_SESSION_TTL", 3600))
+# Turns passed to the agent verbatim; older ones are folded into the summary
+NORTHWIND_SESSION_RECENT_TURNS = int(os.getenv("NORTHWIND_SESSION_RECENT_TURNS", 3))
+NORTHWIND_SESSION_SUMMARY_CHARS = int(
+    os.getenv("NORTHWIND_SESSION_SUMMARY_CHARS", 600)
+)
+NORTHWIND_SESSION_ANSWER_CHARS = int(os.getenv("NORTHWIND_SESSION_ANSWER_CHARS", 400))
+# "memory" keeps sessions per process, "sqlite" shares them between the
+# worker processes of one host (the default with several workers)
+NORTHWIND_SESSION_BACKEND = os.getenv(
+    "NORTHWIND_SESSION_BACKEND",
+    "sqlite" if int(os.getenv("NORTHWIND_API_WORKERS", 1)) > 1 else "memory",
+)
+NORTHWIND_SESSION_FILE = os.getenv("NORTHWIND_SESSION_FILE", "sessions.sqlite")
+
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    if len(text) <= max_chars:
+        return text
+    return text[: max_chars - 3].rstrip() + "..."
+
+
+def extract_filters(
+    question: str, link: Optional[Callable[[str], dict]] = None
+) -> dict[str, str]:
+    """Filters a question sets: its year(s) and, through the entity
+    linker's link(), the category, country, product or supplier"""
+
+    filters = {}
+    years = _YEAR_RE.findall(question)
+    if years:
+        filters["year"] = ", ".join(dict.fromkeys(years))
+    if link is not None:
+        for entity_type, names in link(question).items():
+            filters[entity_type] = ", ".join(names[:2])
+    return filters
+
+
+class Turn(NamedTuple):
+    question: str
+    answer: str
+
+
+class Conversation:
+    """
+    History of one session, bounded however long it runs: the last few
+    turns are kept verbatim (answers shortened), older questions are
+    compacted into a fixed-size summary, and the latest value of each
+    filter (year, category, country, ...) is carried forward.
+    """
+
+    def __init__(
+        self,
+        recent_turns: int = NORTHWIND_SESSION_RECENT_TURNS,
+        summary_chars: int = NORTHWIND_SESSION_SUMMARY_CHARS,
+        answer_chars: int = NORTHWIND_SESSION_ANSWER_CHARS,
+    ):
+        self.recent_turns = recent_turns
+        self.summary_chars = summary_chars
+        self.answer_chars = answer_chars
+        self.turns: deque[Turn] = deque()
+        self.summary = ""
+        self.filters: dict[str, str] = {}
+        self.num_turns = 0
+
+    def _compact(self, turn: Turn) -> None:
+        # Keep the most recent earlier questions that fit, oldest dropped first
+        summary = f"{self.summary} {turn.question}".strip()
+        if len(summary) > self.summary_chars:
+            summary = "..." + summary[-(self.summary_chars - 3) :].lstrip()
+        self.summary = summary
+
+    def add_turn(self, question: str, answer: str, filters: dict) -> None:
+        self.turns.append(Turn(question, _shorten(answer, self.answer_chars)))
+        self.filters.update(filters)
+        self.num_turns += 1
+        while len(self.turns) > self.recent_turns:
+            self._compact(self.turns.popleft())
+
+    def chat_history(self) -> list[BaseMessage]:
+        """History messages for the agent prompt's chat_history"""
+
+        messages = []
+        context = []
+        if self.summary:
+            context.append(f"Earlier questions: {self.summary}")
+        if self.filters:
+            context.append(
+                "Filters from earlier questions (use them when a follow-up "
+                "question leaves them out): "
+                + "; ".join(f"{key}: {value}" for key, value in self.filters.items())
+            )
+        if context:
+            messages.append(SystemMessage(content="\n".join(context)))
+        for turn in self.turns:
+            messages.append(HumanMessage(content=turn.question))
+            messages.append(AIMessage(content=turn.answer))
+        return messages
+
+    def fingerprint(self) -> str:
+        """Identifies the context a follow-up is answered in, so answers
+        are only cached for the same question in the same context"""
+
+        digest = hashlib.sha1()
+        for message in self.chat_history():
+            digest.update(f"{message.type}:{message.content}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def to_dict(self) -> dict:
+        return {
+            "turns": self.num_turns,
+            "summary": self.summary,
+            "filters": dict(self.filters),
+            "recent": [turn._asdict() for turn in self.turns],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Conversation":
+        conversation = cls()
+        conversation.num_turns = data["turns"]
+        conversation.summary = data["summary"]
+        conversation.filters = dict(data["filters"])
+        conversation.turns = deque(Turn(**turn) for turn in data["recent"])
+        return conversation
+
+
+class ConversationStore:
+    """Bounded in-memory session store with idle expiry and LRU
+    eviction"""
+
+    def __init__(
+        self,
+        max_sessions: int = NORTHWIND_SESSION_MAX_SESSIONS,
+        ttl: float = NORTHWIND_SESSION_TTL,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, session_id: str, create: bool = True) -> Optional[Conversation]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and entry[1] <= now:
+                del self._sessions[session_id]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                if not create:
+                    return None
+                entry = (Conversation(), 0.0)
+
+            conversation = entry[0]
+            self._sessions[session_id] = (conversation, now + self.ttl)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            return conversation
+
+    def add_turn(
+        self, session_id: str, question: str, answer: str, filters: dict
+    ) -> None:
+        """Append a turn to a session, unless it was deleted or evicted
+        meanwhile"""
+
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry[0].add_turn(question, answer, filters)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._sessions),
+                "max_size": self.max_sessions,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SharedConversationStore:
+    """
+    ConversationStore kept in a local SQLite database, so a follow-up
+    finds its session whichever worker process serves it. A
+    conversation read with get() is written back with save() once the
+    turn is added. Eviction and expiration counts are per process.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        max_sessions: int = NORTHWIND_SESSION_MAX_SESSIONS,
+        ttl: float = NORTHWIND_SESSION_TTL,
+    ):
+        self.path = path or artifact_path(NORTHWIND_SESSION_FILE)
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are keyed on the pid
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )"""
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)"
+        )
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _read(self, conn: sqlite3.Connection, session_id: str, now: float):
+        row = conn.execute(
+            "SELECT value, expires_at FROM sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._count(expirations=1)
+            return None
+        return Conversation.from_dict(json.loads(row[0]))
+
+    def get(self, session_id: str, create: bool = True) -> Optional[Conversation]:
+        # Wall-clock time, since expiry is compared across processes
+        now = time.time()
+        with self._transaction() as conn:
+            conversation = self._read(conn, session_id, now)
+            if conversation is not None:
+                conn.execute(
+                    "UPDATE sessions SET expires_at = ? WHERE session_id = ?",
+                    (now + self.ttl, session_id),
+                )
+                return conversation
+            if not create:
+                return None
+
+            conversation = Conversation()
+            conn.execute(
+                "INSERT INTO sessions VALUES (?, ?, ?)",
+                (session_id, json.dumps(conversation.to_dict()), now + self.ttl),
+            )
+            # Sessions expire a fixed ttl after their last use, so the
+            # earliest expiry is the least recently used
+            evicted = conn.execute(
+                """DELETE FROM sessions WHERE session_id IN (
+                    SELECT session_id FROM sessions
+                    ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_sessions,),
+            ).rowcount
+        if evicted > 0:
+            self._count(evictions=evicted)
+        return conversation
+
+    def add_turn(
+        self, session_id: str, question: str, answer: str, filters: dict
+    ) -> None:
+        """Append a turn to the stored session (re-read in the same
+        transaction), unless it was deleted or expired meanwhile"""
+
+        now = time.time()
+        with self._transaction() as conn:
+            conversation = self._read(conn, session_id, now)
+            if conversation is None:
+                return
+            conversation.add_turn(question, answer, filters)
+            conn.execute(
+                "UPDATE sessions SET value = ?, expires_at = ? WHERE session_id = ?",
+                (json.dumps(conversation.to_dict()), now + self.ttl, session_id),
+            )
+
+    def delete(self, session_id: str) -> bool:
+        return (
+            self._connection()
+            .execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            .rowcount
+            > 0
+        )
+
+    def stats(self) -> dict:
+        size = self._connection().execute("SELECT count(*) FROM sessions").fetchone()[0]
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "size": size,
+                "max_size": self.max_sessions,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def make_conversation_store():
+    """The session store of NORTHWIND_SESSION_BACKEND"""
+
+    if NORTHWIND_SESSION_BACKEND == "sqlite":
+        return SharedConversationStore()
+    return ConversationStore()
@@ -0,0 +1,206 @@
+import logging
+import os
+import re
+import threading
+from typing import NamedTuple, Optional
+
+from utils.metrics import Counter, register
+from utils.result_compaction import inject_limit
+
+# Plans whose operators together expect to touch more rows than this
+# are rejected
+NORTHWIND_CYPHER_MAX_COST = float(os.getenv("NORTHWIND_CYPHER_MAX_COST", 5_000_000))
+NORTHWIND_CYPHER_MAX_CARTESIAN_ROWS = float(
+    os.getenv("NORTHWIND_CYPHER_MAX_CARTESIAN_ROWS", 100_000)
+)
+# Upper bound given to variable-length relationships without one
+NORTHWIND_CYPHER_MAX_HOPS = int(os.getenv("NORTHWIND_CYPHER_MAX_HOPS", 4))
+# Transaction timeout of generated queries, in seconds
+NORTHWIND_CYPHER_TIMEOUT = float(os.getenv("NORTHWIND_CYPHER_TIMEOUT", 10))
+
+LOGGER = logging.getLogger(__name__)
+
+# [*], [r*], [:T*2..] and the like: a star whose range has no upper end
+_UNBOUNDED_HOPS_RE = re.compile(r"\*\s*(\d*)\s*(\.\.)?\s*(?=\])")
+
+guard_decisions = Counter(
+    "northwind_cypher_guard_decisions_total",
+    "Generated Cypher queries by cost guard decision",
+)
+register(guard_decisions)
+
+
+class PlanCost(NamedTuple):
+    """Cost of an EXPLAIN plan from the planner's row estimates"""
+
+    cost: float
+    estimated_rows: float
+    cartesian_rows: float
+    operators: tuple
+
+    def to_dict(self) -> dict:
+        return {
+            "cost": round(self.cost),
+            "estimated_rows": round(self.estimated_rows),
+            "cartesian_rows": round(self.cartesian_rows),
+        }
+
+
+class GuardDecision(NamedTuple):
+    action: str
+    cypher: str
+    reason: Optional[str] = None
+    cost: Optional[PlanCost] = None
+
+
+def _operator_name(plan: dict) -> str:
+    return plan.get("operatorType", "").split("@")[0]
+
+
+def plan_cost(plan: dict) -> PlanCost:
+    """Sum the estimated rows of every operator as the work the query
+    will do; cartesian products are tracked on their own"""
+
+    cost = cartesian_rows = 0.0
+    operators = []
+    stack = [plan] if plan else []
+    while stack:
+        operator = stack.pop()
+        rows = float(operator.get("arguments", {}).get("EstimatedRows", 0) or 0)
+        name = _operator_name(operator)
+        operators.append(name)
+        cost += rows
+        if name == "CartesianProduct":
+            cartesian_rows = max(cartesian_rows, rows)
+        stack.extend(operator.get("children", []))
+
+    estimated_rows = float(
+        (plan or {}).get("arguments", {}).get("EstimatedRows", 0) or 0
+    )
+    return PlanCost(cost, estimated_rows, cartesian_rows, tuple(operators))
+
+
+def bound_hops(cypher: str, max_hops: int = NORTHWIND_CYPHER_MAX_HOPS) -> str:
+    """Give variable-length relationships without an upper bound one,
+    max_hops or the lower bound if that is higher"""
+
+    def _bound(match: re.Match) -> str:
+        lower, is_range = match.group(1), match.group(2)
+        if lower and not is_range:
+            # [*3] is an exact length, already bounded
+            return match.group(0)
+        lower = int(lower or 1)
+        return f"*{lower}..{max(lower, max_hops)}"
+
+    return _UNBOUNDED_HOPS_RE.sub(_bound, cypher)
+
+
+class CypherGuard:
+    """
+    Inspect the EXPLAIN plan of a generated query before it runs.
+    Writes are rejected outright; unbounded variable-length paths are
+    bounded and a LIMIT is added, after which the caller re-explains the
+    rewritten query; plans whose estimated cost or cartesian product
+    size is over the limits are rejected, so the chain can ask the LLM
+    for a cheaper query once. Queries that time out anyway are handled
+    the same way.
+    """
+
+    def __init__(
+        self,
+        max_cost: float = NORTHWIND_CYPHER_MAX_COST,
+        max_cartesian_rows: float = NORTHWIND_CYPHER_MAX_CARTESIAN_ROWS,
+        max_hops: int = NORTHWIND_CYPHER_MAX_HOPS,
+        row_limit: int = 100,
+    ):
+        self.max_cost = max_cost
+        self.max_cartesian_rows = max_cartesian_rows
+        self.max_hops = max_hops
+        self.row_limit = row_limit
+        self._counts = {
+            "accept": 0,
+            "rewrite": 0,
+            "reject": 0,
+            "timeout": 0,
+            "regenerate": 0,
+        }
+        self._lock = threading.Lock()
+
+    def rewrite(self, cypher: str) -> str:
+        return inject_limit(bound_hops(cypher, self.max_hops), self.row_limit)
+
+    def check(self, cypher: str, explained: dict) -> GuardDecision:
+        """Decide on a query from the graph's explain() result"""
+
+        cost = plan_cost(explained.get("plan"))
+        query_type = explained.get("query_type")
+        if query_type not in (None, "r"):
+            return self._decide(
+                GuardDecision(
+                    "reject", cypher, f"query type '{query_type}' is not read-only"
+                ),
+                cost,
+            )
+
+        rewritten = self.rewrite(cypher)
+        if rewritten != cypher:
+            return self._decide(
+                GuardDecision("rewrite", rewritten, "unbounded path or no LIMIT"), cost
+            )
+
+        if cost.cartesian_rows > self.max_cartesian_rows:
+            reason = (
+                f"a cartesian product of about {cost.cartesian_rows:.0f} rows; "
+                "connect the matched patterns instead"
+            )
+            return self._decide(GuardDecision("reject", cypher, reason), cost)
+        if cost.cost > self.max_cost:
+            reason = (
+                f"an estimated cost of {cost.cost:.0f} rows, over the limit "
+                f"of {self.max_cost:.0f}; filter earlier or use SalesSummary"
+            )
+            return self._decide(GuardDecision("reject", cypher, reason), cost)
+
+        return self._decide(GuardDecision("accept", cypher), cost)
+
+    def reject(self, cypher: str, reason: str) -> GuardDecision:
+        """Reject a query that couldn't be explained, e.g. invalid Cypher"""
+
+        return self._decide(
+            GuardDecision("reject", cypher, reason), PlanCost(0, 0, 0, ())
+        )
+
+    def timed_out(self, cypher: str, timeout: Optional[float]) -> GuardDecision:
+        """Reject a query that passed the plan check but ran past its
+        transaction timeout"""
+
+        reason = (
+            f"it ran longer than the {timeout}s timeout; "
+            "filter earlier or use SalesSummary"
+        )
+        self.record("timeout")
+        LOGGER.warning(f"Cypher guard timeout ({reason})\n{cypher}")
+        return GuardDecision("reject", cypher, reason, PlanCost(0, 0, 0, ()))
+
+    def _decide(self, decision: GuardDecision, cost: PlanCost) -> GuardDecision:
+        self.record(decision.action)
+        log = LOGGER.warning if decision.action == "reject" else LOGGER.info
+        log(
+            f"Cypher guard {decision.action}: {cost.to_dict()}"
+            + (f" ({decision.reason})" if decision.reason else "")
+            + (f"\n{decision.cypher}" if decision.action == "reject" else "")
+        )
+        return decision._replace(cost=cost)
+
+    def record(self, action: str) -> None:
+        guard_decisions.inc(decision=action)
+        with self._lock:
+            self._counts[action] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counts,
+                "max_cost": self.max_cost,
+                "max_cartesian_rows": self.max_cartesian_rows,
+            }
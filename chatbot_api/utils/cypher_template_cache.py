@@ -0,0 +1,313 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from utils.artifacts import artifact_path, read_json_artifact, write_json_artifact
+
+NORTHWIND_CYPHER_CACHE_FILE = os.getenv(
+    "NORTHWIND_CYPHER_CACHE_FILE", "cypher_template_cache.json"
+)
+NORTHWIND_CYPHER_CACHE_MAX_SIZE = int(
+    os.getenv("NORTHWIND_CYPHER_CACHE_MAX_SIZE", 512)
+)
+
+_DOUBLE_QUOTED_RE = re.compile(r'"([^"]+)"')
+_SINGLE_QUOTED_RE = re.compile(r"(?<![\w'])'([^']+)'(?![\w'])")
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+_NUMBER_RE = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+_PLACEHOLDER_RE = re.compile(r"\{\{(\w+?)([+-]1)?\}\}")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _escape_cypher_string(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
+
+
+def extract_slots(question: str, vocabulary: dict[str, list[str]]) -> tuple:
+    """
+    Pull literal values out of a question. Returns the question shape,
+    with every literal replaced by its slot type, and the list of
+    (slot_name, slot_type, value) triples in order of appearance.
+    Vocabulary terms (category names, countries, ...) are returned in
+    their canonical spelling.
+    """
+
+    spans = []
+
+    def _free(start, end):
+        return all(end <= s or start >= e for s, e, _, _ in spans)
+
+    for regex in (_DOUBLE_QUOTED_RE, _SINGLE_QUOTED_RE):
+        for match in regex.finditer(question):
+            if _free(match.start(), match.end()):
+                spans.append((match.start(), match.end(), "text", match.group(1)))
+
+    terms = [
+        (term, slot_type)
+        for slot_type, values in vocabulary.items()
+        for term in values
+        if term
+    ]
+    for term, slot_type in sorted(terms, key=lambda t: len(t[0]), reverse=True):
+        pattern = re.compile(rf"(?<!\w){re.escape(term)}(?!\w)", re.IGNORECASE)
+        for match in pattern.finditer(question):
+            if _free(match.start(), match.end()):
+                spans.append((match.start(), match.end(), slot_type, term))
+
+    for slot_type, regex in (("year", _YEAR_RE), ("number", _NUMBER_RE)):
+        for match in regex.finditer(question):
+            if _free(match.start(), match.end()):
+                spans.append((match.start(), match.end(), slot_type, match.group(0)))
+
+    spans.sort()
+    slots = []
+    shape_parts = []
+    counters = {}
+    last_end = 0
+    for start, end, slot_type, value in spans:
+        index = counters.get(slot_type, 0)
+        counters[slot_type] = index + 1
+        slots.append((f"{slot_type}_{index}", slot_type, value))
+        shape_parts.append(question[last_end:start].lower())
+        shape_parts.append(f"<{slot_type}>")
+        last_end = end
+    shape_parts.append(question[last_end:].lower())
+
+    shape = _WHITESPACE_RE.sub(" ", "".join(shape_parts)).strip().rstrip("?!. ")
+    return shape, slots
+
+
+def parameterize_cypher(cypher: str, slots: list) -> Optional[str]:
+    """
+    Turn a Cypher statement generated for a concrete question into a
+    template by replacing the question's literal values with
+    placeholders. Returns None when the mapping is ambiguous or when
+    the statement contains literals that can't be attributed to a slot,
+    since reusing such a template could silently answer a different
+    question.
+    """
+
+    values = [str(value) for _, _, value in slots]
+    if len(set(values)) != len(values):
+        return None
+
+    template = cypher
+    for name, slot_type, value in slots:
+        if slot_type == "year":
+            year = int(value)
+            replaced = {}
+            for offset, suffix in ((0, ""), (1, "+1"), (-1, "-1")):
+                pattern = re.compile(rf"(?<![\w{{]){year + offset}(?![\w}}])")
+                if str(year + offset) in values and offset != 0:
+                    continue
+                template, count = pattern.subn(f"{{{{{name}{suffix}}}}}", template)
+                replaced[offset] = count
+            if not replaced[0]:
+                return None
+        elif slot_type == "number":
+            pattern = re.compile(rf"(?<![\w.{{]){re.escape(value)}(?![\w.}}])")
+            template, count = pattern.subn(f"{{{{{name}}}}}", template)
+            if count != 1:
+                return None
+        else:
+            count = 0
+            for quote in ("'", '"'):
+                literal = f"{quote}{_escape_cypher_string(value)}{quote}"
+                count += template.count(literal)
+                template = template.replace(
+                    literal, f"{quote}{{{{{name}}}}}{quote}"
+                )
+            if not count:
+                return None
+
+    if _YEAR_RE.search(_PLACEHOLDER_RE.sub("", template)):
+        return None
+
+    return template
+
+
+def render_cypher(template: str, slots: list) -> str:
+    values = {name: (slot_type, value) for name, slot_type, value in slots}
+
+    def _substitute(match):
+        slot_type, value = values[match.group(1)]
+        if slot_type == "year":
+            return str(int(value) + int(match.group(2) or 0))
+        if slot_type == "number":
+            return str(value)
+        return _escape_cypher_string(value)
+
+    return _PLACEHOLDER_RE.sub(_substitute, template)
+
+
+class CypherTemplateCache:
+    """
+    Question-to-Cypher translation cache. Entries are keyed on the
+    question shape (the question with its literals replaced by slot
+    types) and hold a parameterized Cypher template, so "net sales in
+    2012" and "net sales in 2013" share one entry. The cache is
+    persisted to the artifacts directory and discarded whenever the
+    graph schema or generation prompt fingerprint changes. Templates
+    persisted by other worker processes are merged in on a miss, and
+    every write re-reads the file under a file lock so it never drops
+    another worker's templates.
+    """
+
+    def __init__(
+        self,
+        fingerprint: str,
+        vocabulary_loader: Callable[[], dict] = dict,
+        max_size: int = NORTHWIND_CYPHER_CACHE_MAX_SIZE,
+        file_name: str = NORTHWIND_CYPHER_CACHE_FILE,
+    ):
+        self.fingerprint = fingerprint
+        self.max_size = max_size
+        self.file_name = file_name
+        self._vocabulary_loader = vocabulary_loader
+        self._vocabulary = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = {}
+        self._mtime = None
+        self._sync()
+
+    @staticmethod
+    def make_fingerprint(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return artifact_path(self.file_name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _sync(self) -> None:
+        """Merge in the templates persisted since the file was last read"""
+
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._mtime:
+            return
+        self._mtime = mtime
+
+        data = read_json_artifact(self.file_name, default={}) or {}
+        if data.get("fingerprint") != self.fingerprint:
+            return
+        for shape, entry in data.get("entries", {}).items():
+            self._entries.setdefault(shape, entry)
+        while len(self._entries) > self.max_size:
+            del self._entries[next(iter(self._entries))]
+
+    @property
+    def vocabulary(self) -> dict:
+        if self._vocabulary is None:
+            self._vocabulary = self._vocabulary_loader()
+        return self._vocabulary
+
+    def lookup(self, question: str) -> Optional[tuple]:
+        """Return (shape, rendered Cypher) for a cached question shape"""
+
+        shape, slots = extract_slots(question, self.vocabulary)
+        with self._lock:
+            entry = self._entries.pop(shape, None)
+            if entry is None:
+                self._sync()
+                entry = self._entries.pop(shape, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[shape] = entry
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.hits += 1
+
+        return shape, render_cypher(entry["cypher"], slots)
+
+    def store(self, question: str, cypher: str) -> bool:
+        shape, slots = extract_slots(question, self.vocabulary)
+        template = parameterize_cypher(cypher, slots)
+        if template is None:
+            return False
+
+        with self._lock:
+            self._persist(
+                shape,
+                {
+                    "cypher": template,
+                    "slots": [slot_type for _, slot_type, _ in slots],
+                    "hits": 0,
+                    "created_at": time.time(),
+                },
+            )
+        return True
+
+    def evict(self, shape: str) -> None:
+        with self._lock:
+            if shape in self._entries:
+                self.evictions += 1
+                self._persist(shape)
+
+    @contextmanager
+    def _file_lock(self):
+        path = artifact_path(f".{self.file_name}.lock")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _persist(self, shape: str, entry: Optional[dict] = None) -> None:
+        """
+        Write one template (or, without an entry, its removal) to the
+        cache file. The file is re-read and merged under an exclusive
+        lock, so templates other workers stored since our last read are
+        kept and templates they evicted stay evicted; this worker's
+        entries are replaced by the merged result.
+        """
+
+        with self._file_lock():
+            data = read_json_artifact(self.file_name, default={}) or {}
+            persisted = (
+                data.get("entries", {})
+                if data.get("fingerprint") == self.fingerprint
+                else {}
+            )
+            # Keep this worker's recency order for shared entries, then
+            # the ones only other workers have seen
+            entries = {s: e for s, e in self._entries.items() if s in persisted}
+            for s, e in persisted.items():
+                entries.setdefault(s, e)
+
+            entries.pop(shape, None)
+            if entry is not None:
+                entries[shape] = entry
+            while len(entries) > self.max_size:
+                del entries[next(iter(entries))]
+                self.evictions += 1
+
+            write_json_artifact(
+                self.file_name,
+                {"fingerprint": self.fingerprint, "entries": entries},
+            )
+            self._entries = entries
+            self._mtime = self._file_mtime()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Callable
+
+NORTHWIND_ENTITY_LINK_THRESHOLD = float(
+    os.getenv("NORTHWIND_ENTITY_LINK_THRESHOLD", 0.8)
+)
+NORTHWIND_ENTITY_LINK_MAX_PER_TYPE = int(
+    os.getenv("NORTHWIND_ENTITY_LINK_MAX_PER_TYPE", 5)
+)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def trigrams(text: str) -> set[str]:
+    """Character trigrams of each word, padded so word starts and ends
+    count: "chai" -> {"#ch", "cha", "hai", "ai#"}"""
+
+    grams = set()
+    for word in _WORD_RE.findall(_fold(text)):
+        padded = f"#{word}#"
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class EntityLinker:
+    """
+    Fuzzy lookup of the entity names (categories, products, suppliers,
+    countries) mentioned in a question, so the Cypher prompt only lists
+    the few relevant names instead of all of them. A name matches when
+    enough of its trigrams occur in the question, which tolerates small
+    misspellings, accents and punctuation differences.
+
+    The index is rebuilt from the loader whenever the graph version
+    changes, so new names are picked up after an ETL run.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], dict],
+        version_getter: Callable[[], str] = lambda: "",
+        threshold: float = NORTHWIND_ENTITY_LINK_THRESHOLD,
+        max_per_type: int = NORTHWIND_ENTITY_LINK_MAX_PER_TYPE,
+    ):
+        self._loader = loader
+        self._version_getter = version_getter
+        self.threshold = threshold
+        self.max_per_type = max_per_type
+        self._version = None
+        self._names: list[tuple[str, str, set]] = []
+        self._index: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def _build(self, entities: dict) -> None:
+        names = []
+        index = defaultdict(list)
+        for entity_type, values in entities.items():
+            for value in values:
+                grams = trigrams(value)
+                if not grams:
+                    continue
+                for gram in grams:
+                    index[gram].append(len(names))
+                names.append((entity_type, value, grams))
+        self._names, self._index = names, dict(index)
+
+    def refresh(self) -> None:
+        version = self._version_getter()
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._build(self._loader())
+                self._version = version
+
+    def link(self, question: str) -> dict[str, list[str]]:
+        """Return the best matching names per entity type"""
+
+        self.refresh()
+        question_grams = trigrams(question)
+
+        shared = defaultdict(int)
+        for gram in question_grams:
+            for position in self._index.get(gram, ()):
+                shared[position] += 1
+
+        scored = defaultdict(list)
+        for position, count in shared.items():
+            entity_type, value, grams = self._names[position]
+            score = count / len(grams)
+            if score >= self.threshold:
+                scored[entity_type].append((score, len(grams), value))
+
+        return {
+            entity_type: [
+                value
+                for _, _, value in sorted(matches, reverse=True)[: self.max_per_type]
+            ]
+            for entity_type, matches in scored.items()
+        }
+
+    def format_entities(self, question: str) -> str:
+        linked = self.link(question)
+        if not linked:
+            return "None"
+        return "\n".join(
+            f"{entity_type.capitalize()}: "
+            + ", ".join(f'"{value}"' for value in values)
+            for entity_type, values in sorted(linked.items())
+        )
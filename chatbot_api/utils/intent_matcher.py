@@ -0,0 +1,144 @@
+import json
+import re
+import threading
+from typing import Callable, NamedTuple, Optional
+
+from utils.answer_cache import normalize_question
+
+
+class Intent(NamedTuple):
+    name: str
+    patterns: list
+    slots: dict
+    cypher: str
+    answer: str
+    row: Optional[str] = None
+    empty: str = "I couldn't find any matching data."
+
+
+class IntentMatch(NamedTuple):
+    intent: Intent
+    params: dict
+
+
+def _load_intent(config: dict) -> Intent:
+    return Intent(
+        name=config["name"],
+        patterns=[re.compile(pattern) for pattern in config["patterns"]],
+        slots=config.get("slots", {}),
+        cypher=config["cypher"],
+        answer=config["answer"],
+        row=config.get("row"),
+        empty=config.get("empty", Intent._field_defaults["empty"]),
+    )
+
+
+def _format_field(value):
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return value
+
+
+class IntentMatcher:
+    """
+    Deterministic matcher for known question shapes. Each intent has
+    regular expressions over the normalized question whose named groups
+    are its slots, a parameterized Cypher statement and an answer
+    template, so matched questions are answered without any LLM call.
+    Slots typed with a vocabulary name (category, country, ...) must
+    match a known value, otherwise the question is left to the agent.
+    """
+
+    def __init__(self, intents: list, vocabulary_loader: Callable[[], dict] = dict):
+        self.intents = intents
+        self._vocabulary_loader = vocabulary_loader
+        self._vocabulary = None
+        self._lock = threading.Lock()
+        self.matches = {intent.name: 0 for intent in intents}
+        self.misses = 0
+
+    @classmethod
+    def from_file(cls, path, vocabulary_loader: Callable[[], dict] = dict):
+        try:
+            with open(path, encoding="utf-8") as f:
+                configs = json.load(f)
+        except FileNotFoundError:
+            configs = []
+        return cls([_load_intent(config) for config in configs], vocabulary_loader)
+
+    @property
+    def vocabulary(self) -> dict:
+        if self._vocabulary is None:
+            vocabulary = self._vocabulary_loader()
+            self._vocabulary = {
+                slot_type: {value.lower(): value for value in values}
+                for slot_type, values in vocabulary.items()
+            }
+        return self._vocabulary
+
+    def reset_vocabulary(self) -> None:
+        self._vocabulary = None
+
+    def _slot_value(self, slot_type: str, value: str):
+        value = value.strip()
+        if slot_type == "year":
+            return int(value)
+        if slot_type == "number":
+            return float(value) if "." in value else int(value)
+        if slot_type == "text":
+            return value
+        return self.vocabulary.get(slot_type, {}).get(value.lower())
+
+    def match(self, question: str) -> Optional[IntentMatch]:
+        if not self.intents:
+            return None
+
+        normalized = normalize_question(question)
+        for intent in self.intents:
+            for pattern in intent.patterns:
+                found = pattern.fullmatch(normalized)
+                if found is None:
+                    continue
+
+                params = {
+                    name: self._slot_value(intent.slots.get(name, "text"), value)
+                    for name, value in found.groupdict().items()
+                }
+                if any(value is None for value in params.values()):
+                    continue
+
+                with self._lock:
+                    self.matches[intent.name] += 1
+                return IntentMatch(intent, params)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def format_answer(self, match: IntentMatch, rows: list) -> Optional[str]:
+        """Render the answer template, or None if the results don't fit
+        it (the question is then left to the agent)"""
+
+        intent, params = match
+        if not rows:
+            return intent.empty.format(**params)
+
+        try:
+            if intent.row is None:
+                fields = {key: _format_field(value) for key, value in rows[0].items()}
+                return intent.answer.format(**params, **fields)
+
+            lines = [
+                intent.row.format(
+                    **params,
+                    **{key: _format_field(value) for key, value in row.items()},
+                )
+                for row in rows
+            ]
+            return "\n".join([intent.answer.format(**params), *lines])
+        except (KeyError, ValueError, TypeError):
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"matches": dict(self.matches), "misses": self.misses}
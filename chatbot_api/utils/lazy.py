@@ -0,0 +1,34 @@
+import functools
+import threading
+
+
+def lazy_singleton(factory):
+    """
+    Build the factory's result on first call and return the same object
+    afterwards. Concurrent first calls (a request racing the background
+    warm-up) build it only once. The wrapper exposes peek() to get the
+    object without building it and reset() to force a rebuild.
+    """
+
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def wrapper():
+        if instance:
+            return instance[0]
+        with lock:
+            if not instance:
+                instance.append(factory())
+        return instance[0]
+
+    def peek():
+        return instance[0] if instance else None
+
+    def reset():
+        with lock:
+            instance.clear()
+
+    wrapper.peek = peek
+    wrapper.reset = reset
+    return wrapper
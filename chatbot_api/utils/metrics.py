@@ -0,0 +1,431 @@
+import asyncio
+import functools
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from uuid import UUID
+
+import tiktoken
+from langchain.callbacks.base import BaseCallbackHandler
+from opentelemetry import trace
+from utils.streaming import AGENT_LLM_TAG
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Per-message overhead of the chat format, as in OpenAI's token counting
+# guide
+_TOKENS_PER_MESSAGE = 3
+_TOKENS_PER_REPLY = 3
+# Seconds before loading a tiktoken encoding that failed is tried again
+ENCODING_RETRY_SECONDS = 300
+
+_encodings: dict = {}
+_encoding_failures: dict = {}
+_encoding_lock = threading.Lock()
+
+LOGGER = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("northwind_chatbot")
+
+# Timings of the request being served and the stage currently running.
+# Both are inherited by tasks, threads started through asyncio and the
+# callbacks LangChain runs on executor threads.
+_request_timings: ContextVar[Optional[dict]] = ContextVar(
+    "northwind_request_timings", default=None
+)
+_current_stage: ContextVar[str] = ContextVar(
+    "northwind_current_stage", default="agent_planning"
+)
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels)
+        + "}"
+    )
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "count": 0,
+                    "sum": 0.0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    bucket_labels = labels + (("le", f"{bound:g}"),)
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(bucket_labels)} {count}"
+                    )
+                inf_labels = _format_labels(labels + (("le", "+Inf"),))
+                series_labels = _format_labels(labels)
+                lines.append(f"{self.name}_bucket{inf_labels} {series['count']}")
+                lines.append(f"{self.name}_sum{series_labels} {series['sum']:g}")
+                lines.append(f"{self.name}_count{series_labels} {series['count']}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose samples are collected when the metrics are rendered"""
+
+    def __init__(self, name: str, help_text: str, collect):
+        self.name = name
+        self.help_text = help_text
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} gauge",
+        ]
+        for labels, value in self.collect():
+            lines.append(
+                f"{self.name}{_format_labels(tuple(sorted(labels.items())))} {value:g}"
+            )
+        return lines
+
+
+request_duration = Histogram(
+    "northwind_request_duration_seconds",
+    "End-to-end latency of answered questions by answer source",
+)
+stage_duration = Histogram(
+    "northwind_stage_duration_seconds",
+    "Latency of pipeline stages (LLM calls, Neo4j queries, retrieval)",
+)
+llm_tokens = Counter(
+    "northwind_llm_tokens_total", "LLM tokens by stage and kind (prompt/completion)"
+)
+neo4j_rows = Counter(
+    "northwind_neo4j_rows_total", "Rows returned by Neo4j queries and retrieval"
+)
+stage_retries = Counter("northwind_stage_retries_total", "Retries by stage")
+
+REGISTRY = [request_duration, stage_duration, llm_tokens, neo4j_rows, stage_retries]
+
+
+def register(metric) -> None:
+    REGISTRY.append(metric)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def serve_metrics(host: str, port: int) -> ThreadingHTTPServer:
+    """
+    Serve this process's metrics at /metrics on a port of their own,
+    from a daemon thread. Worker processes of the pre-fork mode share
+    the API port, so a scrape of the API's /metrics would reach one
+    random worker; each worker serves its metrics on its own port
+    instead.
+    """
+
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    return server
+
+
+def start_request_timings() -> dict:
+    """Start collecting a per-stage breakdown for the current request"""
+
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def _add_timing(stage: str, **values) -> None:
+    timings = _request_timings.get()
+    if timings is None:
+        return
+    entry = timings.setdefault(stage, {})
+    for key, value in values.items():
+        entry[key] = entry.get(key, 0) + value
+
+
+def observe_stage(stage: str, seconds: float, rows: Optional[int] = None) -> None:
+    stage_duration.observe(seconds, stage=stage)
+    _add_timing(stage, seconds=seconds, calls=1)
+    if rows is not None:
+        neo4j_rows.inc(rows, stage=stage)
+        _add_timing(stage, rows=rows)
+
+
+def record_retry(stage: str) -> None:
+    stage_retries.inc(stage=stage)
+    _add_timing(stage, retries=1)
+
+
+def record_tokens(
+    prompt_tokens: int, completion_tokens: int, stage: Optional[str] = None
+) -> None:
+    stage = stage or _current_stage.get()
+    llm_tokens.inc(prompt_tokens, stage=stage, kind="prompt")
+    llm_tokens.inc(completion_tokens, stage=stage, kind="completion")
+    _add_timing(
+        stage, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+    )
+
+
+@contextmanager
+def stage_span(stage: str):
+    """
+    Time a pipeline stage inside an OpenTelemetry span. The yielded
+    dict collects stage attributes (e.g. "rows") that are set on the
+    span and recorded with the duration.
+    """
+
+    attributes = {}
+    token = _current_stage.set(stage)
+    start = time.perf_counter()
+    with tracer.start_as_current_span(stage) as span:
+        try:
+            yield attributes
+        finally:
+            seconds = time.perf_counter() - start
+            _current_stage.reset(token)
+            for key, value in attributes.items():
+                span.set_attribute(f"northwind.{key}", value)
+            observe_stage(stage, seconds, rows=attributes.get("rows"))
+
+
+def instrumented(stage: str, count_rows: bool = False):
+    """Run a (sync or async) stage method inside stage_span, counting
+    the returned rows when count_rows is set"""
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage_span(stage) as attributes:
+                    result = await func(*args, **kwargs)
+                    if count_rows:
+                        attributes["rows"] = len(result)
+                    return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_span(stage) as attributes:
+                result = func(*args, **kwargs)
+                if count_rows:
+                    attributes["rows"] = len(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def _load_encoding(model: str) -> tiktoken.Encoding:
+    # tiktoken downloads an encoding's BPE file on first use
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _encoding(model: str) -> Optional[tiktoken.Encoding]:
+    """The model's encoding, or None while it can't be loaded. Only
+    loaded encodings are cached; a failed load is retried after
+    ENCODING_RETRY_SECONDS, and callers meanwhile (or while another
+    thread loads it) estimate instead of waiting."""
+
+    encoding = _encodings.get(model)
+    if encoding is not None:
+        return encoding
+    failed_at = _encoding_failures.get(model)
+    if failed_at is not None and (
+        time.monotonic() - failed_at < ENCODING_RETRY_SECONDS
+    ):
+        return None
+    if not _encoding_lock.acquire(blocking=False):
+        return None
+    try:
+        encoding = _encodings[model] = _load_encoding(model)
+        _encoding_failures.pop(model, None)
+        return encoding
+    except Exception as e:
+        LOGGER.warning(f"No tiktoken encoding for {model}, estimating tokens: {e}")
+        _encoding_failures[model] = time.monotonic()
+        return None
+    finally:
+        _encoding_lock.release()
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """Tokens of text for an OpenAI model, or roughly four characters
+    per token if its encoding can't be loaded"""
+
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _message_text(message) -> str:
+    function_call = message.additional_kwargs.get("function_call")
+    if function_call:
+        return f"{message.content}{json.dumps(function_call)}"
+    return str(message.content)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Record LLM token usage against the stage that made the call, and
+    time the agent's own planning LLM calls, which only show up as
+    callbacks.
+
+    Streamed calls (the agent's) end without usage, so their tokens are
+    counted with tiktoken from the prompt messages, the function
+    definitions and the generated message.
+    """
+
+    # Run in the caller's context so tokens are attributed to the stage
+    # that is current when the LLM call ends
+    run_inline = True
+
+    def __init__(self):
+        self._starts: dict[UUID, tuple] = {}
+        self._prompts: dict[UUID, tuple] = {}
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id: UUID, tags=None, **kwargs
+    ) -> None:
+        if tags and AGENT_LLM_TAG in tags:
+            self._starts[run_id] = ("agent_planning", time.perf_counter())
+        self._prompts[run_id] = (messages, kwargs.get("invocation_params") or {})
+
+    def _count_prompt_tokens(self, messages: list, params: dict) -> int:
+        model = params.get("model") or params.get("model_name") or ""
+        tokens = _TOKENS_PER_REPLY
+        for message in (m for batch in messages for m in batch):
+            tokens += _TOKENS_PER_MESSAGE + count_tokens(_message_text(message), model)
+        if params.get("functions"):
+            tokens += count_tokens(json.dumps(params["functions"]), model)
+        return tokens
+
+    def _count_completion_tokens(self, response, params: dict) -> int:
+        model = params.get("model") or params.get("model_name") or ""
+        return sum(
+            count_tokens(
+                _message_text(generation.message)
+                if hasattr(generation, "message")
+                else generation.text,
+                model,
+            )
+            for generations in response.generations
+            for generation in generations
+        )
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        started = self._starts.pop(run_id, None)
+        prompt = self._prompts.pop(run_id, None)
+        if started is not None:
+            observe_stage(started[0], time.perf_counter() - started[1])
+
+        stage = started[0] if started else None
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            record_tokens(
+                usage.get("prompt_tokens", 0),
+                usage.get("completion_tokens", 0),
+                stage=stage,
+            )
+        elif prompt is not None:
+            messages, params = prompt
+            record_tokens(
+                self._count_prompt_tokens(messages, params),
+                self._count_completion_tokens(response, params),
+                stage=stage,
+            )
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._starts.pop(run_id, None)
+        self._prompts.pop(run_id, None)
@@ -0,0 +1,110 @@
+import os
+
+import neo4j
+from neo4j import AsyncGraphDatabase, GraphDatabase
+from northwind_common.neo4j_driver_config import (
+    NORTHWIND_NEO4J_MAX_POOL_SIZE,
+    create_driver,
+)
+from utils.lazy import lazy_singleton
+from utils.metrics import Gauge, register
+
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+
+# Seconds to wait for a free pooled connection before failing the
+# query; the other driver settings are shared with the ETL
+# (northwind_common)
+NORTHWIND_NEO4J_ACQUISITION_TIMEOUT = float(
+    os.getenv("NORTHWIND_NEO4J_ACQUISITION_TIMEOUT", 10)
+)
+# Send read-only chain queries to followers / read replicas. Only takes
+# effect with a routing URI (neo4j:// or neo4j+s://)
+NORTHWIND_NEO4J_READ_ROUTING = os.getenv("NORTHWIND_NEO4J_READ_ROUTING", "1") == "1"
+
+READ_ACCESS_MODE = (
+    neo4j.READ_ACCESS if NORTHWIND_NEO4J_READ_ROUTING else neo4j.WRITE_ACCESS
+)
+
+
+def _create_driver(graph_database):
+    return create_driver(graph_database, NORTHWIND_NEO4J_ACQUISITION_TIMEOUT)
+
+
+@lazy_singleton
+def get_driver() -> neo4j.Driver:
+    """The process-wide sync driver; every sync graph query shares its
+    connection pool"""
+
+    return _create_driver(GraphDatabase)
+
+
+@lazy_singleton
+def get_async_driver() -> neo4j.AsyncDriver:
+    """The process-wide async driver, used from the event loop"""
+
+    return _create_driver(AsyncGraphDatabase)
+
+
+def _pool_stats(driver) -> dict:
+    # The driver has no public pool API; read its pool defensively so a
+    # driver upgrade only loses the numbers
+    pool = getattr(driver, "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+
+    stats = {}
+    for address, address_connections in list(connections.items()):
+        address_connections = list(address_connections)
+        in_use = sum(1 for connection in address_connections if connection.in_use)
+        stats[str(address)] = {
+            "in_use": in_use,
+            "idle": len(address_connections) - in_use,
+        }
+    return stats
+
+
+def pool_stats() -> dict:
+    """Connections per server address of the drivers created so far"""
+
+    stats = {"max_size": NORTHWIND_NEO4J_MAX_POOL_SIZE}
+    for name, factory in (("sync", get_driver), ("async", get_async_driver)):
+        driver = factory.peek()
+        stats[name] = _pool_stats(driver) if driver is not None else None
+    return stats
+
+
+def _pool_samples() -> list:
+    stats = pool_stats()
+    samples = []
+    for name in ("sync", "async"):
+        for address, counts in (stats[name] or {}).items():
+            for state, value in counts.items():
+                samples.append(
+                    ({"driver": name, "address": address, "state": state}, value)
+                )
+    return samples
+
+
+register(
+    Gauge(
+        "northwind_neo4j_pool_connections",
+        "Pooled Neo4j connections by driver, server address and state",
+        _pool_samples,
+    )
+)
+
+
+async def close_drivers() -> None:
+    """Close the shared drivers (at shutdown); they are recreated on
+    next use"""
+
+    async_driver = get_async_driver.peek()
+    if async_driver is not None:
+        await async_driver.close()
+    get_async_driver.reset()
+
+    driver = get_driver.peek()
+    if driver is not None:
+        driver.close()
+    get_driver.reset()
@@ -0,0 +1,118 @@
+import logging
+import os
+import signal
+import socket
+import threading
+from typing import Callable, Optional
+
+import uvicorn
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_prefork(
+    app,
+    host: str,
+    port: int,
+    workers: int,
+    graceful_timeout: float,
+    after_fork: Optional[Callable[[int], None]] = None,
+    log_level: str = "info",
+) -> None:
+    """
+    Serve app from several forked worker processes that accept on one
+    shared listening socket. Everything imported and built before this
+    is called is shared copy-on-write by the workers. after_fork is
+    called in each worker with its index (0 to workers - 1), which a
+    replacement worker inherits.
+
+    On SIGTERM or SIGINT every worker stops accepting, finishes its
+    in-flight requests (up to graceful_timeout seconds) and runs the
+    app's shutdown. Workers still running after that are killed. A
+    worker that dies on its own is replaced.
+    """
+
+    sock = _bind(host, port)
+    children: dict[int, int] = {}
+    stopping = threading.Event()
+
+    def _spawn(index: int) -> None:
+        pid = os.fork()
+        if pid:
+            children[pid] = index
+            return
+
+        # A worker of its own process group, so a terminal's Ctrl-C only
+        # reaches the supervisor, which forwards a single SIGTERM
+        os.setpgid(0, 0)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            if after_fork is not None:
+                after_fork(index)
+            config = uvicorn.Config(
+                app,
+                log_level=log_level,
+                timeout_graceful_shutdown=graceful_timeout,
+            )
+            uvicorn.Server(config).run(sockets=[sock])
+        except BaseException:
+            LOGGER.exception(f"Worker {index} failed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _kill_remaining() -> None:
+        for pid in list(children):
+            LOGGER.warning(f"Worker {pid} did not drain in time, killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _stop(signum, frame) -> None:
+        if stopping.is_set():
+            return
+        stopping.set()
+        LOGGER.info(f"Draining {len(children)} workers")
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        timer = threading.Timer(graceful_timeout + 5, _kill_remaining)
+        timer.daemon = True
+        timer.start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    LOGGER.info(f"Serving on {host}:{port} with {workers} workers")
+    for index in range(workers):
+        _spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None and not stopping.is_set():
+            LOGGER.warning(
+                f"Worker {index} (pid {pid}) exited with status {status}, "
+                "starting a new one"
+            )
+            _spawn(index)
+
+    sock.close()
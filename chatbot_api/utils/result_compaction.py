@@ -0,0 +1,182 @@
+import math
+import os
+import re
+import threading
+from numbers import Number
+from typing import Any, NamedTuple
+
+NORTHWIND_QA_CONTEXT_TOKEN_BUDGET = int(
+    os.getenv("NORTHWIND_QA_CONTEXT_TOKEN_BUDGET", 2000)
+)
+NORTHWIND_QA_CONTEXT_MAX_LIST_ITEMS = int(
+    os.getenv("NORTHWIND_QA_CONTEXT_MAX_LIST_ITEMS", 20)
+)
+
+_LIMIT_RE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_RETURN_RE = re.compile(r"\bRETURN\b", re.IGNORECASE)
+# String literals, quoted identifiers and comments, whose words aren't
+# clauses
+_NON_CLAUSE_RE = re.compile(
+    r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`|//[^\n]*|/\*.*?\*/""",
+    re.DOTALL,
+)
+_TRAILING_RE = re.compile(r"[\s;]+$")
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text and JSON
+    return math.ceil(len(text) / 4)
+
+
+def inject_limit(cypher: str, limit: int) -> str:
+    """Append a LIMIT to a query whose final RETURN has none, so the
+    database never returns more rows than the chain would keep anyway.
+    A LIMIT of an inner WITH or inside a string doesn't count, and
+    queries without RETURN are left alone."""
+
+    if not cypher:
+        return cypher
+    clauses = _NON_CLAUSE_RE.sub(" ", cypher)
+    returns = list(_RETURN_RE.finditer(clauses))
+    if not returns or _LIMIT_RE.search(clauses, returns[-1].end()):
+        return cypher
+    return f"{_TRAILING_RE.sub('', cypher)}\nLIMIT {limit}"
+
+
+def _format_scalar(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def _format_value(value: Any, max_items: int) -> str:
+    if isinstance(value, dict):
+        return (
+            "{"
+            + ", ".join(
+                f"{key}: {_format_value(item, max_items)}" for key, item in value.items()
+            )
+            + "}"
+        )
+    if not isinstance(value, (list, tuple)):
+        return _format_scalar(value)
+
+    if len(value) > max_items and all(
+        isinstance(item, Number) and not isinstance(item, bool) for item in value
+    ):
+        # Long numeric lists are more useful to the LLM pre-aggregated
+        return (
+            f"<{len(value)} values: min {_format_scalar(min(value))}, "
+            f"max {_format_scalar(max(value))}, sum {_format_scalar(sum(value))}>"
+        )
+
+    items = [_format_value(item, max_items) for item in value[:max_items]]
+    if len(value) > max_items:
+        items.append(f"... {len(value) - max_items} more")
+    return "[" + "; ".join(items) + "]"
+
+
+class CompactedContext(NamedTuple):
+    text: str
+    rows: int
+    rows_included: int
+    raw_bytes: int
+    compact_bytes: int
+    raw_tokens: int
+    compact_tokens: int
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.rows,
+            "rows_included": self.rows_included,
+            "bytes_saved": self.raw_bytes - self.compact_bytes,
+            "tokens_saved": self.raw_tokens - self.compact_tokens,
+            "compact_tokens": self.compact_tokens,
+        }
+
+
+class ResultCompactor:
+    """
+    Shrink Cypher results before they go into the QA prompt: rows with
+    the same keys become a header plus one line per row, long lists are
+    truncated (or summarized when numeric) with an explicit "N more"
+    marker, and rows are dropped past the token budget with a marker
+    saying how many were left out.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = NORTHWIND_QA_CONTEXT_TOKEN_BUDGET,
+        max_list_items: int = NORTHWIND_QA_CONTEXT_MAX_LIST_ITEMS,
+    ):
+        self.token_budget = token_budget
+        self.max_list_items = max_list_items
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.truncated = 0
+        self.bytes_saved = 0
+        self.tokens_saved = 0
+
+    def _lines(self, rows: list) -> tuple:
+        if rows and all(isinstance(row, dict) for row in rows):
+            columns = list(rows[0])
+            if all(list(row) == columns for row in rows):
+                header = " | ".join(columns)
+                return header, [
+                    " | ".join(
+                        _format_value(row[column], self.max_list_items)
+                        for column in columns
+                    )
+                    for row in rows
+                ]
+
+        return None, [_format_value(row, self.max_list_items) for row in rows]
+
+    def compact(self, rows: list) -> CompactedContext:
+        raw = str(rows)
+        if not rows:
+            text = raw
+            included = 0
+        else:
+            header, lines = self._lines(rows)
+            output = [header] if header else []
+            used = estimate_tokens(header or "")
+            included = 0
+            for line in lines:
+                used += estimate_tokens(line) + 1
+                if used > self.token_budget and included:
+                    break
+                output.append(line)
+                included += 1
+            if included < len(lines):
+                output.append(f"... {len(lines) - included} more rows")
+            text = "\n".join(output)
+
+        compacted = CompactedContext(
+            text=text,
+            rows=len(rows),
+            rows_included=included,
+            raw_bytes=len(raw.encode("utf-8")),
+            compact_bytes=len(text.encode("utf-8")),
+            raw_tokens=estimate_tokens(raw),
+            compact_tokens=estimate_tokens(text),
+        )
+
+        with self._lock:
+            self.calls += 1
+            self.truncated += included < len(rows)
+            self.bytes_saved += compacted.raw_bytes - compacted.compact_bytes
+            self.tokens_saved += compacted.raw_tokens - compacted.compact_tokens
+        return compacted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "calls": self.calls,
+                "truncated": self.truncated,
+                "bytes_saved": self.bytes_saved,
+                "tokens_saved": self.tokens_saved,
+            }
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Optional
+
+from utils.metrics import Counter, register
+
+coalesced_requests = Counter(
+    "northwind_coalesced_requests_total",
+    "Requests answered by joining an identical request already in flight",
+)
+register(coalesced_requests)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs
+    the work as a task, callers arriving while it runs await the same
+    task and get its result or its exception. The task is shielded, so
+    a caller that disconnects doesn't cancel the work for the others.
+    Nothing is kept once the task finishes; caching is left to the
+    answer cache.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def running(self, key: Hashable) -> Optional[asyncio.Task]:
+        return self._tasks.get(key)
+
+    async def do(
+        self, key: Hashable, func: Callable[[], Awaitable]
+    ) -> tuple[object, bool]:
+        """Return func's result and whether this caller ran it"""
+
+        task = self._tasks.get(key)
+        if task is not None:
+            return await self.join(task), False
+
+        task = asyncio.ensure_future(func())
+        self._tasks[key] = task
+        self.leaders += 1
+        task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task), True
+
+    async def join(self, task: asyncio.Task):
+        self.coalesced += 1
+        coalesced_requests.inc(flight=self.name)
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark a failure as retrieved: if every caller disconnected there
+        # is nobody left to read it
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._tasks),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
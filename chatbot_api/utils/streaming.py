@@ -0,0 +1,54 @@
+import asyncio
+import json
+from typing import Any
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+AGENT_LLM_TAG = "northwind_agent"
+GENERATED_CYPHER_LABEL = "Generated Cypher:"
+
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class AgentEventStreamHandler(BaseCallbackHandler):
+    """
+    Collect agent progress events into an asyncio queue: the selected
+    tools, the Cypher generated by the graph chain and the tokens of
+    the agent's own LLM calls. Callbacks may fire on executor threads,
+    so events are handed to the event loop thread-safely.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._loop = loop
+        self._agent_llm_runs = set()
+        self._awaiting_cypher = set()
+
+    def _emit(self, event: str, data: Any) -> None:
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id: UUID, tags=None, **kwargs
+    ) -> None:
+        if tags and AGENT_LLM_TAG in tags:
+            self._agent_llm_runs.add(run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+        if token and run_id in self._agent_llm_runs:
+            self._emit("token", {"token": token})
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        self._agent_llm_runs.discard(run_id)
+
+    def on_agent_action(self, action, **kwargs) -> None:
+        self._emit("tool", {"tool": action.tool, "tool_input": action.tool_input})
+
+    def on_text(self, text: str, *, run_id: UUID, **kwargs) -> None:
+        if run_id in self._awaiting_cypher:
+            self._awaiting_cypher.discard(run_id)
+            self._emit("cypher", {"query": text})
+        elif text == GENERATED_CYPHER_LABEL:
+            self._awaiting_cypher.add(run_id)
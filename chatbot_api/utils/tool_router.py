@@ -0,0 +1,197 @@
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter as TermCounter
+from typing import NamedTuple, Optional
+
+from utils.answer_cache import normalize_question
+from utils.metrics import Counter, register
+
+# Minimum probability of the best tool for a question to skip the agent
+NORTHWIND_ROUTER_THRESHOLD = float(os.getenv("NORTHWIND_ROUTER_THRESHOLD", 0.9))
+# Log-odds added to a tool for each of its keyword rules that matches,
+# for at most MAX_RULE_HITS rules
+NORTHWIND_ROUTER_RULE_WEIGHT = float(os.getenv("NORTHWIND_ROUTER_RULE_WEIGHT", 2.0))
+MAX_RULE_HITS = 2
+
+AGENT = "agent"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+router_decisions = Counter(
+    "northwind_router_decisions_total",
+    "Questions by local tool router decision (a tool name or agent)",
+)
+register(router_decisions)
+
+
+class Route(NamedTuple):
+    tool: str
+    confidence: float
+
+    def to_dict(self) -> dict:
+        return {"tool": self.tool, "confidence": round(self.confidence, 4)}
+
+
+def _features(normalized: str) -> list:
+    tokens = _TOKEN_RE.findall(normalized)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class ToolRouter:
+    """
+    Pick the agent tool for a question without an LLM call. A
+    multinomial naive Bayes model over the words and word pairs of
+    labelled example questions gives each tool a score, and every
+    keyword rule of a tool that matches adds to it, up to a cap. The
+    question is routed only when the best tool's probability reaches
+    the threshold; anything less, and any question matching rules of
+    more than one tool, is left to the agent.
+
+    The regressions table maps a tool name, or "agent", to questions
+    that must be routed to it; check() lists the ones that aren't.
+    """
+
+    def __init__(
+        self,
+        examples: dict,
+        rules: Optional[dict] = None,
+        regressions: Optional[dict] = None,
+        threshold: float = NORTHWIND_ROUTER_THRESHOLD,
+        rule_weight: float = NORTHWIND_ROUTER_RULE_WEIGHT,
+    ):
+        self.threshold = threshold
+        self.rule_weight = rule_weight
+        self.tools = sorted(examples)
+        self.regressions = regressions or {}
+        self.rules = {
+            tool: [re.compile(pattern) for pattern in (rules or {}).get(tool, [])]
+            for tool in self.tools
+        }
+
+        counts = {
+            tool: TermCounter(
+                feature
+                for question in examples[tool]
+                for feature in _features(normalize_question(question))
+            )
+            for tool in self.tools
+        }
+        self.vocabulary = set().union(*counts.values()) if counts else set()
+        total_examples = sum(len(questions) for questions in examples.values())
+        self._log_priors = {
+            tool: math.log(len(examples[tool]) / total_examples) for tool in self.tools
+        }
+        # Laplace-smoothed log likelihoods; unseen features are skipped
+        self._log_likelihoods = {}
+        for tool, tool_counts in counts.items():
+            denominator = sum(tool_counts.values()) + len(self.vocabulary)
+            self._log_likelihoods[tool] = {
+                feature: math.log((tool_counts[feature] + 1) / denominator)
+                for feature in self.vocabulary
+            }
+
+        self._lock = threading.Lock()
+        self.routed = {tool: 0 for tool in self.tools}
+        self.deferred = 0
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        try:
+            with open(path, encoding="utf-8") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {}
+        return cls(
+            config.get("examples", {}),
+            config.get("rules"),
+            config.get("regressions"),
+            **kwargs,
+        )
+
+    def rule_hits(self, question: str) -> dict:
+        normalized = normalize_question(question)
+        return {
+            tool: sum(1 for rule in rules if rule.search(normalized))
+            for tool, rules in self.rules.items()
+        }
+
+    def scores(self, question: str) -> dict:
+        """Probability of each tool, or {} if nothing in the question is
+        known to the model or the rules"""
+
+        features = [
+            f for f in _features(normalize_question(question)) if f in self.vocabulary
+        ]
+        rule_hits = self.rule_hits(question)
+        if not features and not any(rule_hits.values()):
+            return {}
+
+        log_scores = {
+            tool: self._log_priors[tool]
+            + sum(self._log_likelihoods[tool][f] for f in features)
+            + self.rule_weight * min(rule_hits[tool], MAX_RULE_HITS)
+            for tool in self.tools
+        }
+        top = max(log_scores.values())
+        weights = {tool: math.exp(score - top) for tool, score in log_scores.items()}
+        total = sum(weights.values())
+        return {tool: weight / total for tool, weight in weights.items()}
+
+    def decide(self, question: str) -> Optional[Route]:
+        """The route for a question, without counting it"""
+
+        if len(self.tools) < 2:
+            return None
+        if sum(1 for hits in self.rule_hits(question).values() if hits) > 1:
+            return None
+
+        scores = self.scores(question)
+        if not scores:
+            return None
+        tool = max(scores, key=scores.get)
+        if scores[tool] < self.threshold:
+            return None
+        return Route(tool, scores[tool])
+
+    def route(self, question: str) -> Optional[Route]:
+        route = self.decide(question)
+        router_decisions.inc(route=route.tool if route else AGENT)
+        with self._lock:
+            if route:
+                self.routed[route.tool] += 1
+            else:
+                self.deferred += 1
+        return route
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "routed": dict(self.routed),
+                "deferred": self.deferred,
+                "threshold": self.threshold,
+            }
+
+    def check(self) -> list:
+        """(question, expected, actual) for every question of the
+        regressions table that is routed elsewhere"""
+
+        failures = []
+        for expected, questions in self.regressions.items():
+            for question in questions:
+                route = self.decide(question)
+                actual = route.tool if route else AGENT
+                if actual != expected:
+                    failures.append((question, expected, actual))
+        return failures
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "router_examples.json"
+    failures = ToolRouter.from_file(path).check()
+    for question, expected, actual in failures:
+        print(f"{question!r}: expected {expected}, routed to {actual}")
+    sys.exit(1 if failures else 0)
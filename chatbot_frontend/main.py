@@ -1,10 +1,28 @@
+import json
 import os
 import requests
 import streamlit as st
+import uuid
 
 CHATBOT_URL = os.getenv(
     "CHATBOT_URL", "http://127.0.0.1:8000/northwind-rag-agent"
 )
+CHATBOT_STREAM_URL = os.getenv("CHATBOT_STREAM_URL", f"{CHATBOT_URL}/stream")
+
+
+def stream_events(response):
+    """Parse a server-sent event stream into (event, data) pairs"""
+
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
 
 with st.sidebar:
     st.header("About")
@@ -49,6 +67,11 @@ st.info(
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# The API keeps the conversation under this id, so follow-up questions
+# are answered in context
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
+
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         if "output" in message.keys():
@@ -63,22 +86,44 @@ if prompt := st.chat_input("What do you want to know?"):
 
     st.session_state.messages.append({"role": "user", "output": prompt})
 
-    data = {"text": prompt}
+    data = {"text": prompt, "session_id": st.session_state.session_id}
 
-    with st.spinner("Searching for an answer..."):
-        response = requests.post(CHATBOT_URL, json=data)
+    error_text = """An error occurred while processing your message.
+            Please try again or rephrase your message."""
+    output_text = ""
+    explanation = error_text
 
-        if response.status_code == 200:
-            output_text = response.json()["output"]
-            explanation = response.json()["intermediate_steps"]
+    with st.chat_message("assistant"):
+        status = st.status("Searching for an answer...")
+        answer_placeholder = st.empty()
 
-        else:
-            output_text = """An error occurred while processing your message.
-            Please try again or rephrase your message."""
-            explanation = output_text
+        try:
+            with requests.post(
+                CHATBOT_STREAM_URL, json=data, stream=True
+            ) as response:
+                response.raise_for_status()
+                response.encoding = "utf-8"
+
+                for event, payload in stream_events(response):
+                    if event == "tool":
+                        status.write(f"Using the {payload['tool']} tool")
+                    elif event == "cypher":
+                        status.code(payload["query"], language="cypher")
+                    elif event == "token":
+                        output_text += payload["token"]
+                        answer_placeholder.markdown(output_text)
+                    elif event == "answer":
+                        output_text = payload["output"]
+                        explanation = payload["intermediate_steps"]
+                    elif event == "error":
+                        output_text = error_text
+
+        except requests.RequestException:
+            output_text = error_text
 
-    st.chat_message("assistant").markdown(output_text)
-    st.status("How was this generated?", state="complete").info(explanation)
+        answer_placeholder.markdown(output_text or error_text)
+        status.update(label="How was this generated?", state="complete")
+        status.info(explanation)
 
     st.session_state.messages.append(
         {
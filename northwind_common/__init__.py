@@ -0,0 +1 @@
+"""Code shared by the chatbot API and the ETL"""
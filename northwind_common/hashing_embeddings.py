@@ -0,0 +1,30 @@
+"""
+Deterministic, dependency-free bag-of-words embeddings for tests and
+offline runs. The ETL embeds the reviews and the API embeds questions
+with this one implementation, so the two always produce the same
+vector for the same text.
+"""
+
+import hashlib
+import math
+import re
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def hashing_embedder_name(dimensions: int) -> str:
+    """The embedder name recorded in the review index manifest"""
+
+    return f"hashing-{dimensions}"
+
+
+def hashing_embedding(text: str, dimensions: int) -> list[float]:
+    vector = [0.0] * dimensions
+    for token in _TOKEN_RE.findall(text.lower()):
+        digest = int.from_bytes(
+            hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        vector[digest % dimensions] += 1.0 if digest >> 63 else -1.0
+
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
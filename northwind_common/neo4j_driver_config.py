@@ -0,0 +1,38 @@
+"""
+Neo4j driver settings shared by the API's process-wide drivers and the
+ETL's per-run driver. Only the connection acquisition timeout differs:
+API queries should fail fast, ETL writes may wait on a busy pool, so
+each side reads it from its own variable and passes it in.
+"""
+
+import os
+
+NORTHWIND_NEO4J_MAX_POOL_SIZE = int(os.getenv("NORTHWIND_NEO4J_MAX_POOL_SIZE", 50))
+NORTHWIND_NEO4J_CONNECTION_TIMEOUT = float(
+    os.getenv("NORTHWIND_NEO4J_CONNECTION_TIMEOUT", 15)
+)
+# TCP keep-alive and this lifetime retire connections a load balancer
+# may have dropped (the pinned driver has no liveness check option)
+NORTHWIND_NEO4J_MAX_CONNECTION_LIFETIME = float(
+    os.getenv("NORTHWIND_NEO4J_MAX_CONNECTION_LIFETIME", 3600)
+)
+
+
+def driver_config(acquisition_timeout: float, min_pool_size: int = 0) -> dict:
+    return {
+        "max_connection_pool_size": max(NORTHWIND_NEO4J_MAX_POOL_SIZE, min_pool_size),
+        "connection_acquisition_timeout": acquisition_timeout,
+        "connection_timeout": NORTHWIND_NEO4J_CONNECTION_TIMEOUT,
+        "max_connection_lifetime": NORTHWIND_NEO4J_MAX_CONNECTION_LIFETIME,
+        "keep_alive": True,
+    }
+
+
+def create_driver(graph_database, acquisition_timeout: float, min_pool_size: int = 0):
+    """A GraphDatabase or AsyncGraphDatabase driver for NEO4J_URI"""
+
+    uri = os.getenv("NEO4J_URI")
+    auth = os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD")
+    return graph_database.driver(
+        uri, auth=auth, **driver_config(acquisition_timeout, min_pool_size)
+    )
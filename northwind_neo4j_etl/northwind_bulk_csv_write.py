@@ -1,8 +1,53 @@
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, NamedTuple
 from dotenv import load_dotenv
 load_dotenv()
-from neo4j import GraphDatabase
+from northwind_etl_state import (
+    SourceDelta,
+    StageCheckpoint,
+    compute_delta,
+    compute_hashes,
+    load_manifest,
+    publish_entity_names,
+    publish_graph_version,
+    row_hash,
+    run_fingerprint,
+    save_manifest,
+)
+from northwind_csv_rows import (
+    batched,
+    category_row,
+    customer_row,
+    order_row,
+    orders_row,
+    part_of_row,
+    product_row,
+    purchased_row,
+    read_csv_rows,
+    review_row,
+    supplier_row,
+    supplies_row,
+    to_int,
+    writes_row,
+)
+from northwind_indexes import ensure_indexes
+from northwind_neo4j_driver import create_driver
+from northwind_review_embeddings import (
+    embed_reviews,
+    get_embedder,
+    write_review_index_snapshot,
+)
+from northwind_sales_summaries import (
+    LINKED_DIMENSIONS,
+    SUMMARY_DELETE_QUERY,
+    SUMMARY_IDS_QUERY,
+    SUMMARY_NODE_QUERY,
+    compute_sales_summaries,
+    summary_link_query,
+)
 from retry import retry
 
 CUSTOMERS_CSV_PATH = os.getenv("CUSTOMERS_CSV_PATH")
@@ -12,9 +57,9 @@ CATEGORIES_CSV_PATH = os.getenv("CATEGORIES_CSV_PATH")
 SUPPLIERS_CSV_PATH = os.getenv("SUPPLIERS_CSV_PATH")
 REVIEWS_CSV_PATH = os.getenv("REVIEWS_CSV_PATH")
 
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NORTHWIND_ETL_BATCH_SIZE = int(os.getenv("NORTHWIND_ETL_BATCH_SIZE", 1000))
+NORTHWIND_ETL_WORKERS = int(os.getenv("NORTHWIND_ETL_WORKERS", 4))
+NORTHWIND_ETL_MODE = os.getenv("NORTHWIND_ETL_MODE", "full")
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,7 +69,149 @@ logging.basicConfig(
 
 LOGGER = logging.getLogger(__name__)
 
-NODES = ["Customer", "Order", "Product", "Category", "Supplier", "Review"]
+NODES = [
+    "Customer",
+    "Order",
+    "Product",
+    "Category",
+    "Supplier",
+    "Review",
+    "SalesSummary",
+]
+
+SALES_SUMMARY_MANIFEST = "sales_summaries"
+
+
+
+class LoadStage(NamedTuple):
+    name: str
+    csv_path: str
+    key_column: str
+    label: str
+    to_row: Callable[[dict], dict]
+    query: str
+
+
+def _node_query(label: str) -> str:
+    return f"""
+    UNWIND $rows AS row
+    MERGE (n:{label} {{id: row.id}})
+    SET n += row
+    """
+
+
+def _relationship_query(
+    start_label: str, start_key: str, rel_type: str, end_label: str, end_key: str
+) -> str:
+    return f"""
+    UNWIND $rows AS row
+    MATCH (a:{start_label} {{id: row.{start_key}}})
+    MATCH (b:{end_label} {{id: row.{end_key}}})
+    MERGE (a)-[:{rel_type}]->(b)
+    """
+
+
+NODE_STAGES = [
+    LoadStage(
+        "Customer",
+        CUSTOMERS_CSV_PATH,
+        "customerID",
+        "Customer",
+        customer_row,
+        _node_query("Customer"),
+    ),
+    LoadStage(
+        "Order", ORDERS_CSV_PATH, "orderID", "Order", order_row, _node_query("Order")
+    ),
+    LoadStage(
+        "Product",
+        PRODUCTS_CSV_PATH,
+        "productID",
+        "Product",
+        product_row,
+        _node_query("Product"),
+    ),
+    LoadStage(
+        "Supplier",
+        SUPPLIERS_CSV_PATH,
+        "supplierID",
+        "Supplier",
+        supplier_row,
+        _node_query("Supplier"),
+    ),
+    LoadStage(
+        "Category",
+        CATEGORIES_CSV_PATH,
+        "categoryID",
+        "Category",
+        category_row,
+        _node_query("Category"),
+    ),
+    LoadStage(
+        "Review",
+        REVIEWS_CSV_PATH,
+        "reviewID",
+        "Review",
+        review_row,
+        _node_query("Review"),
+    ),
+]
+
+# Each relationship is keyed by the node of its source CSV (label), so
+# a changed CSV row only touches the relationships of that node
+RELATIONSHIP_STAGES = [
+    LoadStage(
+        "PURCHASED",
+        ORDERS_CSV_PATH,
+        "orderID",
+        "Order",
+        purchased_row,
+        _relationship_query("Customer", "customer_id", "PURCHASED", "Order", "order_id"),
+    ),
+    LoadStage(
+        "ORDERS",
+        ORDERS_CSV_PATH,
+        "orderID",
+        "Order",
+        orders_row,
+        _relationship_query("Order", "order_id", "ORDERS", "Product", "product_id"),
+    ),
+    LoadStage(
+        "SUPPLIES",
+        PRODUCTS_CSV_PATH,
+        "productID",
+        "Product",
+        supplies_row,
+        _relationship_query("Supplier", "supplier_id", "SUPPLIES", "Product", "product_id"),
+    ),
+    LoadStage(
+        "PART_OF",
+        PRODUCTS_CSV_PATH,
+        "productID",
+        "Product",
+        part_of_row,
+        _relationship_query("Product", "product_id", "PART_OF", "Category", "category_id"),
+    ),
+    LoadStage(
+        "WRITES",
+        REVIEWS_CSV_PATH,
+        "reviewID",
+        "Review",
+        writes_row,
+        _relationship_query("Order", "order_id", "WRITES", "Review", "review_id"),
+    ),
+]
+
+SOURCES = {stage.csv_path: stage.key_column for stage in NODE_STAGES}
+
+# (entity type, CSV, name column) of the names the API links questions to
+ENTITY_NAME_COLUMNS = [
+    ("category", CATEGORIES_CSV_PATH, "categoryName"),
+    ("product", PRODUCTS_CSV_PATH, "productName"),
+    ("supplier", SUPPLIERS_CSV_PATH, "companyName"),
+    ("country", CUSTOMERS_CSV_PATH, "country"),
+]
+
 
 def _set_uniqueness_constraints(tx, node):
     query = f"""CREATE CONSTRAINT IF NOT EXISTS FOR (n:{node})
@@ -32,189 +219,283 @@ def _set_uniqueness_constraints(tx, node):
     _ = tx.run(query, {})
 
 
-@retry(tries=100, delay=10)
-def load_northwind_graph_from_csv() -> None:
-    """Load structured customers CSV data following
-    a specific ontology into Neo4j"""
+def _typed_id(label: str, key: str):
+    return key if label == "Customer" else to_int(key)
+
+
+def _write_batch(tx, query: str, rows: list) -> None:
+    tx.run(query, rows=rows).consume()
+
+
+def _write_rows(driver, query: str, rows: Iterable) -> int:
+    """Write rows through fixed-size UNWIND batches, committing each
+    batch in its own transaction"""
+
+    num_rows = 0
+    with driver.session(database="neo4j") as session:
+        for batch in batched(rows, NORTHWIND_ETL_BATCH_SIZE):
+            session.execute_write(_write_batch, query, batch)
+            num_rows += len(batch)
+    return num_rows
+
+
+def _log_throughput(stage: LoadStage, num_rows: int, start: float) -> None:
+    elapsed = time.perf_counter() - start
+    LOGGER.info(
+        f"Loaded {num_rows} rows for '{stage.name}' in {elapsed:.2f}s "
+        f"({num_rows / max(elapsed, 1e-9):.0f} rows/sec)"
+    )
+
+
+def _load_stage(driver, stage: LoadStage) -> None:
+    start = time.perf_counter()
+    rows = map(stage.to_row, read_csv_rows(stage.csv_path))
+    _log_throughput(stage, _write_rows(driver, stage.query, rows), start)
+
+
+def _apply_node_delta(driver, stage: LoadStage, delta: SourceDelta) -> None:
+    start = time.perf_counter()
+    num_rows = _write_rows(driver, stage.query, map(stage.to_row, delta.upserts))
+    num_rows += _write_rows(
+        driver,
+        f"""
+        UNWIND $rows AS id
+        MATCH (n:{stage.label} {{id: id}})
+        DETACH DELETE n
+        """,
+        (_typed_id(stage.label, key) for key in delta.deleted_keys),
+    )
+    _log_throughput(stage, num_rows, start)
+
+
+def _apply_relationship_delta(driver, stage: LoadStage, delta: SourceDelta) -> None:
+    start = time.perf_counter()
+    # Updated rows may point at a different node now, so their existing
+    # relationships are dropped before merging the new ones
+    _write_rows(
+        driver,
+        f"""
+        UNWIND $rows AS id
+        MATCH (n:{stage.label} {{id: id}})-[r:{stage.name}]-()
+        DELETE r
+        """,
+        (_typed_id(stage.label, key) for key in delta.updated_keys),
+    )
+    num_rows = _write_rows(driver, stage.query, map(stage.to_row, delta.upserts))
+    _log_throughput(stage, num_rows, start)
+
+
+def _run_stages(checkpoint: StageCheckpoint, stages: list[LoadStage], load) -> None:
+    """Run independent stages in parallel, skipping stages that already
+    committed in a previous attempt of the same run"""
+
+    def _run(stage: LoadStage) -> None:
+        if checkpoint.is_done(stage.name):
+            LOGGER.info(f"Skipping '{stage.name}', already loaded in this run")
+            return
+        load(stage)
+        checkpoint.mark_done(stage.name)
+
+    with ThreadPoolExecutor(max_workers=NORTHWIND_ETL_WORKERS) as executor:
+        list(executor.map(_run, stages))
+
+
+def _run_embedding_stage(checkpoint: StageCheckpoint, driver) -> None:
+    # Review vectors are computed offline here so the API never embeds
+    # documents; unchanged review texts are served from the local cache
+    if checkpoint.is_done("REVIEW_EMBEDDINGS"):
+        LOGGER.info("Skipping 'REVIEW_EMBEDDINGS', already loaded in this run")
+        return
+    embedder = get_embedder()
+    reviews = embed_reviews(driver, REVIEWS_CSV_PATH, embedder)
+    write_review_index_snapshot(reviews, embedder.name)
+    checkpoint.mark_done("REVIEW_EMBEDDINGS")
+
+
+def _refresh_sales_summaries(driver, incremental: bool) -> None:
+    """
+    Recompute the SalesSummary aggregates from the CSVs and write only
+    the summaries whose values changed since the last run (every
+    summary on a full load), deleting summaries that no longer exist.
+    A full load doesn't trust the manifest, so it compares against the
+    summaries in the graph instead.
+    """
 
-    driver = GraphDatabase.driver(
-        NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD)
+    start = time.perf_counter()
+    summaries = compute_sales_summaries(
+        ORDERS_CSV_PATH,
+        PRODUCTS_CSV_PATH,
+        CUSTOMERS_CSV_PATH,
+        CATEGORIES_CSV_PATH,
+        SUPPLIERS_CSV_PATH,
     )
+    hashes = {summary_id: row_hash(row) for summary_id, row in summaries.items()}
+    if incremental:
+        previous = load_manifest(SALES_SUMMARY_MANIFEST)
+        existing = set(previous)
+    else:
+        previous = {}
+        with driver.session(database="neo4j") as session:
+            existing = {record["id"] for record in session.run(SUMMARY_IDS_QUERY)}
 
+    changed = [
+        summaries[summary_id]
+        for summary_id, digest in hashes.items()
+        if previous.get(summary_id) != digest
+    ]
+    deleted = [summary_id for summary_id in existing if summary_id not in hashes]
+
+    _write_rows(driver, SUMMARY_NODE_QUERY, changed)
+    for dimension in LINKED_DIMENSIONS:
+        _write_rows(
+            driver,
+            summary_link_query(dimension),
+            (
+                row
+                for row in changed
+                if row["properties"]["dimension"] == dimension.name
+            ),
+        )
+    _write_rows(driver, SUMMARY_DELETE_QUERY, deleted)
+    save_manifest(SALES_SUMMARY_MANIFEST, hashes)
+
+    LOGGER.info(
+        f"Wrote {len(changed)} and deleted {len(deleted)} of {len(summaries)} "
+        f"sales summaries in {time.perf_counter() - start:.2f}s"
+    )
+
+
+def _run_summary_stage(checkpoint: StageCheckpoint, driver, incremental: bool) -> None:
+    if checkpoint.is_done("SALES_SUMMARIES"):
+        LOGGER.info("Skipping 'SALES_SUMMARIES', already loaded in this run")
+        return
+    _refresh_sales_summaries(driver, incremental)
+    checkpoint.mark_done("SALES_SUMMARIES")
+
+
+def _publish_entity_names() -> None:
+    entities = {
+        entity_type: sorted(
+            {row[column] for row in read_csv_rows(path) if row[column]}
+        )
+        for entity_type, path, column in ENTITY_NAME_COLUMNS
+    }
+    publish_entity_names(entities)
+
+
+def _set_constraints(driver) -> None:
     LOGGER.info("Setting uniqueness constraints on nodes")
     with driver.session(database="neo4j") as session:
         for node in NODES:
             session.execute_write(_set_uniqueness_constraints, node)
 
-    LOGGER.info("Loading customer nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{CUSTOMERS_CSV_PATH}' AS customers
-        MERGE (c:Customer {{id: customers.customerID,
-                            company_name: customers.companyName,
-                            contact_name: customers.contactName,
-                            contact_title: customers.contactTitle,
-                            address: customers.address,
-                            city: customers.city,
-                            region: customers.region,
-                            postal_code: customers.postalCode,
-                            country: customers.country,
-                            phone: customers.phone,
-                            fax: customers.fax}});
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading order nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS 
-        FROM '{ORDERS_CSV_PATH}' AS orders
-        MERGE (o:Order {{
-            id: toInteger(orders.orderID),
-            num_products: toInteger(orders.numProduct),
-            unit_price: toInteger(orders.unitPrice),
-            quantity: toInteger(orders.quantity),
-            discount: toFloat(orders.discount),
-            order_date: CASE 
-            WHEN orders.orderDate IS NOT NULL AND orders.orderDate <> '' 
-            THEN date({{year: toInteger(split(orders.orderDate, '/')[2]), 
-                       month: toInteger(split(orders.orderDate, '/')[0]), 
-                       day: toInteger(split(orders.orderDate, '/')[1])}})
-            ELSE null 
-            END,
-        required_date: CASE 
-            WHEN orders.requiredDate IS NOT NULL AND orders.requiredDate <> '' 
-            THEN date({{year: toInteger(split(orders.requiredDate, '/')[2]), 
-                       month: toInteger(split(orders.requiredDate, '/')[0]), 
-                       day: toInteger(split(orders.requiredDate, '/')[1])}})
-            ELSE null 
-            END,
-        shipped_date: CASE 
-            WHEN orders.shippedDate IS NOT NULL AND orders.shippedDate <> '' 
-            THEN date({{year: toInteger(split(orders.shippedDate, '/')[2]), 
-                       month: toInteger(split(orders.shippedDate, '/')[0]), 
-                       day: toInteger(split(orders.shippedDate, '/')[1])}})
-            ELSE null 
-            END,
-            ship_via: orders.shipVia,
-            freight: orders.freight,
-            ship_name: orders.shipName,
-            ship_city: orders.shipCity,
-            ship_postal_code: orders.shipPostalCode,
-            ship_country: orders.shipCountry
-    }});
-    """
-        _ = session.run(query, {})
-    
-    LOGGER.info("Loading product nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{PRODUCTS_CSV_PATH}' AS products
-        MERGE (p:Product {{id: toInteger(products.productID),
-        product_name: products.productName,
-        quantity_per_unit: products.quantityPerUnit,
-        unit_price: toFloat(products.unitPrice),
-        units_in_stock: toInteger(products.unitsInStock),
-        units_on_order: toInteger(products.unitsOnOrder),
-        reorder_level: toInteger(products.reorderLevel),
-        discontinued: toInteger(products.discontinued)}});
-        """
-        _ = session.run(query, {})
-    
-    LOGGER.info("Loading supplier nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{SUPPLIERS_CSV_PATH}' AS suppliers
-        MERGE (s:Supplier {{id: toInteger(suppliers.supplierID),
-        company_name: suppliers.companyName,
-        contact_name: suppliers.contactName,
-        contact_title: suppliers.contactTitle,
-        supplier_address: suppliers.address,
-        supplier_city: suppliers.city,
-        supplier_region: suppliers.region,
-        supplier_postal_code: suppliers.postalCode,
-        supplier_country: suppliers.country,
-        supplier_phone: suppliers.phone,
-        supplier_fax: suppliers.fax}});
-        """
-        _ = session.run(query, {})
-        
-    LOGGER.info("Loading category nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{CATEGORIES_CSV_PATH}' AS categories
-        MERGE (c:Category {{id: toInteger(categories.categoryID),
-        category_name: categories.categoryName,
-        category_description: categories.description}});
-        """
-        _ = session.run(query, {})
-        
-    LOGGER.info("Loading review nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{REVIEWS_CSV_PATH}' AS reviews
-        MERGE (r:Review {{id: toInteger(reviews.reviewID),
-        text: reviews.reviews}});
-        """
-        _ = session.run(query, {})
-    
-
-    LOGGER.info("Loading 'PURCHASED' relationships")
-    # specify the file having both the keys
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{ORDERS_CSV_PATH}' AS row
-            MATCH (c:Customer {{id: toString(row.customerID)}})
-            MATCH (o:Order {{id: toInteger(row.orderID)}})
-            MERGE (c)-[purchased:PURCHASED]->(o)
-        """
-        _ = session.run(query, {})
-    
-    LOGGER.info("Loading 'ORDERS' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{ORDERS_CSV_PATH}' AS row
-            MATCH (o:Order {{id: toInteger(row.orderID)}})
-            MATCH (p:Product {{id: toInteger(row.productID)}})
-            MERGE (o)-[orders:ORDERS]->(p)
-        """
-        _ = session.run(query, {})
-        
-    LOGGER.info("Loading 'SUPPLIES' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{PRODUCTS_CSV_PATH}' AS row
-            MATCH (s:Supplier {{id: toInteger(row.supplierID)}})
-            MATCH (p:Product {{id: toInteger(row.productID)}})
-            MERGE (s)-[supplies:SUPPLIES]->(p)
-        """
-        _ = session.run(query, {})
-        
-    LOGGER.info("Loading 'PART_OF' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{PRODUCTS_CSV_PATH}' AS row
-            MATCH (c:Category {{id: toInteger(row.categoryID)}})
-            MATCH (p:Product {{id: toInteger(row.productID)}})
-            MERGE (p)-[part_of:PART_OF]->(c)
-        """
-        _ = session.run(query, {})
-        
-    LOGGER.info("Loading 'WRITES' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{REVIEWS_CSV_PATH}' AS row
-            MATCH (o:Order {{id: toInteger(row.orderID)}})
-            MATCH (r:Review {{id: toInteger(row.reviewID)}})
-            MERGE (o)-[writes:WRITES]->(r)
-        """
-        _ = session.run(query, {})    
+
+@retry(tries=100, delay=10)
+def load_northwind_graph_from_csv() -> None:
+    """Load structured customers CSV data following
+    a specific ontology into Neo4j"""
+
+    manifests = {
+        path: compute_hashes(path, key_column) for path, key_column in SOURCES.items()
+    }
+    checkpoint = StageCheckpoint(run_fingerprint("full", manifests))
+
+    # One pool for the whole run, closed even when the run is retried
+    with create_driver(min_pool_size=NORTHWIND_ETL_WORKERS) as driver:
+        _set_constraints(driver)
+
+        # Node labels are independent of each other, and relationship
+        # stages only need their endpoint nodes to exist
+        LOGGER.info("Loading nodes")
+        _run_stages(checkpoint, NODE_STAGES, lambda stage: _load_stage(driver, stage))
+
+        LOGGER.info("Loading relationships")
+        _run_stages(
+            checkpoint, RELATIONSHIP_STAGES, lambda stage: _load_stage(driver, stage)
+        )
+
+        LOGGER.info("Embedding reviews")
+        _run_embedding_stage(checkpoint, driver)
+
+        LOGGER.info("Building sales summaries")
+        _run_summary_stage(checkpoint, driver, incremental=False)
+
+        # Published only once the indexes serve the new data
+        LOGGER.info("Updating indexes")
+        ensure_indexes(driver)
+
+    for path, hashes in manifests.items():
+        save_manifest(path, hashes)
+    checkpoint.clear()
+
+    _publish_entity_names()
+    graph_version = publish_graph_version()
+    LOGGER.info(f"Published graph version {graph_version}")
+
+
+@retry(tries=100, delay=10)
+def load_northwind_graph_incremental() -> None:
+    """Apply only the CSV rows inserted, updated or deleted since the
+    last successful load, resuming from the last committed stage"""
+
+    deltas = {
+        path: compute_delta(path, key_column) for path, key_column in SOURCES.items()
+    }
+    for path, delta in deltas.items():
+        LOGGER.info(
+            f"{path}: {len(delta.upserts) - len(delta.updated_keys)} inserts, "
+            f"{len(delta.updated_keys)} updates, {len(delta.deleted_keys)} deletes"
+        )
+
+    if not any(delta.num_changes for delta in deltas.values()):
+        LOGGER.info("No changes since the last load")
+        return
+
+    checkpoint = StageCheckpoint(
+        run_fingerprint(
+            "incremental", {path: delta.hashes for path, delta in deltas.items()}
+        )
+    )
+
+    with create_driver(min_pool_size=NORTHWIND_ETL_WORKERS) as driver:
+        _set_constraints(driver)
+
+        LOGGER.info("Applying node changes")
+        _run_stages(
+            checkpoint,
+            NODE_STAGES,
+            lambda stage: _apply_node_delta(driver, stage, deltas[stage.csv_path]),
+        )
+
+        LOGGER.info("Applying relationship changes")
+        _run_stages(
+            checkpoint,
+            RELATIONSHIP_STAGES,
+            lambda stage: _apply_relationship_delta(
+                driver, stage, deltas[stage.csv_path]
+            ),
+        )
+
+        LOGGER.info("Embedding changed reviews")
+        _run_embedding_stage(checkpoint, driver)
+
+        LOGGER.info("Refreshing sales summaries")
+        _run_summary_stage(checkpoint, driver, incremental=True)
+
+        LOGGER.info("Updating indexes")
+        ensure_indexes(driver)
+
+    for path, delta in deltas.items():
+        save_manifest(path, delta.hashes)
+    checkpoint.clear()
+
+    _publish_entity_names()
+    graph_version = publish_graph_version()
+    LOGGER.info(f"Published graph version {graph_version}")
 
 
 if __name__ == "__main__":
-    load_northwind_graph_from_csv()
+    if NORTHWIND_ETL_MODE == "incremental":
+        load_northwind_graph_incremental()
+    else:
+        load_northwind_graph_from_csv()
@@ -0,0 +1,178 @@
+import csv
+import urllib.parse
+import urllib.request
+from datetime import date
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+
+def _decode_lines(lines: Iterable[bytes]) -> Iterator[str]:
+    # The sample CSVs mix UTF-8 with stray Windows-1252 punctuation
+    for line in lines:
+        try:
+            yield line.decode("utf-8")
+        except UnicodeDecodeError:
+            yield line.decode("cp1252", errors="replace")
+
+
+def read_csv_rows(path: str) -> Iterator[dict]:
+    """Stream rows of a CSV given as a local path, a file:// URL or an
+    http(s) URL, without reading the whole file into memory"""
+
+    parsed = urllib.parse.urlparse(path)
+    if parsed.scheme in ("http", "https"):
+        with urllib.request.urlopen(path) as response:
+            yield from csv.DictReader(_decode_lines(response))
+        return
+
+    if parsed.scheme == "file":
+        path = urllib.parse.unquote(parsed.path)
+
+    with open(path, "rb") as f:
+        yield from csv.DictReader(_decode_lines(f))
+
+
+def batched(rows: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def to_str(value: Optional[str]) -> Optional[str]:
+    """Empty fields become null, as they were with LOAD CSV, so IS NULL
+    checks find missing values"""
+
+    return value or None
+
+
+def to_int(value: Optional[str]) -> Optional[int]:
+    """Mirror Cypher's toInteger(): truncate decimals, null on bad input"""
+
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_date(value: Optional[str]) -> Optional[date]:
+    """Parse the M/D/YYYY dates used by the Northwind CSVs"""
+
+    if not value:
+        return None
+    try:
+        month, day, year = (int(part) for part in value.split("/"))
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def customer_row(row: dict) -> dict:
+    return {
+        "id": to_str(row["customerID"]),
+        "company_name": to_str(row["companyName"]),
+        "contact_name": to_str(row["contactName"]),
+        "contact_title": to_str(row["contactTitle"]),
+        "address": to_str(row["address"]),
+        "city": to_str(row["city"]),
+        "region": to_str(row["region"]),
+        "postal_code": to_str(row["postalCode"]),
+        "country": to_str(row["country"]),
+        "phone": to_str(row["phone"]),
+        "fax": to_str(row["fax"]),
+    }
+
+
+def order_row(row: dict) -> dict:
+    return {
+        "id": to_int(row["orderID"]),
+        "num_products": to_int(row["numProduct"]),
+        "unit_price": to_int(row["unitPrice"]),
+        "quantity": to_int(row["quantity"]),
+        "discount": to_float(row["discount"]),
+        "order_date": to_date(row["orderDate"]),
+        "required_date": to_date(row["requiredDate"]),
+        "shipped_date": to_date(row["shippedDate"]),
+        "ship_via": to_str(row["shipVia"]),
+        "freight": to_str(row["freight"]),
+        "ship_name": to_str(row["shipName"]),
+        "ship_city": to_str(row["shipCity"]),
+        "ship_postal_code": to_str(row["shipPostalCode"]),
+        "ship_country": to_str(row["shipCountry"]),
+    }
+
+
+def product_row(row: dict) -> dict:
+    return {
+        "id": to_int(row["productID"]),
+        "product_name": to_str(row["productName"]),
+        "quantity_per_unit": to_str(row["quantityPerUnit"]),
+        "unit_price": to_float(row["unitPrice"]),
+        "units_in_stock": to_int(row["unitsInStock"]),
+        "units_on_order": to_int(row["unitsOnOrder"]),
+        "reorder_level": to_int(row["reorderLevel"]),
+        "discontinued": to_int(row["discontinued"]),
+    }
+
+
+def supplier_row(row: dict) -> dict:
+    return {
+        "id": to_int(row["supplierID"]),
+        "company_name": to_str(row["companyName"]),
+        "contact_name": to_str(row["contactName"]),
+        "contact_title": to_str(row["contactTitle"]),
+        "supplier_address": to_str(row["address"]),
+        "supplier_city": to_str(row["city"]),
+        "supplier_region": to_str(row["region"]),
+        "supplier_postal_code": to_str(row["postalCode"]),
+        "supplier_country": to_str(row["country"]),
+        "supplier_phone": to_str(row["phone"]),
+        "supplier_fax": to_str(row["fax"]),
+    }
+
+
+def category_row(row: dict) -> dict:
+    return {
+        "id": to_int(row["categoryID"]),
+        "category_name": to_str(row["categoryName"]),
+        "category_description": to_str(row["description"]),
+    }
+
+
+def review_row(row: dict) -> dict:
+    return {"id": to_int(row["reviewID"]), "text": to_str(row["reviews"])}
+
+
+def purchased_row(row: dict) -> dict:
+    return {
+        "customer_id": to_str(row["customerID"]),
+        "order_id": to_int(row["orderID"]),
+    }
+
+
+def orders_row(row: dict) -> dict:
+    return {"order_id": to_int(row["orderID"]), "product_id": to_int(row["productID"])}
+
+
+def supplies_row(row: dict) -> dict:
+    return {
+        "supplier_id": to_int(row["supplierID"]),
+        "product_id": to_int(row["productID"]),
+    }
+
+
+def part_of_row(row: dict) -> dict:
+    return {
+        "category_id": to_int(row["categoryID"]),
+        "product_id": to_int(row["productID"]),
+    }
+
+
+def writes_row(row: dict) -> dict:
+    return {"order_id": to_int(row["orderID"]), "review_id": to_int(row["reviewID"])}
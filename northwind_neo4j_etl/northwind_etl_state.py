@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+from northwind_csv_rows import read_csv_rows
+
+NORTHWIND_ARTIFACTS_DIR = Path(
+    os.getenv(
+        "NORTHWIND_ARTIFACTS_DIR",
+        Path(__file__).resolve().parents[1] / "artifacts",
+    )
+)
+
+MANIFEST_DIR = NORTHWIND_ARTIFACTS_DIR / "etl_manifest"
+CHECKPOINT_PATH = NORTHWIND_ARTIFACTS_DIR / "etl_checkpoint.json"
+
+
+def write_json_atomically(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def read_json(path: Path, default=None):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def publish_graph_version() -> str:
+    """Write a new graph data version to the artifacts directory so the
+    API can invalidate answers computed against the previous load"""
+
+    version = uuid.uuid4().hex
+    write_json_atomically(
+        NORTHWIND_ARTIFACTS_DIR / "graph_version.json",
+        {
+            "version": version,
+            "loaded_at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+    return version
+
+
+def publish_entity_names(entities: dict[str, list[str]]) -> None:
+    """Snapshot the names of linkable entities (categories, products,
+    ...) for the API's entity linker"""
+
+    write_json_atomically(NORTHWIND_ARTIFACTS_DIR / "entities.json", entities)
+
+
+def row_hash(row: dict) -> str:
+    encoded = json.dumps(row, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def _manifest_path(source: str) -> Path:
+    return MANIFEST_DIR / f"{Path(source).stem}.json"
+
+
+def load_manifest(source: str) -> dict[str, str]:
+    return read_json(_manifest_path(source), default={})
+
+
+def save_manifest(source: str, hashes: dict[str, str]) -> None:
+    write_json_atomically(_manifest_path(source), hashes)
+
+
+class SourceDelta(NamedTuple):
+    upserts: list[dict]
+    updated_keys: list[str]
+    deleted_keys: list[str]
+    hashes: dict[str, str]
+
+    @property
+    def num_changes(self) -> int:
+        return len(self.upserts) + len(self.deleted_keys)
+
+
+def compute_hashes(csv_path: str, key_column: str) -> dict[str, str]:
+    return {row[key_column]: row_hash(row) for row in read_csv_rows(csv_path)}
+
+
+def compute_delta(csv_path: str, key_column: str) -> SourceDelta:
+    """
+    Compare each CSV row's content hash with the manifest of the last
+    successful run. Only inserted and updated rows are kept in memory.
+    """
+
+    previous = load_manifest(csv_path)
+    hashes = {}
+    upserts = []
+    updated_keys = []
+    for row in read_csv_rows(csv_path):
+        key = row[key_column]
+        digest = row_hash(row)
+        hashes[key] = digest
+        previous_digest = previous.get(key)
+        if previous_digest != digest:
+            upserts.append(row)
+            if previous_digest is not None:
+                updated_keys.append(key)
+
+    deleted_keys = [key for key in previous if key not in hashes]
+    return SourceDelta(upserts, updated_keys, deleted_keys, hashes)
+
+
+def run_fingerprint(mode: str, manifests: dict[str, dict[str, str]]) -> str:
+    """Identify a run by its mode and the content it is loading, so a
+    retry over unchanged CSVs resumes from the same checkpoint"""
+
+    digest = hashlib.sha1(mode.encode("utf-8"))
+    for source in sorted(manifests):
+        digest.update(source.encode("utf-8"))
+        for key, row_digest in sorted(manifests[source].items()):
+            digest.update(f"{key}:{row_digest}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class StageCheckpoint:
+    """
+    Records which ETL stages of a run have committed. A rerun over the
+    same delta skips completed stages; a run over a different delta
+    starts from a clean checkpoint.
+    """
+
+    def __init__(self, fingerprint: str, path: Path = CHECKPOINT_PATH):
+        self.fingerprint = fingerprint
+        self.path = path
+        self._lock = threading.Lock()
+
+        data = read_json(path, default={}) or {}
+        if data.get("fingerprint") == fingerprint:
+            self.completed = set(data.get("completed_stages", []))
+        else:
+            self.completed = set()
+
+    def is_done(self, stage: str) -> bool:
+        return stage in self.completed
+
+    def mark_done(self, stage: str) -> None:
+        with self._lock:
+            self.completed.add(stage)
+            write_json_atomically(
+                self.path,
+                {
+                    "fingerprint": self.fingerprint,
+                    "completed_stages": sorted(self.completed),
+                },
+            )
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
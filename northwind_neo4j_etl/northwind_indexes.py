@@ -0,0 +1,278 @@
+"""
+The property and full-text indexes the generated Cypher relies on.
+
+The ETL owns every index whose name starts with "northwind_": missing
+ones are created, ones whose definition changed are recreated and ones
+no longer declared are dropped. Uniqueness constraints and the review
+vector index are managed elsewhere and left alone.
+
+Run as a script for a db-hits report of the example queries:
+
+    python northwind_neo4j_etl/northwind_indexes.py [--rebuild]
+
+--rebuild drops the managed indexes first, so the report compares the
+db hits without and with them.
+"""
+
+import argparse
+import logging
+import os
+import time
+from typing import NamedTuple
+from dotenv import load_dotenv
+load_dotenv()
+from northwind_neo4j_driver import create_driver
+
+MANAGED_PREFIX = "northwind_"
+FULLTEXT_NAME_INDEX = "northwind_names"
+
+NORTHWIND_INDEX_AWAIT_SECONDS = int(os.getenv("NORTHWIND_INDEX_AWAIT_SECONDS", 600))
+# Profile the example queries before and after creating missing indexes
+NORTHWIND_INDEX_REPORT = os.getenv("NORTHWIND_INDEX_REPORT", "0") == "1"
+
+LOGGER = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    name: str
+    kind: str
+    labels: tuple
+    properties: tuple
+
+    def create_query(self) -> str:
+        if self.kind == "FULLTEXT":
+            properties = ", ".join(f"n.{p}" for p in self.properties)
+            return (
+                f"CREATE FULLTEXT INDEX {self.name} IF NOT EXISTS "
+                f"FOR (n:{'|'.join(self.labels)}) ON EACH [{properties}]"
+            )
+        properties = ", ".join(f"n.{p}" for p in self.properties)
+        kind = "" if self.kind == "RANGE" else f"{self.kind} "
+        return (
+            f"CREATE {kind}INDEX {self.name} IF NOT EXISTS "
+            f"FOR (n:{self.labels[0]}) ON ({properties})"
+        )
+
+
+def _range(label: str, *properties: str) -> IndexSpec:
+    name = f"{MANAGED_PREFIX}{label.lower()}_{'_'.join(properties)}"
+    return IndexSpec(name, "RANGE", (label,), properties)
+
+
+def _text(label: str, prop: str) -> IndexSpec:
+    return IndexSpec(
+        f"{MANAGED_PREFIX}{label.lower()}_{prop}_text", "TEXT", (label,), (prop,)
+    )
+
+
+# Date ranges and countries are compared with range predicates and
+# equality; names with equality and CONTAINS/STARTS WITH
+INDEXES = [
+    _range("Order", "order_date"),
+    _range("Order", "required_date"),
+    _range("Order", "shipped_date"),
+    _range("Order", "ship_country"),
+    _range("Customer", "country"),
+    _range("Supplier", "supplier_country"),
+    _range("SalesSummary", "dimension", "period", "year"),
+    _range("SalesSummary", "name"),
+    _text("Category", "category_name"),
+    _text("Product", "product_name"),
+    _text("Supplier", "company_name"),
+    _text("Customer", "company_name"),
+    _text("Customer", "contact_name"),
+    IndexSpec(
+        FULLTEXT_NAME_INDEX,
+        "FULLTEXT",
+        ("Product", "Supplier", "Customer"),
+        ("product_name", "company_name", "contact_name"),
+    ),
+]
+
+# The examples of the API's Cypher generation prompt, plus the date
+# range and country shapes the indexes are meant for
+REPORT_QUERIES = {
+    "produce_quantity_per_customer_2012": """
+        MATCH (cust:Customer)-[:PURCHASED]->(o:Order)-[:ORDERS]->(p:Product)
+              -[:PART_OF]->(c:Category {category_name: "Produce"})
+        WHERE o.order_date >= date('2012-01-01') AND o.order_date < date('2013-01-01')
+        RETURN DISTINCT cust.contact_name AS CustomerName,
+               SUM(o.quantity) AS TotalProductsPurchased
+    """,
+    "customers_with_large_orders": """
+        MATCH (c:Customer)-[:PURCHASED]->(o:Order)
+        WHERE o.num_products > 5
+        RETURN c.company_name, o.id
+    """,
+    "categories_per_supplier": """
+        MATCH (s:Supplier)-[:SUPPLIES]->(p:Product)-[:PART_OF]->(c:Category)
+        RETURN s.company_name AS Company,
+               collect(DISTINCT c.category_name) AS Categories
+    """,
+    "german_customers_with_reviews": """
+        MATCH (c:Customer)-[:PURCHASED]->(o:Order)-[:WRITES]->(r:Review)
+        WHERE c.country = 'Germany'
+        RETURN COUNT(DISTINCT c) AS customers_with_reviews
+    """,
+    "produce_suppliers": """
+        MATCH (s:Supplier)-[:SUPPLIES]->(p:Product)-[:PART_OF]->(c:Category)
+        WHERE c.category_name = 'Produce'
+        RETURN DISTINCT s.company_name AS Supplier, collect(p.product_name) AS Products
+        ORDER BY s.company_name
+    """,
+    "net_sales_2012": """
+        MATCH (s:SalesSummary {dimension: 'all', period: 'year', year: 2012})
+        RETURN 'Total Sales is: $' + toInteger(s.revenue)
+    """,
+    "country_order_growth_2012_2013": """
+        MATCH (a:SalesSummary {dimension: 'country', period: 'year', year: 2012})
+        MATCH (b:SalesSummary {dimension: 'country', period: 'year', year: 2013,
+                               name: a.name})
+        WHERE a.order_count > 0
+        RETURN a.name AS country,
+               (toFloat(b.order_count) - toFloat(a.order_count))
+               / toFloat(a.order_count) * 100 AS percent_increase
+        ORDER BY percent_increase DESC
+        LIMIT 1
+    """,
+    "orders_in_march_2013": """
+        MATCH (o:Order)
+        WHERE o.order_date >= date('2013-03-01') AND o.order_date < date('2013-04-01')
+        RETURN count(o) AS orders
+    """,
+    "orders_shipped_to_france": """
+        MATCH (o:Order)
+        WHERE o.ship_country = 'France'
+        RETURN count(o) AS orders
+    """,
+}
+
+
+def _definition(spec: IndexSpec) -> tuple:
+    # As reported by SHOW INDEXES
+    return spec.kind, spec.labels, spec.properties
+
+
+def _existing_indexes(tx) -> dict:
+    result = tx.run(
+        """SHOW INDEXES YIELD name, type, labelsOrTypes, properties
+        WHERE name STARTS WITH $prefix
+        RETURN name, type, labelsOrTypes, properties""",
+        prefix=MANAGED_PREFIX,
+    )
+    return {
+        record["name"]: (
+            record["type"],
+            tuple(record["labelsOrTypes"] or ()),
+            tuple(record["properties"] or ()),
+        )
+        for record in result
+    }
+
+
+def _run(tx, query: str) -> None:
+    tx.run(query).consume()
+
+
+def drop_managed_indexes(driver) -> None:
+    with driver.session(database="neo4j") as session:
+        for name in session.execute_read(_existing_indexes):
+            session.execute_write(_run, f"DROP INDEX {name} IF EXISTS")
+
+
+def await_indexes(driver, timeout: int = NORTHWIND_INDEX_AWAIT_SECONDS) -> None:
+    """Block until every index is online, so queries of the new graph
+    version never fall back to label scans while indexes populate"""
+
+    start = time.perf_counter()
+    with driver.session(database="neo4j") as session:
+        session.run("CALL db.awaitIndexes($timeout)", timeout=timeout).consume()
+    LOGGER.info(f"Indexes online after {time.perf_counter() - start:.2f}s")
+
+
+def ensure_indexes(driver, report: bool = NORTHWIND_INDEX_REPORT) -> None:
+    """Bring the managed indexes in line with INDEXES and wait for them
+    to come online"""
+
+    with driver.session(database="neo4j") as session:
+        existing = session.execute_read(_existing_indexes)
+        declared = {spec.name: spec for spec in INDEXES}
+
+        stale = [
+            name
+            for name, definition in existing.items()
+            if name not in declared or definition != _definition(declared[name])
+        ]
+        missing = [
+            spec
+            for spec in INDEXES
+            if spec.name not in existing or spec.name in stale
+        ]
+
+    if not stale and not missing:
+        LOGGER.info(f"All {len(INDEXES)} managed indexes exist")
+        await_indexes(driver)
+        return
+
+    before = profile_queries(driver) if report else None
+
+    with driver.session(database="neo4j") as session:
+        for name in stale:
+            LOGGER.info(f"Dropping index {name}")
+            session.execute_write(_run, f"DROP INDEX {name} IF EXISTS")
+        for spec in missing:
+            LOGGER.info(f"Creating {spec.kind.lower()} index {spec.name}")
+            session.execute_write(_run, spec.create_query())
+
+    await_indexes(driver)
+    if report:
+        log_report(before, profile_queries(driver))
+
+
+def _db_hits(plan) -> int:
+    if not plan:
+        return 0
+    return plan.get("dbHits", 0) + sum(
+        _db_hits(child) for child in plan.get("children", [])
+    )
+
+
+def profile_queries(driver, queries: dict = REPORT_QUERIES) -> dict[str, int]:
+    """Total db hits of each query's PROFILE plan"""
+
+    db_hits = {}
+    with driver.session(database="neo4j") as session:
+        for name, query in queries.items():
+            summary = session.run(f"PROFILE {query}").consume()
+            db_hits[name] = _db_hits(summary.profile)
+    return db_hits
+
+
+def log_report(before: dict, after: dict) -> None:
+    width = max(len(name) for name in after)
+    LOGGER.info(f"{'query':<{width}} {'db hits before':>15} {'after':>10}")
+    for name, hits in after.items():
+        LOGGER.info(f"{name:<{width}} {before.get(name, 0):>15} {hits:>10}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s]: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Drop the managed indexes first to compare without and with them",
+    )
+    args = parser.parse_args()
+
+    with create_driver() as driver:
+        if args.rebuild:
+            drop_managed_indexes(driver)
+        before = profile_queries(driver)
+        ensure_indexes(driver, report=False)
+        log_report(before, profile_queries(driver))
@@ -0,0 +1,23 @@
+import os
+
+from neo4j import Driver, GraphDatabase
+from northwind_common.neo4j_driver_config import create_driver as create_shared_driver
+
+# ETL writes may queue behind each other for a pooled connection, so
+# they wait longer than API queries (NORTHWIND_NEO4J_ACQUISITION_TIMEOUT)
+NORTHWIND_ETL_NEO4J_ACQUISITION_TIMEOUT = float(
+    os.getenv("NORTHWIND_ETL_NEO4J_ACQUISITION_TIMEOUT", 60)
+)
+
+
+def create_driver(min_pool_size: int = 1) -> Driver:
+    """
+    One driver (and connection pool) for a whole ETL run, with the API's
+    driver settings (northwind_common). Stages open their own sessions,
+    which borrow pooled connections; the pool is sized for at least
+    min_pool_size concurrent stages.
+    """
+
+    return create_shared_driver(
+        GraphDatabase, NORTHWIND_ETL_NEO4J_ACQUISITION_TIMEOUT, min_pool_size
+    )
@@ -0,0 +1,284 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from array import array
+from datetime import datetime, timezone
+from typing import Optional, Protocol
+
+import numpy as np
+from northwind_common.hashing_embeddings import hashing_embedder_name, hashing_embedding
+from northwind_csv_rows import batched, read_csv_rows, to_int
+from northwind_etl_state import NORTHWIND_ARTIFACTS_DIR, write_json_atomically
+
+NORTHWIND_EMBEDDER = os.getenv("NORTHWIND_EMBEDDER", "openai")
+NORTHWIND_EMBEDDING_MODEL = os.getenv(
+    "NORTHWIND_EMBEDDING_MODEL", "text-embedding-ada-002"
+)
+NORTHWIND_HASHING_EMBEDDING_DIMENSIONS = int(
+    os.getenv("NORTHWIND_HASHING_EMBEDDING_DIMENSIONS", 256)
+)
+NORTHWIND_EMBEDDING_BATCH_SIZE = int(os.getenv("NORTHWIND_EMBEDDING_BATCH_SIZE", 100))
+
+EMBEDDING_CACHE_PATH = NORTHWIND_ARTIFACTS_DIR / "embedding_cache.sqlite"
+REVIEW_INDEX_DIR = NORTHWIND_ARTIFACTS_DIR / "review_index"
+REVIEW_INDEX_NAME = "reviews"
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Embedder(Protocol):
+    name: str
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        ...
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str = NORTHWIND_EMBEDDING_MODEL):
+        from openai import OpenAI
+
+        self.name = model
+        self._client = OpenAI()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        response = self._client.embeddings.create(model=self.name, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+class HashingEmbedder:
+    """
+    Deterministic, dependency-free bag-of-words embedder for tests and
+    offline runs. The API's hashing embeddings share its implementation
+    (northwind_common), so its query vectors match these.
+    """
+
+    def __init__(self, dimensions: int = NORTHWIND_HASHING_EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = hashing_embedder_name(dimensions)
+
+    def embed_one(self, text: str) -> list[float]:
+        return hashing_embedding(text, self.dimensions)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_one(text) for text in texts]
+
+
+def get_embedder() -> Embedder:
+    if NORTHWIND_EMBEDDER == "hashing":
+        return HashingEmbedder()
+    return OpenAIEmbedder()
+
+
+class EmbeddingCache:
+    """Local content-hash -> vector cache, so a review is only embedded
+    again when its text (or the embedding model) changes"""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, content_hash)
+            )"""
+        )
+
+    def get_many(self, model: str, hashes: list[str]) -> dict[str, list[float]]:
+        found = {}
+        for batch in batched(hashes, 500):
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"""SELECT content_hash, vector FROM embeddings
+                WHERE model = ? AND content_hash IN ({placeholders})""",
+                [model, *batch],
+            )
+            for content_hash, blob in rows:
+                found[content_hash] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model: str, vectors: dict[str, list[float]]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+            [
+                (model, content_hash, array("f", vector).tobytes())
+                for content_hash, vector in vectors.items()
+            ],
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _review_embedding_hashes(tx) -> dict:
+    result = tx.run(
+        "MATCH (r:Review) RETURN r.id AS id, r.embedding_hash AS embedding_hash"
+    )
+    return {record["id"]: record["embedding_hash"] for record in result}
+
+
+def _write_embeddings(tx, rows: list[dict]) -> None:
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MATCH (r:Review {id: row.id})
+        CALL db.create.setNodeVectorProperty(r, 'embedding', row.embedding)
+        SET r.embedding_hash = row.embedding_hash
+        """,
+        rows=rows,
+    ).consume()
+
+
+def _vector_index_dimensions(tx) -> Optional[int]:
+    """Dimensions of the existing review vector index, 0 if it has none
+    set, or None if there is no index"""
+
+    record = tx.run(
+        "SHOW INDEXES YIELD name, options WHERE name = $name RETURN options",
+        name=REVIEW_INDEX_NAME,
+    ).single()
+    if record is None:
+        return None
+    index_config = (record["options"] or {}).get("indexConfig") or {}
+    return int(index_config.get("vector.dimensions") or 0)
+
+
+def _drop_vector_index(tx) -> None:
+    tx.run(f"DROP INDEX `{REVIEW_INDEX_NAME}` IF EXISTS").consume()
+
+
+def _create_vector_index(tx, dimensions: int) -> None:
+    tx.run(
+        """CALL db.index.vector.createNodeIndex(
+            $name, 'Review', 'embedding', $dimensions, 'cosine')""",
+        name=REVIEW_INDEX_NAME,
+        dimensions=dimensions,
+    ).consume()
+
+
+def _ensure_vector_index(session, dimensions: int) -> None:
+    """Create the review vector index, recreating it when it was built
+    for another embedder's dimensions"""
+
+    existing = session.execute_read(_vector_index_dimensions)
+    if existing == dimensions:
+        return
+    if existing is not None:
+        LOGGER.info(
+            f"Recreating vector index '{REVIEW_INDEX_NAME}' for {dimensions} "
+            f"dimensions (was {existing})"
+        )
+        session.execute_write(_drop_vector_index)
+    session.execute_write(_create_vector_index, dimensions)
+
+
+def embed_reviews(driver, reviews_csv_path: str, embedder: Embedder = None) -> list:
+    """
+    Embed review texts in batches, reusing cached vectors for unchanged
+    texts, write only changed vectors back to Neo4j through batched
+    UNWIND and make sure the "reviews" vector index exists with the
+    embedder's dimensions. Returns the
+    (id, text, vector) triples of all reviews.
+    """
+
+    embedder = embedder or get_embedder()
+    start = time.perf_counter()
+
+    reviews = [
+        (to_int(row["reviewID"]), row["reviews"] or "")
+        for row in read_csv_rows(reviews_csv_path)
+    ]
+    hashes = [content_hash(f"{embedder.name}:{text}") for _, text in reviews]
+
+    cache = EmbeddingCache()
+    try:
+        vectors = cache.get_many(embedder.name, hashes)
+        missing = [
+            (content_hash_, text)
+            for content_hash_, (_, text) in zip(hashes, reviews)
+            if content_hash_ not in vectors
+        ]
+        missing = list(dict(missing).items())
+        for batch in batched(missing, NORTHWIND_EMBEDDING_BATCH_SIZE):
+            new_vectors = dict(
+                zip(
+                    [content_hash_ for content_hash_, _ in batch],
+                    embedder.embed([text for _, text in batch]),
+                )
+            )
+            cache.put_many(embedder.name, new_vectors)
+            vectors.update(new_vectors)
+    finally:
+        cache.close()
+
+    with driver.session(database="neo4j") as session:
+        stored_hashes = session.execute_read(_review_embedding_hashes)
+        changed = [
+            {
+                "id": review_id,
+                "embedding": vectors[content_hash_],
+                "embedding_hash": content_hash_,
+            }
+            for (review_id, _), content_hash_ in zip(reviews, hashes)
+            if stored_hashes.get(review_id) != content_hash_
+        ]
+        for batch in batched(changed, NORTHWIND_EMBEDDING_BATCH_SIZE):
+            session.execute_write(_write_embeddings, batch)
+
+        if vectors:
+            dimensions = len(next(iter(vectors.values())))
+            _ensure_vector_index(session, dimensions)
+
+    LOGGER.info(
+        f"Embedded {len(missing)} new review texts, wrote {len(changed)} of "
+        f"{len(reviews)} review vectors in {time.perf_counter() - start:.2f}s"
+    )
+    return [
+        (review_id, text, vectors[content_hash_])
+        for (review_id, text), content_hash_ in zip(reviews, hashes)
+    ]
+
+
+def write_review_index_snapshot(reviews: list, embedder_name: str) -> None:
+    """
+    Write the review vectors as a row-normalized float32 .npy matrix
+    (memory-mapped by the API's local retriever) plus a JSON manifest
+    with the review ids and texts. The manifest is replaced last, so
+    readers always see a matrix and a manifest from the same run.
+    """
+
+    REVIEW_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    vectors_file = f"vectors-{uuid.uuid4().hex}.npy"
+
+    matrix = np.asarray([vector for _, _, vector in reviews], dtype=np.float32)
+    if len(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+    np.save(REVIEW_INDEX_DIR / vectors_file, matrix)
+
+    write_json_atomically(
+        REVIEW_INDEX_DIR / "review_index.json",
+        {
+            "embedder": embedder_name,
+            "vectors_file": vectors_file,
+            "ids": [review_id for review_id, _, _ in reviews],
+            "texts": [text for _, text, _ in reviews],
+            "built_at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+
+    # Processes that still map an old matrix keep it until they reload
+    for path in REVIEW_INDEX_DIR.glob("vectors-*.npy"):
+        if path.name != vectors_file:
+            path.unlink(missing_ok=True)
+
+    LOGGER.info(f"Wrote review index snapshot with {len(matrix)} vectors")
@@ -0,0 +1,159 @@
+from collections import defaultdict
+from typing import NamedTuple
+
+from northwind_csv_rows import order_row, read_csv_rows, to_int
+
+
+class SummaryDimension(NamedTuple):
+    name: str
+    label: str
+
+
+# Dimensions linked to an existing node; "country" and "all" summaries
+# stand on their own
+LINKED_DIMENSIONS = [
+    SummaryDimension("category", "Category"),
+    SummaryDimension("customer", "Customer"),
+    SummaryDimension("supplier", "Supplier"),
+]
+
+SUMMARY_NODE_QUERY = """
+UNWIND $rows AS row
+MERGE (s:SalesSummary {id: row.id})
+SET s += row.properties
+"""
+
+SUMMARY_IDS_QUERY = """
+MATCH (s:SalesSummary)
+RETURN s.id AS id
+"""
+
+SUMMARY_DELETE_QUERY = """
+UNWIND $rows AS id
+MATCH (s:SalesSummary {id: id})
+DETACH DELETE s
+"""
+
+
+def summary_link_query(dimension: SummaryDimension) -> str:
+    return f"""
+    UNWIND $rows AS row
+    MATCH (s:SalesSummary {{id: row.id}})
+    MATCH (n:{dimension.label} {{id: row.node_id}})
+    MERGE (s)-[:SUMMARIZES]->(n)
+    """
+
+
+def _lookup(csv_path: str, key_column: str, columns: list[str]) -> dict:
+    return {
+        row[key_column]: {column: row[column] for column in columns}
+        for row in read_csv_rows(csv_path)
+    }
+
+
+def compute_sales_summaries(
+    orders_csv_path: str,
+    products_csv_path: str,
+    customers_csv_path: str,
+    categories_csv_path: str,
+    suppliers_csv_path: str,
+) -> dict[str, dict]:
+    """
+    Aggregate revenue, order count and quantity per year and per month
+    for every category, customer country, customer and supplier, plus
+    overall ("all") totals. Revenue uses the same formula as the Cypher
+    examples, quantity * ((1 - discount) * unit_price), on the values
+    the ETL loads into Order nodes. Orders are streamed, only the
+    aggregates are kept in memory.
+    """
+
+    products = _lookup(products_csv_path, "productID", ["categoryID", "supplierID"])
+    customers = _lookup(customers_csv_path, "customerID", ["companyName", "country"])
+    categories = _lookup(categories_csv_path, "categoryID", ["categoryName"])
+    suppliers = _lookup(suppliers_csv_path, "supplierID", ["companyName"])
+
+    totals = defaultdict(lambda: {"revenue": 0.0, "order_count": 0, "quantity": 0})
+    names = {}
+
+    for csv_row in read_csv_rows(orders_csv_path):
+        order = order_row(csv_row)
+        order_date = order["order_date"]
+        if order_date is None:
+            continue
+
+        quantity = order["quantity"] or 0
+        discount = order["discount"] or 0
+        revenue = quantity * ((1 - discount) * (order["unit_price"] or 0))
+
+        product = products.get(csv_row["productID"], {})
+        customer = customers.get(csv_row["customerID"], {})
+        category_id = product.get("categoryID")
+        supplier_id = product.get("supplierID")
+
+        keys = [("all", "all", "All orders", None)]
+        if category_id in categories:
+            keys.append(
+                (
+                    "category",
+                    category_id,
+                    categories[category_id]["categoryName"],
+                    to_int(category_id),
+                )
+            )
+        if supplier_id in suppliers:
+            keys.append(
+                (
+                    "supplier",
+                    supplier_id,
+                    suppliers[supplier_id]["companyName"],
+                    to_int(supplier_id),
+                )
+            )
+        if customer:
+            keys.append(
+                (
+                    "customer",
+                    csv_row["customerID"],
+                    customer["companyName"],
+                    csv_row["customerID"],
+                )
+            )
+            if customer["country"]:
+                keys.append(("country", customer["country"], customer["country"], None))
+
+        periods = [
+            ("year", str(order_date.year), order_date.year, None),
+            (
+                "month",
+                f"{order_date.year}-{order_date.month:02d}",
+                order_date.year,
+                order_date.month,
+            ),
+        ]
+        for dimension, key, name, node_id in keys:
+            for period, period_key, year, month in periods:
+                summary_id = f"{dimension}:{key}:{period_key}"
+                names[summary_id] = (dimension, name, node_id, period, year, month)
+                summary = totals[summary_id]
+                summary["revenue"] += revenue
+                summary["order_count"] += 1
+                summary["quantity"] += quantity
+
+    summaries = {}
+    for summary_id, summary in totals.items():
+        dimension, name, node_id, period, year, month = names[summary_id]
+        summaries[summary_id] = {
+            "id": summary_id,
+            "node_id": node_id,
+            "properties": {
+                "dimension": dimension,
+                "name": name,
+                "period": period,
+                "year": year,
+                "month": month,
+                "revenue": round(summary["revenue"], 2),
+                "order_count": summary["order_count"],
+                "quantity": summary["quantity"],
+            },
+        }
+    return summaries
@@ -0,0 +1,324 @@
+"""
+Generate a synthetic Northwind data set at a multiple of the sample's
+size, for ETL and query scale testing.
+
+customers.csv, products.csv, orders.csv and reviews.csv are written in
+the schema of the sample CSVs (categories.csv and suppliers.csv are
+copied as is). Every row is derived from a sample row plus the seeded
+random stream, so the same seed and scale give identical files, and
+rows are written as they are generated: memory use does not grow with
+the scale factor.
+
+- Customer and product popularity follows a Zipf distribution, so a few
+  customers place most orders and a few products dominate sales.
+- Order dates fall in 2012-2014, with volume growing over time and a
+  fourth-quarter peak.
+- Orders only reference generated customers and products, and reviews
+  only reference generated orders.
+
+    python northwind_neo4j_etl/northwind_synthetic_data.py --scale 100 \
+        --output-dir data/synthetic-100x --seed 42
+
+Point the ETL's *_CSV_PATH variables at the output directory to load it.
+"""
+
+import argparse
+import contextlib
+import csv
+import hashlib
+import logging
+import math
+import random
+import shutil
+from datetime import date, timedelta
+from pathlib import Path
+
+from northwind_csv_rows import read_csv_rows, to_float
+
+DEFAULT_DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+START_DATE = date(2012, 1, 1)
+END_DATE = date(2014, 12, 31)
+NUM_DAYS = (END_DATE - START_DATE).days + 1
+# Order volume at the end of the range relative to its start
+GROWTH = 1.8
+# Relative order volume per month, peaking in the fourth quarter
+MONTH_WEIGHTS = [0.8, 0.8, 0.9, 0.9, 1.0, 1.0, 0.9, 0.9, 1.0, 1.1, 1.3, 1.5]
+MAX_DATE_WEIGHT = GROWTH * max(MONTH_WEIGHTS)
+
+DISCOUNTS = [0, 0, 0, 0, 0.05, 0.1, 0.15, 0.2, 0.25]
+SHIPPED_RATE = 0.97
+
+COPIED_FILES = ["categories.csv", "suppliers.csv"]
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s]: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ZipfSampler:
+    """
+    Draw ranks 0..n-1 with probability roughly proportional to
+    1 / (rank + 1) ** exponent, in constant time and memory (inverse
+    CDF of the continuous power law). Ranks are spread over the ids
+    with a fixed permutation, so the popular ids aren't just the first
+    ones.
+    """
+
+    def __init__(self, n: int, exponent: float, rng: random.Random):
+        self.n = n
+        self.exponent = exponent
+        self.rng = rng
+        # An affine map modulo n is a permutation when the stride is
+        # coprime to n
+        self.stride = next(
+            s for s in range(int(n * 0.618) | 1, 2 * n + 2) if math.gcd(s, n) == 1
+        )
+        self.offset = n // 3
+
+    def _rank(self) -> int:
+        u = self.rng.random()
+        if abs(self.exponent - 1) < 1e-9:
+            rank = math.exp(u * math.log(self.n + 1)) - 1
+        else:
+            power = 1 - self.exponent
+            rank = (u * ((self.n + 1) ** power - 1) + 1) ** (1 / power) - 1
+        return min(int(rank), self.n - 1)
+
+    def sample(self) -> int:
+        return (self._rank() * self.stride + self.offset) % self.n
+
+
+def _date_weight(day: date, day_number: int) -> float:
+    trend = 1 + (GROWTH - 1) * day_number / (NUM_DAYS - 1)
+    return trend * MONTH_WEIGHTS[day.month - 1]
+
+
+def sample_order_date(rng: random.Random) -> date:
+    """Rejection-sample a day of the range by the trend and season"""
+
+    while True:
+        day_number = rng.randrange(NUM_DAYS)
+        day = START_DATE + timedelta(days=day_number)
+        if rng.random() * MAX_DATE_WEIGHT <= _date_weight(day, day_number):
+            return day
+
+
+def format_date(value: date) -> str:
+    return f"{value.month}/{value.day}/{value.year}"
+
+
+class SyntheticNorthwind:
+    """
+    Rows of the synthetic data set. Customer and product i are derived
+    from sample row i modulo the sample size, so orders can look up any
+    generated customer or product without keeping the generated tables.
+    """
+
+    def __init__(self, data_dir: Path, scale: int, seed: int):
+        self.scale = scale
+        self.seed = seed
+        self.customers = list(read_csv_rows(str(data_dir / "customers.csv")))
+        self.products = list(read_csv_rows(str(data_dir / "products.csv")))
+        self.review_texts = [
+            row["reviews"] for row in read_csv_rows(str(data_dir / "reviews.csv"))
+        ]
+        self.num_customers = len(self.customers) * scale
+        self.num_products = len(self.products) * scale
+        self.num_orders = _count_rows(data_dir / "orders.csv") * scale
+        self.review_rate = len(self.review_texts) / (self.num_orders / scale)
+
+    def _rng(self, stream: str) -> random.Random:
+        return random.Random(f"{self.seed}:{stream}")
+
+    def customer(self, index: int) -> dict:
+        base = self.customers[index % len(self.customers)]
+        copy = index // len(self.customers)
+        if copy == 0:
+            return dict(base)
+        return {
+            **base,
+            "customerID": f"{base['customerID']}{copy}",
+            "companyName": f"{base['companyName']} {copy}",
+        }
+
+    def product_price(self, index: int) -> float:
+        base = self.products[index % len(self.products)]
+        # Deterministic per product, so orders agree with products.csv
+        digest = hashlib.blake2b(f"{self.seed}:{index}".encode(), digest_size=4)
+        jitter = 0.8 + 0.4 * int.from_bytes(digest.digest(), "big") / 2**32
+        return round((to_float(base["unitPrice"]) or 10.0) * jitter, 2)
+
+    def product(self, index: int) -> dict:
+        base = self.products[index % len(self.products)]
+        copy = index // len(self.products)
+        name = base["productName"] if copy == 0 else f"{base['productName']} {copy}"
+        return {
+            **base,
+            "productID": str(index + 1),
+            "productName": name,
+            "unitPrice": f"{self.product_price(index):.2f}",
+        }
+
+    def customer_rows(self):
+        for index in range(self.num_customers):
+            yield self.customer(index)
+
+    def product_rows(self):
+        for index in range(self.num_products):
+            yield self.product(index)
+
+    def order_and_review_rows(self, customer_skew: float, product_skew: float):
+        """Yield ("order", row) and ("review", row) pairs; reviews follow
+        the order they are written for"""
+
+        rng = self._rng("orders")
+        customers = ZipfSampler(self.num_customers, customer_skew, rng)
+        products = ZipfSampler(self.num_products, product_skew, rng)
+        review_id = 0
+
+        for index in range(self.num_orders):
+            order_id = 10248 + index
+            customer = self.customer(customers.sample())
+            product_index = products.sample()
+            order_date = sample_order_date(rng)
+            shipped_date = ""
+            if rng.random() < SHIPPED_RATE:
+                shipped_date = format_date(order_date + timedelta(rng.randint(1, 30)))
+
+            yield "order", {
+                "orderID": order_id,
+                "customerID": customer["customerID"],
+                "productID": product_index + 1,
+                "numProduct": rng.randint(1, 5),
+                "unitPrice": int(self.product_price(product_index)),
+                "quantity": max(1, int(rng.lognormvariate(2.8, 0.7))),
+                "discount": rng.choice(DISCOUNTS),
+                "employeeID": rng.randint(1, 9),
+                "orderDate": format_date(order_date),
+                "requiredDate": format_date(order_date + timedelta(28)),
+                "shippedDate": shipped_date,
+                "shipVia": rng.randint(1, 3),
+                "freight": f"{rng.lognormvariate(3, 1):.2f}",
+                "shipName": customer["companyName"],
+                "shipCity": customer["city"],
+                "shipPostalCode": customer["postalCode"],
+                "shipCountry": customer["country"],
+            }
+
+            if rng.random() < self.review_rate:
+                review_id += 1
+                yield "review", {
+                    "reviewID": review_id,
+                    "orderID": order_id,
+                    "reviews": rng.choice(self.review_texts),
+                }
+
+
+def _count_rows(path: Path) -> int:
+    return sum(1 for _ in read_csv_rows(str(path)))
+
+
+def _header(path: Path) -> list[str]:
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        return next(csv.reader(f))
+
+
+def _write_rows(path: Path, header: list[str], rows) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def generate(
+    output_dir: Path,
+    scale: int,
+    seed: int,
+    data_dir: Path = DEFAULT_DATA_DIR,
+    customer_skew: float = 1.1,
+    product_skew: float = 1.0,
+) -> dict[str, int]:
+    """Write the synthetic CSVs and return the row count per file"""
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    data = SyntheticNorthwind(data_dir, scale, seed)
+    counts = {}
+
+    for name in COPIED_FILES:
+        shutil.copyfile(data_dir / name, output_dir / name)
+
+    counts["customers.csv"] = _write_rows(
+        output_dir / "customers.csv",
+        _header(data_dir / "customers.csv"),
+        data.customer_rows(),
+    )
+    counts["products.csv"] = _write_rows(
+        output_dir / "products.csv",
+        _header(data_dir / "products.csv"),
+        data.product_rows(),
+    )
+
+    # Orders and reviews are generated together, since reviews need
+    # the ids of the orders they belong to
+    counts["orders.csv"] = counts["reviews.csv"] = 0
+    with contextlib.ExitStack() as stack:
+        writers = {}
+        for kind, name in (("order", "orders.csv"), ("review", "reviews.csv")):
+            f = stack.enter_context(
+                open(output_dir / name, "w", encoding="utf-8", newline="")
+            )
+            writers[kind] = csv.DictWriter(f, fieldnames=_header(data_dir / name))
+            writers[kind].writeheader()
+
+        for kind, row in data.order_and_review_rows(customer_skew, product_skew):
+            writers[kind].writerow(row)
+            counts[f"{kind}s.csv"] += 1
+            if kind == "order" and counts["orders.csv"] % 1_000_000 == 0:
+                LOGGER.info(f"Wrote {counts['orders.csv']} orders")
+
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scale", type=int, default=10, help="Multiple of the sample's size"
+    )
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument(
+        "--customer-skew",
+        type=float,
+        default=1.1,
+        help="Zipf exponent of customer popularity",
+    )
+    parser.add_argument(
+        "--product-skew",
+        type=float,
+        default=1.0,
+        help="Zipf exponent of product popularity",
+    )
+    args = parser.parse_args()
+    if args.scale < 1:
+        parser.error("--scale must be at least 1")
+
+    counts = generate(
+        args.output_dir,
+        args.scale,
+        args.seed,
+        data_dir=args.data_dir,
+        customer_skew=args.customer_skew,
+        product_skew=args.product_skew,
+    )
+    for name, count in counts.items():
+        LOGGER.info(f"{name}: {count} rows")